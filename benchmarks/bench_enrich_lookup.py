@@ -0,0 +1,121 @@
+"""资金分析结果补全步骤基准测试
+
+对比原先的四次链式 merge 与现在按账号编号查表的 enrich_pair_result，
+输出耗时与峰值内存（tracemalloc 统计函数本身的分配，包含 numpy 分配，不含 pyarrow 字符串数组）。
+
+用法：python benchmarks/bench_enrich_lookup.py [账户对数量，默认 1000000]
+"""
+import sys
+import os
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from mypackage.fund_flow_engine import enrich_pair_result, classify_account_types
+
+
+def make_inputs(n_pairs: int, n_accounts: int = None, seed: int = 0):
+    """生成 n_pairs 个账户对的汇总结果表及两张映射表"""
+    rng = np.random.default_rng(seed)
+    n_accounts = n_accounts or max(n_pairs // 5, 10)
+    accounts = np.char.add('62', np.arange(n_accounts).astype(str))
+
+    result = pd.DataFrame({
+        '用户id': accounts[rng.integers(0, n_accounts, n_pairs)],
+        '交易对手': accounts[rng.integers(0, n_accounts, n_pairs)],
+    })
+    for col in ['交易笔数', '收入笔数', '支出笔数']:
+        result[col] = rng.integers(0, 50, n_pairs)
+    for col in ['流水总额', '净流入金额', '收入金额', '支出金额', '平均单笔收入金额',
+                '平均单笔支出金额', '最大单笔收入金额', '最大单笔支出金额']:
+        result[col] = rng.random(n_pairs) * 1e5
+    result['进出类型'] = '有进有出'
+    result['最早交易时间'] = pd.Timestamp('2024-01-01')
+    result['最新交易时间'] = pd.Timestamp('2024-06-01')
+    result['交易天数跨度'] = 152
+    result['交易备注'] = '转账'
+    result['关联交易详情'] = ''
+
+    # 约 80% 的账号能匹配到姓名，约 70% 能匹配到调证账号
+    named = rng.random(n_accounts) < 0.8
+    df_received_name = pd.DataFrame({
+        '账号': accounts[named],
+        '系统姓名': np.char.add('姓名', np.arange(named.sum()).astype(str)),
+    })
+    queried = rng.random(n_accounts) < 0.7
+    df_system_account = pd.DataFrame({
+        '支付账号': accounts[queried],
+        '查询账号': np.char.add('Q', np.arange(queried.sum()).astype(str)),
+    })
+    return result, df_received_name, df_system_account
+
+
+def legacy_enrich(result, df_received_name, df_system_account):
+    """改动前的实现：四次 merge 后过滤，其余步骤与 enrich_pair_result 相同"""
+    result = result.merge(
+        df_received_name[['账号', '系统姓名']],
+        how='left', left_on='用户id', right_on='账号'
+    ).drop(columns=['账号'])
+    result = result.merge(
+        df_received_name[['账号', '系统姓名']].rename(columns={'系统姓名': '对手系统姓名'}),
+        how='left', left_on='交易对手', right_on='账号'
+    ).drop(columns=['账号'])
+    result = result.merge(
+        df_system_account[['查询账号', '支付账号']].rename(columns={'查询账号': '调证账号'}),
+        how='left', left_on='用户id', right_on='支付账号'
+    ).drop(columns=['支付账号'])
+    result = result.merge(
+        df_system_account[['查询账号', '支付账号']].rename(columns={'查询账号': '对手账号'}),
+        how='left', left_on='交易对手', right_on='支付账号'
+    ).drop(columns=['支付账号'])
+    result = result[result['调证账号'].notna()]
+    result = result[result['调证账号'] != 'nan']
+    for col in ['用户id', '调证账号', '交易对手', '对手账号']:
+        result[col] = result[col].astype(str)
+    result['对手账户类型'] = classify_account_types(result['对手系统姓名'])
+    return result
+
+
+def measure(func, *args):
+    """返回 (结果, 耗时秒, 峰值内存 MB)
+
+    tracemalloc 会明显拖慢执行，耗时和峰值内存分两次运行测量。
+    """
+    start = time.perf_counter()
+    out = func(*(arg.copy() for arg in args))
+    elapsed = time.perf_counter() - start
+    del out
+
+    # 输入的副本在开始统计前生成，峰值内存只包含函数本身的分配
+    copies = [arg.copy() for arg in args]
+    tracemalloc.start()
+    out = func(*copies)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, elapsed, peak / 1024 ** 2
+
+
+def main():
+    n_pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    result, df_received_name, df_system_account = make_inputs(n_pairs)
+    print(f"账户对数量: {n_pairs:,}")
+
+    legacy, t_legacy, m_legacy = measure(
+        legacy_enrich, result, df_received_name, df_system_account)
+    new, t_new, m_new = measure(
+        enrich_pair_result, result, df_received_name, df_system_account)
+
+    print(f"链式 merge  : {t_legacy:8.2f} 秒  峰值内存 {m_legacy:8.1f} MB")
+    print(f"按账号查表 : {t_new:8.2f} 秒  峰值内存 {m_new:8.1f} MB")
+    assert len(legacy) == len(new), "两种实现输出行数不一致"
+    for col in ['系统姓名', '对手系统姓名', '调证账号', '对手账号']:
+        same = legacy[col].fillna('').to_numpy() == new[col].fillna('').to_numpy()
+        assert same.all(), f"{col} 匹配结果不一致"
+
+
+if __name__ == '__main__':
+    main()
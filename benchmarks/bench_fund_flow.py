@@ -0,0 +1,250 @@
+"""资金分析全流程基准测试
+
+用 generate_test_data.generate_synthetic_data 生成指定规模的流水（可设置账户集中度与重复率），
+分阶段测量去重（apply_deduplication）、汇总（FundFlowEngine.process_data）、结果写出（xlsx/csv/parquet）
+以及按文件运行整个引擎的耗时、吞吐量（行/秒）和峰值常驻内存（RSS）。
+
+每个阶段在单独的子进程中运行，峰值 RSS 互不影响；输入数据在计时前读入，
+报告中的“输入 MB”为读入输入后的 RSS，峰值减去它大致就是该阶段本身的内存开销。
+
+用法：
+    python benchmarks/bench_fund_flow.py -n 1000000
+    python benchmarks/bench_fund_flow.py -n 5000000 --skew 1.2 --dup-rate 0.05 --stages dedup_order process_data
+    python benchmarks/bench_fund_flow.py -n 1000000 --save base.json
+    python benchmarks/bench_fund_flow.py -n 1000000 --baseline base.json   # 超出基线 20% 时返回 1
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import platform
+import multiprocessing
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import pandas as pd
+
+from mypackage.fund_flow_engine import (
+    DEDUP_BY_FIELDS, DEDUP_BY_ORDER_NO, REQUIRED_COLUMNS, FundFlowEngine
+)
+from mypackage.fund_flow_sql import HAS_DUCKDB
+from mypackage.generate_test_data import generate_synthetic_data, write_synthetic_files
+from mypackage.result_writer import HAS_PYARROW, write_csv, write_excel, write_parquet
+
+# 生成器沿用原测试数据的列名（帐），映射到必需字段（账）
+COLUMN_MAPPING = {col: col.replace('账号', '帐号') if col.endswith('方支付账号') else col
+                  for col in REQUIRED_COLUMNS}
+
+STAGES = [
+    'dedup_order', 'dedup_fields', 'process_data', 'process_data_lite',
+    'write_xlsx', 'write_csv', 'write_parquet',
+    'engine_full', 'engine_streaming', 'engine_duckdb',
+]
+DEFAULT_STAGES = ['dedup_order', 'dedup_fields', 'process_data', 'process_data_lite',
+                  'write_csv', 'write_parquet', 'engine_full', 'engine_streaming']
+# 输入为结果表的阶段
+WRITE_STAGES = {'write_xlsx': write_excel, 'write_csv': write_csv, 'write_parquet': write_parquet}
+ENGINE_STAGES = {'engine_full': ('full', 'pandas'), 'engine_streaming': ('streaming', 'pandas'),
+                 'engine_duckdb': ('full', 'duckdb')}
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS（MB），无法获取时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1024 ** 2
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage, work_dir, queue):
+    """子进程：读入输入、计时运行一个阶段，结果放入 queue"""
+    try:
+        if stage in ENGINE_STAGES:
+            with open(os.path.join(work_dir, 'files.json'), encoding='utf-8') as f:
+                files = json.load(f)
+            rows = None  # 由主进程填入生成的行数
+        elif stage in WRITE_STAGES:
+            df = pd.read_pickle(os.path.join(work_dir, 'result.pkl'))
+            rows = len(df)
+        else:
+            df = pd.read_pickle(os.path.join(work_dir, 'data.pkl'))
+            rows = len(df)
+        input_rss = peak_rss_mb()
+
+        start = time.perf_counter()
+        if stage in ('dedup_order', 'dedup_fields'):
+            method = DEDUP_BY_ORDER_NO if stage == 'dedup_order' else DEDUP_BY_FIELDS
+            out_rows = len(FundFlowEngine(dedup_method=method).apply_deduplication(df))
+        elif stage in ('process_data', 'process_data_lite'):
+            result = FundFlowEngine.process_data(df, pair_details=(stage == 'process_data'))
+            out_rows = len(result)
+        elif stage in WRITE_STAGES:
+            WRITE_STAGES[stage](df, os.path.join(work_dir, f'out_{stage}'))
+            out_rows = rows
+        else:
+            mode, backend = ENGINE_STAGES[stage]
+            engine = FundFlowEngine(column_mapping=COLUMN_MAPPING, dedup_method=DEDUP_BY_ORDER_NO,
+                                    backend=backend)
+            result = engine.run(files, mode)
+            out_rows = len(result)
+        seconds = time.perf_counter() - start
+
+        # 供写出阶段使用的结果表（不计入耗时）
+        if stage == 'process_data':
+            result.to_pickle(os.path.join(work_dir, 'result.pkl'))
+        queue.put({'stage': stage, 'rows': rows, 'out_rows': out_rows, 'seconds': seconds,
+                   'input_rss_mb': input_rss, 'peak_rss_mb': peak_rss_mb()})
+    except Exception as e:
+        queue.put({'stage': stage, 'error': f"{type(e).__name__}: {e}"})
+
+
+def measure(stage, work_dir, total_rows):
+    """在新进程中运行一个阶段"""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=run_stage, args=(stage, work_dir, queue))
+    process.start()
+    record = queue.get()
+    process.join()
+    if record.get('rows') is None and 'error' not in record:
+        record['rows'] = total_rows
+    if 'seconds' in record:
+        record['rows_per_second'] = record['rows'] / record['seconds'] if record['seconds'] else None
+    return record
+
+
+def prepare_inputs(args, stages, work_dir):
+    """生成流水并保存为各阶段的输入"""
+    start = time.perf_counter()
+    df, _ = generate_synthetic_data(args.rows, args.accounts, args.skew, args.dup_rate,
+                                    args.failure_rate, args.seed)
+    df.rename(columns={src: dst for dst, src in COLUMN_MAPPING.items()}).to_pickle(
+        os.path.join(work_dir, 'data.pkl'))
+    del df
+    print(f"生成 {args.rows:,} 行流水：{time.perf_counter() - start:.2f} 秒", flush=True)
+
+    if any(stage in ENGINE_STAGES for stage in stages):
+        start = time.perf_counter()
+        files = write_synthetic_files(
+            os.path.join(work_dir, 'files'), args.rows, args.rows_per_file, args.file_format,
+            args.accounts, args.skew, args.dup_rate, args.failure_rate, args.seed)
+        with open(os.path.join(work_dir, 'files.json'), 'w', encoding='utf-8') as f:
+            json.dump(files, f)
+        print(f"写出 {len(files)} 个 {args.file_format} 文件：{time.perf_counter() - start:.2f} 秒", flush=True)
+
+
+def format_mb(value):
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+
+def print_report(records):
+    print(f"{'阶段':<18}{'输入行数':>12}{'输出行数':>12}{'耗时(秒)':>10}{'行/秒':>14}{'输入MB':>10}{'峰值MB':>10}")
+    for record in records:
+        if 'error' in record:
+            print(f"{record['stage']:<20}出错：{record['error']}")
+            continue
+        speed = record['rows_per_second']
+        print(f"{record['stage']:<20}{record['rows']:>14,}{record['out_rows']:>14,}"
+              f"{record['seconds']:>12.2f}{speed:>16,.0f}"
+              f"{format_mb(record['input_rss_mb'])} {format_mb(record['peak_rss_mb'])}")
+
+
+def compare_baseline(config, records, baseline_path, tolerance):
+    """与基线比较耗时和峰值 RSS，返回超出容差的阶段说明"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['config']['rows'] != config['rows']:
+        print(f"警告：基线为 {baseline['config']['rows']:,} 行，与本次规模不同")
+    previous = {record['stage']: record for record in baseline['results'] if 'error' not in record}
+    regressions = []
+    for record in records:
+        old = previous.get(record['stage'])
+        if old is None or 'error' in record:
+            continue
+        for key, label in [('seconds', '耗时'), ('peak_rss_mb', '峰值 RSS')]:
+            if old.get(key) and record.get(key) and record[key] > old[key] * (1 + tolerance):
+                regressions.append(
+                    f"{record['stage']} {label}：{old[key]:.2f} -> {record[key]:.2f}"
+                    f"（+{record[key] / old[key] - 1:.0%}）")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='资金分析全流程基准测试')
+    parser.add_argument('-n', '--rows', type=int, default=1_000_000, help='流水行数（默认 1000000）')
+    parser.add_argument('--accounts', type=int, default=10000, help='账号池大小（默认 10000）')
+    parser.add_argument('--skew', type=float, default=0.0,
+                        help='账号集中度（Zipf 指数，0 为均匀，越大交易越集中于少数账号）')
+    parser.add_argument('--dup-rate', type=float, default=0.0, help='重复流水比例（默认 0）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='付款失败流水比例（默认 0）')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=DEFAULT_STAGES,
+                        help='要运行的阶段（默认不含 write_xlsx、engine_duckdb）')
+    parser.add_argument('--file-format', choices=['csv', 'parquet', 'xlsx'], default='csv',
+                        help='engine_* 阶段读取的文件格式（默认 csv）')
+    parser.add_argument('--rows-per-file', type=int, default=1_000_000, help='engine_* 阶段每个文件的行数')
+    parser.add_argument('--work-dir', help='中间文件目录，默认使用临时目录并在结束后删除')
+    parser.add_argument('--save', metavar='JSON', help='保存本次结果，可作为之后的基线')
+    parser.add_argument('--baseline', metavar='JSON', help='与基线比较，耗时或峰值 RSS 超出容差时返回 1')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='回归容差（默认 0.2，即 20%%）')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    stages = [stage for stage in STAGES if stage in args.stages]
+    if 'engine_duckdb' in stages and not HAS_DUCKDB:
+        parser.error('engine_duckdb 需要安装 duckdb')
+    if ('write_parquet' in stages or args.file_format == 'parquet') and not HAS_PYARROW:
+        parser.error('Parquet 需要安装 pyarrow')
+    # 写出阶段以 process_data 的结果为输入
+    if any(stage in WRITE_STAGES for stage in stages) and 'process_data' not in stages:
+        stages.insert(stages.index(next(s for s in stages if s in WRITE_STAGES)), 'process_data')
+
+    config = {key: getattr(args, key) for key in
+              ['rows', 'accounts', 'skew', 'dup_rate', 'failure_rate', 'seed', 'file_format', 'rows_per_file']}
+    config.update(python=platform.python_version(), pandas=pd.__version__, cpus=os.cpu_count())
+
+    with tempfile.TemporaryDirectory(prefix='bench_fund_flow_') as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        prepare_inputs(args, stages, work_dir)
+        records = []
+        for stage in stages:
+            record = measure(stage, work_dir, args.rows)
+            records.append(record)
+            status = record.get('error') or f"{record['seconds']:.2f} 秒"
+            print(f"  {stage}: {status}", flush=True)
+
+    print()
+    print_report(records)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({'config': config, 'results': records}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存至: {args.save}")
+
+    if args.baseline:
+        regressions = compare_baseline(config, records, args.baseline, args.tolerance)
+        if regressions:
+            print("\n性能回归：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n未发现超出 {args.tolerance:.0%} 的回归")
+    return 1 if any('error' in record for record in records) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
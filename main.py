@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk
 
@@ -23,6 +24,9 @@ def disable_widget(widget):
         disable_widget(child)
 
 if __name__ == "__main__":
+    # 打包后的程序使用进程池（资金分析并行读取）时需要
+    multiprocessing.freeze_support()
+    
     root = tk.Tk()
     root.title("AGGD工作流套件")  # 设置主窗口标题
     
@@ -0,0 +1,179 @@
+import os
+import json
+from datetime import datetime
+from typing import List, Union
+import numpy as np
+import pandas as pd
+
+# 按哈希最高 4 位分为 16 个分片，每个分片单独保存、单独合并
+SHARD_BITS = 4
+N_SHARDS = 1 << SHARD_BITS
+# 去重键哈希的计算方式版本，变化后旧索引中的哈希不再可比
+HASH_VERSION = 3
+TIME_TEXT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def canonical_text(values: pd.Series) -> pd.Series:
+    """去重字段统一转为文本：整数值的浮点数不带小数，日期时间为 YYYY-mm-dd HH:MM:SS，空值为空文本
+
+    同一字段在不同文件、不同批次中可能被推断为 int64、float64、文本或日期时间，转为同一文本形式后哈希才可比。
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.dt.strftime(TIME_TEXT_FORMAT).fillna('')
+    if pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+        return values.astype(str).where(values.notna(), '')
+    if pd.api.types.is_float_dtype(values):
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        integral = np.isfinite(numbers) & (numbers == np.floor(numbers)) & (np.abs(numbers) < 2.0 ** 63)
+        other = ~integral & ~np.isnan(numbers)
+        text = np.full(len(numbers), '', dtype=object)
+        text[integral] = numbers[integral].astype(np.int64).astype(str)
+        text[other] = numbers[other].astype(str)
+        return pd.Series(text, index=values.index, dtype=object)
+    if pd.api.types.is_string_dtype(values) and not pd.api.types.is_object_dtype(values):
+        return values.fillna('')
+    return values.map(_value_text).astype(object)
+
+
+def _value_text(value) -> str:
+    """单个值的 canonical_text（object 列中可能混有数字、文本和日期时间）"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return ''
+    if isinstance(value, (float, np.floating)) and float(value).is_integer() and abs(value) < 2.0 ** 63:
+        return str(int(value))
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.strftime(TIME_TEXT_FORMAT)
+    return str(value)
+
+
+def hash_dedup_keys(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """计算每行去重字段的 64 位哈希
+
+    交易金额统一转为浮点数；交易时间按解析后的 交易日期时间（纳秒整数）比较，
+    Excel 中的日期时间与各种格式的文本时间只要时刻相同即视为相同，无法解析的时间仍按原文比较；
+    其余字段统一转为文本（见 canonical_text），
+    避免同一字段在不同文件、分块、批次中被推断为 int/float/文本后哈希不一致。
+    """
+    keys = pd.DataFrame(index=df.index)
+    for col in columns:
+        if col == '交易金额':
+            keys[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif col == '交易时间' and '交易日期时间' in df.columns:
+            parsed = pd.to_datetime(df['交易日期时间']).to_numpy(dtype='datetime64[ns]')
+            keys[col] = parsed.view(np.int64)
+            keys['交易时间原文'] = canonical_text(df[col]).where(np.isnat(parsed), '')
+        else:
+            keys[col] = canonical_text(df[col])
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+class DedupKeyIndex:
+    """已出现过的去重键哈希集合
+
+    每个键只占 8 字节，按哈希最高位分片，分片内为若干有序 uint64 数组，数量过多时合并。
+    指定目录时可以保存到磁盘（每个分片一个 .npy），再次打开时以内存映射方式加载，
+    不需要把全部键读入内存，用于同一案件多次（增量）处理之间的跨批次去重。
+    """
+
+    MAX_RUNS = 8
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.columns = None  # 生成这些哈希所用的去重字段
+        self.outdated = False  # 磁盘上的索引由旧的哈希方式生成，已忽略
+        self._shards = [[] for _ in range(N_SHARDS)]
+        if path and os.path.exists(os.path.join(path, 'meta.json')):
+            self._load()
+
+    def _shard_file(self, shard: int) -> str:
+        return os.path.join(self.path, f"shard_{shard:02d}.npy")
+
+    def _load(self):
+        with open(os.path.join(self.path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('hash_version', 1) != HASH_VERSION:
+            self.outdated = True
+            return
+        self.columns = meta.get('columns')
+        for shard in range(N_SHARDS):
+            if os.path.exists(self._shard_file(shard)):
+                self._shards[shard].append(np.load(self._shard_file(shard), mmap_mode='r'))
+
+    def __len__(self):
+        return sum(len(run) for runs in self._shards for run in runs)
+
+    @staticmethod
+    def _shard_of(hashes: np.ndarray) -> np.ndarray:
+        return (hashes >> np.uint64(64 - SHARD_BITS)).astype(np.intp)
+
+    def contains(self, hashes: np.ndarray) -> np.ndarray:
+        """返回每个哈希是否已出现过"""
+        seen = np.zeros(len(hashes), dtype=bool)
+        shard_of = self._shard_of(hashes)
+        for shard, runs in enumerate(self._shards):
+            if not runs:
+                continue
+            rows = np.flatnonzero(shard_of == shard)
+            if len(rows) == 0:
+                continue
+            values = hashes[rows]
+            found = np.zeros(len(rows), dtype=bool)
+            for run in runs:
+                if len(run) == 0:
+                    continue
+                pos = np.minimum(np.searchsorted(run, values), len(run) - 1)
+                found |= run[pos] == values
+            seen[rows] = found
+        return seen
+
+    def add(self, hashes: np.ndarray):
+        """加入新的哈希"""
+        if len(hashes) == 0:
+            return
+        hashes = np.unique(hashes)
+        shard_of = self._shard_of(hashes)
+        # hashes 已排序，同一分片的哈希是连续的一段
+        bounds = np.searchsorted(shard_of, np.arange(N_SHARDS + 1))
+        for shard in range(N_SHARDS):
+            part = hashes[bounds[shard]:bounds[shard + 1]]
+            if len(part) == 0:
+                continue
+            runs = self._shards[shard]
+            runs.append(part)
+            if len(runs) > self.MAX_RUNS:
+                self._shards[shard] = [np.unique(np.concatenate(runs))]
+
+    def filter_new(self, hashes: np.ndarray) -> np.ndarray:
+        """返回保留掩码（同 drop_duplicates keep='first'），并记录保留下来的键"""
+        keep = ~pd.Series(hashes).duplicated(keep='first').to_numpy()
+        keep &= ~self.contains(hashes)
+        self.add(hashes[keep])
+        return keep
+
+    def reset(self, columns: Union[List[str], None] = None):
+        """清空全部键（例如去重方式改变后，旧哈希不再可比）"""
+        self.columns = columns
+        self.outdated = False
+        self._shards = [[] for _ in range(N_SHARDS)]
+
+    def save(self, path: str = None):
+        """把每个分片合并为一个有序数组写入磁盘，先写临时文件再替换"""
+        self.path = path or self.path
+        os.makedirs(self.path, exist_ok=True)
+        for shard in range(N_SHARDS):
+            runs = self._shards[shard]
+            if runs:
+                merged = np.unique(np.concatenate(runs))
+            else:
+                merged = np.empty(0, dtype=np.uint64)
+            # 先释放对旧文件的内存映射，Windows 下被映射的文件无法替换
+            self._shards[shard] = [merged]
+            del runs
+            tmp_path = self._shard_file(shard) + '.tmp.npy'
+            np.save(tmp_path, merged)
+            os.replace(tmp_path, self._shard_file(shard))
+
+        tmp_meta = os.path.join(self.path, 'meta.json.tmp')
+        with open(tmp_meta, 'w', encoding='utf-8') as f:
+            json.dump({'columns': self.columns, 'count': len(self), 'hash_version': HASH_VERSION}, f, ensure_ascii=False)
+        os.replace(tmp_meta, os.path.join(self.path, 'meta.json'))
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import pandas as pd
 import os
+from .header_probe import probe_columns, column_by_text
 
 class TableJoinTool(tk.Toplevel):
     def __init__(self, master):
@@ -162,11 +163,12 @@ class TableJoinTool(tk.Toplevel):
     def load_columns(self, side):
         try:
             file_path = self.left_file.get() if side == "left" else self.right_file.get()
-            df = pd.read_excel(file_path)
+            # 只读取表头填充字段列表，数据在执行关联时再读取
+            columns = probe_columns(file_path)
             
             if side == "left":
-                self.left_df = df
-                self.left_columns = df.columns.tolist()
+                self.left_df = None
+                self.left_columns = columns
                 
                 # 更新所有关联条件下拉框的值
                 for condition in self.join_conditions:
@@ -185,8 +187,8 @@ class TableJoinTool(tk.Toplevel):
                                    text=col, 
                                    variable=var).pack(anchor=tk.W)
             else:
-                self.right_df = df
-                self.right_columns = df.columns.tolist()
+                self.right_df = None
+                self.right_columns = columns
                 
                 # 更新所有关联条件下拉框的值
                 for condition in self.join_conditions:
@@ -241,8 +243,8 @@ class TableJoinTool(tk.Toplevel):
     
     def execute_join(self):
         try:
-            # 检查数据表是否已加载
-            if self.left_df is None or self.right_df is None:
+            # 检查数据表是否已选择
+            if not self.left_columns or not self.right_columns:
                 messagebox.showerror("错误", "请先选择两个数据表！")
                 return
             
@@ -267,11 +269,17 @@ class TableJoinTool(tk.Toplevel):
                 messagebox.showerror("错误", "请选择保存路径或勾选使用源文件目录！")
                 return
             
+            # 读取数据表（同一文件重复执行关联时不再重新读取）
+            if self.left_df is None:
+                self.left_df = pd.read_excel(self.left_file.get())
+            if self.right_df is None:
+                self.right_df = pd.read_excel(self.right_file.get())
+
             # 先执行连接
             result_df = self.left_df.merge(
                 self.right_df,
-                left_on=[cond[0] for cond in join_conditions],
-                right_on=[cond[1] for cond in join_conditions],
+                left_on=[column_by_text(self.left_df.columns, cond[0]) for cond in join_conditions],
+                right_on=[column_by_text(self.right_df.columns, cond[1]) for cond in join_conditions],
                 how=self.join_type.get(),
                 suffixes=('_表1', '_表2')
             )
@@ -1,12 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import pandas as pd
 import os
 from pathlib import Path
-import numpy as np
-from typing import List, Dict, Union
+from typing import List, Dict
 import threading
-import subprocess
+from .parsed_cache import ParsedFileCache
+from .result_writer import DEFAULT_OUTPUT_FORMAT, HAS_PYARROW, available_formats, format_extension
+from .fund_flow_engine import (
+    DEFAULT_READ_WORKERS, REQUIRED_COLUMNS, DEDUP_BY_ORDER_NO, DEDUP_BY_FIELDS,
+    FundFlowEngine, default_output_name, default_state_path,
+    load_mapping_profile, save_mapping_profile, read_header,
+)
+from .mapping_profiles import MappingProfileStore
+from .fund_flow_sql import HAS_DUCKDB
+
 
 class FundFlowAnalysis:
     def __init__(self, master):
@@ -15,15 +22,14 @@ class FundFlowAnalysis:
         self.window = None
         self.files_selected = []
         self.df = None
-        self.required_columns = [
-            '查询账号', '付款方支付账号', '收款方支付账号', '支付机构内部订单号',
-            '交易时间', '借贷标志', '交易金额', '交易余额', '付款方银行卡号',
-            '收款方银行卡号', '交易类型', '收款方的商户名称', '备注'
-        ]
+        self.loaded_profile = None  # 加载的映射方案
+        # 按表头保存的字段映射，相同表头的文件不再重复弹出字段映射对话框
+        self.profile_store = MappingProfileStore()
+        self.required_columns = list(REQUIRED_COLUMNS)
         
         # 添加去重相关变量
         self.deduplicate_var = tk.StringVar(value="否")  # 默认不去重
-        self.deduplicate_method_var = tk.StringVar(value="根据【流水号】去重")  # 默认去重方法
+        self.deduplicate_method_var = tk.StringVar(value=DEDUP_BY_ORDER_NO)  # 默认去重方法
         
         self.create_main_window()
 
@@ -31,7 +37,7 @@ class FundFlowAnalysis:
         """创建主窗口"""
         self.window = tk.Toplevel(self.master)
         self.window.title("资金分析 - 账户间资金流向统计")
-        self.window.geometry("800x600")
+        self.window.geometry("800x860")
         # 设置窗口始终置顶
         self.window.transient(self.master)
         self.window.grab_set()
@@ -74,6 +80,219 @@ class FundFlowAnalysis:
         )
         self.auto_save_check.pack(pady=5)
 
+        # 流式处理选项：CSV/TXT 分块读取，不再整体合并，适用于超大案件目录
+        self.streaming_var = tk.BooleanVar(value=False)
+        self.streaming_check = ttk.Checkbutton(
+            self.main_frame,
+            text="流式处理（低内存模式，适用于超大文件）",
+            variable=self.streaming_var
+        )
+        self.streaming_check.pack(pady=5)
+
+        # 增量模式：累计状态保存在首个文件所在目录，补充批次只需处理新增文件
+        self.incremental_var = tk.BooleanVar(value=False)
+        self.incremental_check = ttk.Checkbutton(
+            self.main_frame,
+            text="增量模式（合并到首个文件所在目录的累计结果，跳过已合并的文件）",
+            variable=self.incremental_var
+        )
+        self.incremental_check.pack(pady=5)
+
+        # 并行读取进程数：Excel 解析是 CPU 密集型，多个文件时使用进程池
+        workers_frame = ttk.Frame(self.main_frame)
+        workers_frame.pack(pady=5)
+        ttk.Label(workers_frame, text="并行读取进程数:").pack(side=tk.LEFT, padx=5)
+        self.workers_var = tk.IntVar(value=DEFAULT_READ_WORKERS)
+        ttk.Spinbox(
+            workers_frame,
+            from_=1,
+            to=os.cpu_count() or 1,
+            textvariable=self.workers_var,
+            width=5
+        ).pack(side=tk.LEFT)
+
+        # 解析缓存：同一批文件重复分析时直接加载已解析的数据
+        self.use_cache_var = tk.BooleanVar(value=ParsedFileCache.available())
+        cache_frame = ttk.Frame(self.main_frame)
+        cache_frame.pack(pady=5)
+        ttk.Checkbutton(
+            cache_frame,
+            text="使用解析缓存（重复分析同一批文件时加速）",
+            variable=self.use_cache_var,
+            state='normal' if ParsedFileCache.available() else 'disabled'
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Button(cache_frame, text="清空缓存", command=self.clear_parsed_cache).pack(side=tk.LEFT, padx=5)
+
+        # 输出格式：Excel 超过单表行数上限时自动分表；CSV/Parquet 适合超大结果
+        format_frame = ttk.Frame(self.main_frame)
+        format_frame.pack(pady=5)
+        ttk.Label(format_frame, text="输出格式:").pack(side=tk.LEFT, padx=5)
+        self.output_format_var = tk.StringVar(value=DEFAULT_OUTPUT_FORMAT)
+        ttk.Combobox(
+            format_frame,
+            values=available_formats(),
+            textvariable=self.output_format_var,
+            state="readonly",
+            width=20
+        ).pack(side=tk.LEFT)
+        # 计算引擎：DuckDB 直接读取 CSV/TXT/Parquet，多线程执行，数据超出内存时溢写到磁盘
+        ttk.Label(format_frame, text="计算引擎:").pack(side=tk.LEFT, padx=5)
+        self.backend_var = tk.StringVar(value='pandas')
+        ttk.Combobox(
+            format_frame,
+            values=['pandas', 'duckdb'] if HAS_DUCKDB else ['pandas'],
+            textvariable=self.backend_var,
+            state="readonly",
+            width=10
+        ).pack(side=tk.LEFT)
+
+        # 交易明细表：以交易对ID关联结果表的逐笔流水（Parquet），便于后续分析直接读取；
+        # 输出明细表时可以不再拼接关联交易详情文本，汇总更快
+        detail_frame = ttk.Frame(self.main_frame)
+        detail_frame.pack(pady=5)
+        self.transaction_table_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            detail_frame,
+            text="同时输出交易明细表（Parquet）",
+            variable=self.transaction_table_var,
+            state='normal' if HAS_PYARROW else 'disabled'
+        ).pack(side=tk.LEFT, padx=5)
+        self.pair_details_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            detail_frame,
+            text="生成关联交易详情",
+            variable=self.pair_details_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        # 数据去重：在主窗口中选择，不依赖字段映射对话框（已保存映射的表头不再弹出对话框）
+        deduplicate_frame = ttk.LabelFrame(self.main_frame, text="数据去重", padding="10")
+        deduplicate_frame.pack(fill=tk.X, pady=5)
+        
+        # 是否去重单选按钮
+        deduplicate_option_frame = ttk.Frame(deduplicate_frame)
+        deduplicate_option_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(deduplicate_option_frame, text="是否去重:").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(
+            deduplicate_option_frame, 
+            text="否", 
+            variable=self.deduplicate_var, 
+            value="否"
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(
+            deduplicate_option_frame, 
+            text="是", 
+            variable=self.deduplicate_var, 
+            value="是"
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # 去重方法单选按钮（默认隐藏）
+        self.method_frame = ttk.Frame(deduplicate_frame)
+        self.method_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(self.method_frame, text="去重方法:").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(
+            self.method_frame, 
+            text=DEDUP_BY_ORDER_NO, 
+            variable=self.deduplicate_method_var, 
+            value=DEDUP_BY_ORDER_NO
+        ).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(
+            self.method_frame, 
+            text=DEDUP_BY_FIELDS, 
+            variable=self.deduplicate_method_var, 
+            value=DEDUP_BY_FIELDS
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # 初始状态：如果选择"否"，则隐藏方法选择
+        if self.deduplicate_var.get() == "否":
+            self.method_frame.pack_forget()
+        
+        # 绑定事件：当去重选择变化时（包括加载映射方案）显示/隐藏方法选择
+        def toggle_method_frame(*args):
+            if self.deduplicate_var.get() == "是":
+                self.method_frame.pack(fill=tk.X, pady=5)
+            else:
+                self.method_frame.pack_forget()
+        
+        self.deduplicate_var.trace_add("write", toggle_method_frame)
+
+        # 映射方案：保存当前字段映射和去重方式，供下次加载或命令行批处理（fund_flow_cli）使用
+        profile_frame = ttk.Frame(self.main_frame)
+        profile_frame.pack(pady=5)
+        ttk.Button(profile_frame, text="加载映射方案", command=self.load_profile).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text="保存映射方案", command=self.save_profile).pack(side=tk.LEFT, padx=5)
+        ttk.Button(profile_frame, text="重新映射所选文件", command=self.forget_mappings).pack(side=tk.LEFT, padx=5)
+
+    def load_profile(self):
+        """加载映射方案，表头相符的文件不再弹出字段映射对话框"""
+        profile_path = filedialog.askopenfilename(
+            title="选择映射方案", filetypes=[("JSON files", "*.json")]
+        )
+        if not profile_path:
+            return
+        try:
+            profile = load_mapping_profile(profile_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取映射方案失败：{str(e)}")
+            return
+        self.loaded_profile = profile
+        if profile['dedup_method'] is None:
+            self.deduplicate_var.set("否")
+        else:
+            self.deduplicate_var.set("是")
+            self.deduplicate_method_var.set(profile['dedup_method'])
+        self.status_label.config(text=f"已加载映射方案: {os.path.basename(profile_path)}")
+
+    def save_profile(self):
+        """保存所选文件各表头的字段映射和去重方式；尚未映射的表头先弹出字段映射对话框"""
+        engine = self.create_engine()
+        if not self.resolve_mappings(engine):
+            messagebox.showwarning("警告", "请先选择数据文件并完成字段映射！")
+            return
+        profile_path = filedialog.asksaveasfilename(
+            title="保存映射方案",
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+            initialfile="资金分析映射方案.json"
+        )
+        if not profile_path:
+            return
+        try:
+            # 首个文件的映射作为默认映射，表头不在方案中的文件只要列名相符也可套用
+            save_mapping_profile(
+                profile_path,
+                engine.file_mappings.get(self.files_selected[0], {}),
+                self.get_dedup_method(),
+                engine.export_header_mappings()
+            )
+            messagebox.showinfo("提示", f"映射方案已保存至:\n{profile_path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"保存映射方案失败：{str(e)}")
+
+    def forget_mappings(self):
+        """删除所选文件表头已保存的映射，下次分析时重新弹出字段映射对话框"""
+        if not self.files_selected:
+            messagebox.showwarning("警告", "请先选择数据文件！")
+            return
+        for file in self.files_selected:
+            try:
+                columns = read_header(file)
+            except Exception:
+                continue
+            if columns is not None:
+                self.profile_store.remove(columns)
+        self.loaded_profile = None
+        self.status_label.config(text="已清除所选文件的字段映射，下次分析时重新设置")
+
+    def clear_parsed_cache(self):
+        """清空解析缓存"""
+        try:
+            ParsedFileCache().clear()
+            messagebox.showinfo("提示", "解析缓存已清空")
+        except OSError as e:
+            messagebox.showerror("错误", f"清空缓存失败：{str(e)}")
+
     def select_files(self):
         """选择多个文件"""
         self.window.withdraw()  # 临时隐藏主窗口
@@ -83,6 +302,7 @@ class FundFlowAnalysis:
                 ("Excel files", "*.xlsx *.xls"),
                 ("CSV files", "*.csv"),
                 ("Text files", "*.txt"),
+                ("Parquet files", "*.parquet"),
                 ("All files", "*.*")
             ]
         )
@@ -109,25 +329,25 @@ class FundFlowAnalysis:
                 self.files_selected.append(str(file))
                 self.file_list.insert(tk.END, os.path.basename(str(file)))
 
-    def read_data(self, file_path: str) -> pd.DataFrame:
-        """读取数据文件"""
-        ext = os.path.splitext(file_path)[1].lower()
-        try:
-            if ext in ['.xlsx', '.xls']:
-                return pd.read_excel(file_path)
-            elif ext == '.csv':
-                return pd.read_csv(file_path)
-            elif ext == '.txt':
-                return pd.read_csv(file_path, sep='\t')
-        except Exception as e:
-            messagebox.showerror("错误", f"读取文件 {file_path} 时出错：{str(e)}")
-            return None
+    def resolve_mappings(self, engine: FundFlowEngine) -> bool:
+        """确定每个文件的字段映射：已保存过的表头自动套用，其余每种表头弹出一次字段映射对话框"""
+        unresolved = engine.resolve_file_mappings(self.files_selected)
+        for columns, files in unresolved.values():
+            mapping = self.show_mapping_dialog(columns, files)
+            if mapping:
+                engine.set_header_mapping(columns, files, mapping)
+        # 去重方式在主窗口中选择（表头都已保存过映射、不弹出对话框时同样生效）
+        engine.dedup_method = self.get_dedup_method()
+        return bool(engine.file_mappings)
 
-    def show_mapping_dialog(self, columns: List[str]) -> Dict[str, str]:
-        """显示字段映射对话框"""
+    def show_mapping_dialog(self, columns: List[str], files: List[str] = None) -> Dict[str, str]:
+        """显示字段映射对话框，files 为使用这种表头的文件（仅用于标题提示）"""
         mapping_dialog = tk.Toplevel(self.window)
-        mapping_dialog.title("字段映射")
-        mapping_dialog.geometry("600x700")  # 增加高度以容纳去重选项
+        if files:
+            mapping_dialog.title(f"字段映射 - {os.path.basename(files[0])} 等 {len(files)} 个文件")
+        else:
+            mapping_dialog.title("字段映射")
+        mapping_dialog.geometry("600x560")
         # 设置模态对话框
         mapping_dialog.transient(self.window)
         mapping_dialog.grab_set()
@@ -156,60 +376,9 @@ class FundFlowAnalysis:
             
             mapping[req_col] = combo
         
-        # ======== 添加去重选项 ========
-        deduplicate_frame = ttk.LabelFrame(mapping_dialog, text="数据去重", padding="10")
-        deduplicate_frame.pack(fill=tk.X, pady=10, padx=10)
-        
-        # 是否去重单选按钮
-        deduplicate_option_frame = ttk.Frame(deduplicate_frame)
-        deduplicate_option_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(deduplicate_option_frame, text="是否去重:").pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(
-            deduplicate_option_frame, 
-            text="否", 
-            variable=self.deduplicate_var, 
-            value="否"
-        ).pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(
-            deduplicate_option_frame, 
-            text="是", 
-            variable=self.deduplicate_var, 
-            value="是"
-        ).pack(side=tk.LEFT, padx=5)
-        
-        # 去重方法单选按钮（默认隐藏）
-        self.method_frame = ttk.Frame(deduplicate_frame)
-        self.method_frame.pack(fill=tk.X, pady=5)
-        
-        ttk.Label(self.method_frame, text="去重方法:").pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(
-            self.method_frame, 
-            text="根据【流水号】去重", 
-            variable=self.deduplicate_method_var, 
-            value="根据【流水号】去重"
-        ).pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(
-            self.method_frame, 
-            text="根据【两端账号+日期时间+借贷方向+交易金额】去重", 
-            variable=self.deduplicate_method_var, 
-            value="根据【两端账号+日期时间+借贷方向+交易金额】去重"
-        ).pack(side=tk.LEFT, padx=5)
-        
-        # 初始状态：如果选择"否"，则隐藏方法选择
-        if self.deduplicate_var.get() == "否":
-            self.method_frame.pack_forget()
-        
-        # 绑定事件：当去重选择变化时显示/隐藏方法选择
-        def toggle_method_frame(*args):
-            if self.deduplicate_var.get() == "是":
-                self.method_frame.pack(fill=tk.X, pady=5)
-            else:
-                self.method_frame.pack_forget()
-        
-        self.deduplicate_var.trace_add("write", toggle_method_frame)
-        # ======== 结束去重选项 ========
         
+        confirmed = {}
+
         def confirm_mapping():
             result = {}
             for k, v in mapping.items():
@@ -220,285 +389,47 @@ class FundFlowAnalysis:
                     selected = v.get()
                     if selected:  # 只添加非空的映射
                         result[k] = selected
-            self.column_mapping = result
+            confirmed.update(result)
             mapping_dialog.destroy()
         
         ttk.Button(mapping_dialog, text="确认映射", command=confirm_mapping).pack(pady=10)
         
         # 等待窗口关闭
         self.window.wait_window(mapping_dialog)
-        return self.column_mapping
+        return confirmed
 
-    def apply_deduplication(self, df: pd.DataFrame) -> pd.DataFrame:
-        """根据用户选择应用去重逻辑"""
+    def get_dedup_method(self):
+        """用户选择的去重方式，不去重时返回 None"""
         if self.deduplicate_var.get() == "否":
-            return df  # 不去重，直接返回原始数据
-        
-        # 关键优化：使用映射后的目标字段名进行去重
-        if self.deduplicate_method_var.get() == "根据【流水号】去重":
-            # 根据映射后的目标字段名去重
-            col_name = "支付机构内部订单号"
-            if col_name in df.columns:
-                df = df.drop_duplicates(subset=[col_name], keep='first')
-            else:
-                messagebox.showwarning("警告", f"找不到映射的列：{col_name}")
-        
-        else:  # 根据组合字段去重
-            # 使用映射后的目标字段名作为去重依据
-            cols_to_check = [
-                "付款方支付账号", 
-                "收款方支付账号", 
-                "交易时间", 
-                "借贷标志", 
-                "交易金额"
-            ]
-            
-            missing_cols = [col for col in cols_to_check if col not in df.columns]
-            
-            if missing_cols:
-                messagebox.showwarning("警告", f"找不到以下映射的列：{', '.join(missing_cols)}")
-            elif cols_to_check:
-                df = df.drop_duplicates(subset=cols_to_check, keep='first')
-        
-        return df
-
-    def process_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """处理数据（对应SQL模型的逻辑）"""
-        # 关键优化：首先应用字段映射
-        if hasattr(self, 'column_mapping'):
-            df = df.rename(columns={v: k for k, v in self.column_mapping.items() if v})
-
-        # 1. 基础处理
-        df['交易日期时间'] = pd.to_datetime(df['交易时间'].astype(str).str.pad(14, fillchar='0'), 
-                                  format='%Y%m%d%H%M%S')
-        df = df[df['备注'] != "付款失败"]
-
-        # 1.1 构建 df_received_name（原有逻辑）
-        df_received = df[df['借贷标志'] == '贷'].copy()
-        df_received = df_received.sort_values('交易日期时间', ascending=False)
-        df_received_name = df_received.drop_duplicates(
-            subset=['收款方支付账号', '收款方的商户名称'], keep='first'
-        )[['收款方支付账号', '收款方的商户名称', '交易日期时间']]
-        df_received_name = df_received_name.sort_values('交易日期时间', ascending=False)
-        df_received_name = df_received_name.drop_duplicates(subset=['收款方支付账号'], keep='first')
-        df_received_name = df_received_name.rename(
-            columns={'收款方支付账号': '账号', '收款方的商户名称': '系统姓名'}
-        )
-
-        # 1.2 构建 df_system_account
-        df_borrow = df[df['借贷标志'] == '借'].copy()
-        df_borrow = df_borrow.sort_values('交易日期时间', ascending=False)
-        df_borrow_acc = df_borrow[['查询账号', '付款方支付账号', '交易日期时间']]
-        df_borrow_acc = df_borrow_acc.rename(columns={'付款方支付账号': '支付账号'})
-
-        df_credit = df[df['借贷标志'] == '贷'].copy()
-        df_credit = df_credit.sort_values('交易日期时间', ascending=False)
-        df_credit_acc = df_credit[['查询账号', '收款方支付账号', '交易日期时间']]
-        df_credit_acc = df_credit_acc.rename(columns={'收款方支付账号': '支付账号'})
-
-        df_system_account = pd.concat([df_borrow_acc, df_credit_acc], ignore_index=True)
-        # 只保留 查询账号 ≠ 支付账号 且 支付账号长度 > 3
-        df_system_account = df_system_account[
-            (df_system_account['查询账号'] != df_system_account['支付账号']) &
-            (df_system_account['支付账号'].astype(str).str.len() > 3)
-        ]
-
-        # 优先保留支付账号<>查询账号，再按时间倒序，仅保留每个支付账号的最新一条
-        df_system_account = df_system_account.sort_values('交易日期时间', ascending=False)
-        df_system_account = df_system_account.drop_duplicates(subset=['支付账号'], keep='first')
-
-        # 2. 计算商户类型
-        def get_account_type(name):
-            """判断账户类型
-            Args:
-                name: 商户名称
-            Returns:
-                str: "个人"/"公司"/None
-            """
-            if pd.isna(name) or len(str(name)) == 1:
-                return None
-            
-            name = str(name)
-            
-            # 1. 最高优先级: 直接标注的个人
-            explicit_person = ['（个人）', '(个人)', '个体户']
-            if any(tag in name for tag in explicit_person):
-                return "个人"
-            
-            # 2. 公司类型关键词
-            company_keywords = [
-                '公司', '集团', '机构', '基金', '金服', '协会', '商贸', '银行', 
-                '证券', '保险', '投资', '企业', '工厂', '中心', '商城', '超市', 
-                '市场', '学校', '医院', '酒店', '餐厅', '网络', '科技', '信息',
-                '有限', '股份', '合伙'
-            ]
-            
-            # 3. 个人名称特征
-            person_features = [
-                # 维吾尔族人名特征
-                '买买提', '阿不都', '艾力', '麦麦提', '热依木', '吾买尔', '艾合买提', '依布拉音',
-                '阿布都', '阿迪力', '阿里木', '艾尔肯', '巴合提', '迪力夏提', '古力', '哈力克',
-                '艾克拜尔', '吾斯曼', '依米提', '玉素甫', '阿不力克', '阿不都拉', '阿不都热合曼',
-                '阿地力江', '阿合买提江', '阿克木', '艾克木', '艾力江', '艾买提', '艾沙江',
-                '艾斯卡尔', '巴哈尔', '巴哈提亚尔', '达吾提', '代力拜尔', '蒂力瓦尔', '地里夏提',
-                '东来提', '都拉提', '额勒斯', '额敏', '恩维尔', '喀德尔', '卡德尔', '卡斯木',
-                '凯赛尔', '库尔班', '库热西', '马合木提', '买合木提', '买买提江', '买提', '米吉提',
-                '努尔买买提', '努尔曼', '帕尔哈提', '热合曼', '热扎克', '赛迪克', '赛力克',
-                '司马义', '苏来曼', '苏联', '铁木尔', '托合提', '托乎提', '托合塔尔', '托克逊',
-                '外力', '维力', '乌买尔', '吾布力', '吾甫尔', '吾拉木', '西地克', '希尔艾力',
-                '肖开提', '亚库普', '亚森', '依布拉依木', '依德利斯', '依力亚斯', '依斯拉木',
-                '尤努斯', '玉山', '玉素甫江', '再努拉', '扎克尔', '珠马力',
-                # 藏族人名特征
-                '次仁', '卓玛', '索朗', '格桑', '仁增', '旺堆', '平措', '白玛', '降央', '央金',
-                '次旺', '普布', '拉巴', '白珍', '其美', '达瓦', '泽仁', '曲珍', '群培', '顿珠',
-                '洛桑', '嘉央', '强巴', '才旺', '扎西', '江措', '德吉', '桑珠', '朗杰', '嘎玛',
-                '更登', '旺姆', '加央', '曲木', '达珍', '南杰', '尼玛', '旺青', '斯朗', '白让',
-                '丹增', '益西', '多吉', '旺金', '降措', '次基', '玉珍', '拉姆', '达甲', '昂旺',
-                '贡嘎', '措姆', '其米', '次珍', '索娜', '达吉', '才让', '白旦', '才顿', '占堆',
-                '央宗', '白德', '多布杰', '白玛措', '噶玛', '降措', '绒措', '桑布', '却吉', '索朗旺堆',
-                # 蒙古族人名特征
-                '格日勒', '乌云', '呼和', '额尔德尼', '巴特尔', '苏和', '斯琴', '萨仁', '朝克图', '宝音',
-                '那顺', '道尔吉', '巴雅尔', '阿拉坦', '赛音', '满都拉', '图门', '图雅', '额日德尼', '乌兰',
-                '其其格', '齐日古嘎', '白音', '胡日查', '包银', '金巴图', '玛拉沁', '达来', '特木尔', '金花',
-                '锡林', '珠拉', '敖特根', '毕力格', '宝力高', '宝音吉雅', '布仁', '楚古拉', '达古拉', '达赖',
-                '额尔敦', '额日图', '格根', '根登', '和日勒', '贺希格', '吉尔格勒', '吉日嘎拉', '金格尔', '闵柱',
-                '那日苏', '纳森', '青格勒', '青格尔泰', '青斯格', '萨日娜', '色音', '苏布达', '苏和巴特尔', '苏勒',
-                # 回族人名特征
-                '马哈木提', '穆罕默德', '阿訇', '艾买提', '麦麦提', '阿卜杜拉', '阿里', '哈桑', '侯赛因', '伊布拉欣',
-                '叶海亚', '赛义德', '阿巴斯', '阿卜杜', '阿卜杜勒', '阿迪力', '阿訇', '艾山', '艾伟', '安外尔',
-                '白有志', '拜勒', '本扬', '布尔汗', '察勒', '常志宁', '丁守中', '丁元庆', '丁志诚', '冯天保',
-                '哈里勒', '哈米德', '海德尔', '胡赛尼', '胡有志', '霍志远', '贾福尔', '贾拉勒', '贾迈勒', '贾曼',
-                '贾米勒', '卡德尔', '卡迪尔', '卡米力', '马合木', '马吉德', '马坚', '马建国', '马金山', '马俊',
-                # 其他少数民族特征
-                '其其格', '阿依古丽', '玛依拉', '木合塔尔', '吐尔逊', '阿布都克热木', '卡米拉', '帕提曼',
-                '阿依努尔', '古丽娜尔', '米热古丽', '古力班', '热依汗', '热西旦', '赛乃姆', '沙代提',
-                '阿地力江', '吐尔洪', '阿布来提', '阿布都沙拉木', '玛依努尔', '木尔扎提', '努尔买买提',
-                '热合曼', '吐尔逊江', '阿卜杜拉曼', '阿布都热依木', '阿卜杜热合曼', '玛依努尔', '木尔扎提',
-                '努尔买买提', '热合曼', '吐尔逊江', '阿卜杜拉曼', '阿布都热依木', '阿卜杜热合曼', '阿布都外力',
-                '阿布都瓦依提', '阿布都热合曼', '艾力', '艾尼瓦尔', '艾斯卡尔', '安尼瓦尔', '巴合提亚尔',
-                '巴吾东', '达吾提', '迪力夏提', '东来提', '额勒斯', '恩维尔', '古力班', '哈力克'
-            ]
-            
-            # 判断逻辑:
-            # 1. 如果包含公司关键词且长度>10，判定为公司
-            if any(keyword in name for keyword in company_keywords) and len(name) >= 8:
-                return "公司"
-            
-            # 2. 如果包含个人名称特征且长度<=10，判定为个人
-            if any(feature in name for feature in person_features) and len(name) <= 10:
-                return "个人"
-            
-            # 3. 仅从长度考虑
-            if len(name) > 10:
-                return "公司"
-            elif 2 <= len(name) <= 4:  # 普通中文姓名一般2-4个字
-                return "个人"
-            
-            # 其他情况返回None
             return None
+        return self.deduplicate_method_var.get()
 
-        # 3. 按交易对手分组统计
-        def calculate_group_stats(group):
-            total_count = len(group)
-            credit_records = group[group['借贷标志'] == '贷']
-            debit_records = group[group['借贷标志'] == '借']
-            
-            flow_type = "有进有出"
-            if total_count == len(credit_records):
-                flow_type = "只进不出"
-            elif total_count == len(debit_records):
-                flow_type = "只出不进"
-                
-            # 按时间倒序排序后生成交易详情
-            sorted_group = group.sort_values('交易日期时间', ascending=False)
-            transaction_details = '; '.join(sorted_group.apply(
-                lambda x: f"{x['交易日期时间'].strftime('%Y-%m-%d %H:%M')} ({'+' if x['借贷标志']=='贷' else '-'}{x['交易金额']})",
-                axis=1
-            ))
-            
-            return pd.Series({
-                '交易笔数': total_count,
-                '收入笔数': len(credit_records),
-                '支出笔数': len(debit_records),
-                '进出类型': flow_type,
-                '流水总额': group['交易金额'].sum(),
-                '净流入金额': credit_records['交易金额'].sum() - debit_records['交易金额'].sum(),
-                '最早交易时间': group['交易日期时间'].min(),
-                '最新交易时间': group['交易日期时间'].max(),
-                '交易天数跨度': (group['交易日期时间'].max() - group['交易日期时间'].min()).days,
-                '收入金额': credit_records['交易金额'].sum(),
-                '支出金额': debit_records['交易金额'].sum(),
-                '平均单笔收入金额': credit_records['交易金额'].mean() if len(credit_records) > 0 else 0,
-                '平均单笔支出金额': debit_records['交易金额'].mean() if len(debit_records) > 0 else 0,
-                '最大单笔收入金额': credit_records['交易金额'].max() if len(credit_records) > 0 else 0,
-                '最大单笔支出金额': debit_records['交易金额'].max() if len(debit_records) > 0 else 0,
-                '交易备注': '; '.join(group['备注'].dropna().unique()),
-                '关联交易详情': transaction_details
-            })
-
-        # 4. 生成最终结果
-        result = df.groupby(['付款方支付账号', '收款方支付账号']).apply(calculate_group_stats).reset_index()
-        result.columns = [
-            '用户id', '交易对手',  '交易笔数', '收入笔数', '支出笔数',
-            '进出类型', '流水总额', '净流入金额', '最早交易时间', '最新交易时间',
-            '交易天数跨度', '收入金额', '支出金额', '平均单笔收入金额',
-            '平均单笔支出金额', '最大单笔收入金额', '最大单笔支出金额',
-            '交易备注', '关联交易详情'
-        ]
-        
-
-
-        # 5. 根据 df_received_name 匹配系统姓名和对手系统姓名
-        result = result.merge(
-            df_received_name[['账号', '系统姓名']],
-            how='left',
-            left_on='用户id',
-            right_on='账号'
-        ).drop(columns=['账号'])
-
-        result = result.merge(
-            df_received_name[['账号', '系统姓名']].rename(columns={'系统姓名': '对手系统姓名'}),
-            how='left',
-            left_on='交易对手',
-            right_on='账号'
-        ).drop(columns=['账号'])
-
-        # 6. 添加其他字段（调证账号、对手账号）
-        result = result.merge(
-            df_system_account[['查询账号', '支付账号']].rename(columns={'查询账号': '调证账号'}),
-            how='left',
-            left_on='用户id',
-            right_on='支付账号'
-        ).drop(columns=['支付账号'])
+    def update_progress(self, text: str, percent: float = None):
+        self.status_label.config(text=text)
+        if percent is not None:
+            self.progress_var.set(percent)
 
-        result = result.merge(
-            df_system_account[['查询账号', '支付账号']].rename(columns={'查询账号': '对手账号'}),
-            how='left',
-            left_on='交易对手',
-            right_on='支付账号'
-        ).drop(columns=['支付账号'])
-        
-        # 过滤掉没有调证账号的记录
-        result = result[result['调证账号'].notna()]
-        result = result[result['调证账号'] != 'nan']
-        
-        # 字段类型强制为文本
-        for col in ['用户id', '调证账号', '交易对手', '对手账号']:
-            result[col] = result[col].astype(str)
-
-        result['对手账户类型'] = result['对手系统姓名'].apply(get_account_type)
-
-        # 7. 调整列顺序
-        final_columns = [
-            '用户id', '调证账号', '系统姓名', '交易对手', '对手账号', 
-            '对手账户类型', '对手系统姓名', '交易笔数', '收入笔数', '支出笔数',
-            '进出类型', '流水总额', '净流入金额', '最早交易时间', '最新交易时间',
-            '交易天数跨度', '收入金额', '支出金额', '平均单笔收入金额',
-            '平均单笔支出金额', '最大单笔收入金额', '最大单笔支出金额',
-            '交易备注', '关联交易详情'
-        ]
-
-        return result[final_columns]
+    def create_engine(self) -> FundFlowEngine:
+        """按窗口中的选项创建分析流程，进度和错误显示在窗口中"""
+        try:
+            max_workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            max_workers = 1
+        profile = self.loaded_profile or {}
+        return FundFlowEngine(
+            column_mapping=profile.get('column_mapping'),
+            header_mappings=profile.get('header_mappings'),
+            profile_store=self.profile_store,
+            dedup_method=self.get_dedup_method(),
+            max_workers=max_workers,
+            use_cache=self.use_cache_var.get(),
+            on_progress=self.update_progress,
+            on_warning=lambda message: messagebox.showwarning("警告", message),
+            on_file_error=lambda file, e: messagebox.showerror("错误", f"读取文件 {file} 时出错：{str(e)}"),
+            transaction_table=self.transaction_table_var.get(),
+            pair_details=self.pair_details_var.get(),
+            backend=self.backend_var.get(),
+        )
 
     def open_file_location(self, file_path):
         """打开文件所在目录并选中文件"""
@@ -525,66 +456,45 @@ class FundFlowAnalysis:
         
         def analysis_thread():
             try:
-                # 读取所有文件
-                total_files = len(self.files_selected)
-                all_data = []
-                
-                for i, file in enumerate(self.files_selected):
-                    self.status_label.config(text=f"正在读取文件: {os.path.basename(file)}...")
-                    df = self.read_data(file)
-                    
-                    if df is not None:
-                        # 首次读取时进行字段映射
-                        if not hasattr(self, 'column_mapping'):
-                            self.column_mapping = self.show_mapping_dialog(df.columns.tolist())
-                        
-                        # 应用字段映射（重命名列）
-                        if hasattr(self, 'column_mapping'):
-                            rename_dict = {v: k for k, v in self.column_mapping.items() if v}
-                            df = df.rename(columns=rename_dict)
-                        
-                        all_data.append(df)
-                    
-                    self.progress_var.set((i + 1) / total_files * 50)
-                
-                # 合并数据
-                self.status_label.config(text="正在合并数据...")
-                combined_df = pd.concat(all_data, ignore_index=True)
-                
-                # 应用去重逻辑（使用映射后的目标字段名）
-                self.status_label.config(text="正在应用去重逻辑...")
-                combined_df = self.apply_deduplication(combined_df)
-                
-                # 处理数据
-                self.status_label.config(text="正在处理数据...")
-                result_df = self.process_data(combined_df)
-                
-                self.progress_var.set(100)
-                self.status_label.config(text="分析完成！")
-                
+                engine = self.create_engine()
+                self.resolve_mappings(engine)
+                if self.incremental_var.get():
+                    # 累计状态保存在首个文件所在目录
+                    result_df = engine.run(
+                        self.files_selected, 'incremental', default_state_path(self.files_selected)
+                    )
+                elif self.streaming_var.get():
+                    result_df = engine.run(self.files_selected, 'streaming')
+                else:
+                    result_df = engine.run(self.files_selected, 'full')
+
                 # 保存结果
+                output_format = self.output_format_var.get()
+                extension = format_extension(output_format)
+                default_name = default_output_name(extension)
                 if self.auto_save_var.get():
                     source_dir = os.path.dirname(self.files_selected[0])
-                    timestamp = pd.Timestamp.now().strftime('%Y-%m-%d %H%M')
-                    output_file = os.path.join(source_dir, f"【结果表】资金分析反馈{timestamp}.xlsx")
-                    result_df.to_excel(output_file, index=False)
-                    
+                    output_file = os.path.join(source_dir, default_name)
+                else:
+                    output_file = filedialog.asksaveasfilename(
+                        defaultextension=extension,
+                        filetypes=[(output_format, f"*{extension}")],
+                        initialfile=default_name
+                    )
+
+                if output_file:
+                    transaction_file = engine.write(result_df, output_file, output_format)
+                    self.status_label.config(text="分析完成！")
+                    saved = f"结果已保存至:\n{output_file}"
+                    if transaction_file:
+                        saved += f"\n交易明细表:\n{transaction_file}"
                     result = messagebox.askquestion("成功", 
-                        f"结果已保存至:\n{output_file}\n\n是否打开输出目录？")
+                        f"{saved}\n\n是否打开输出目录？")
                     if result == 'yes':
                         self.window.after(100, lambda: self.open_file_location(output_file))
                 else:
-                    output_file = filedialog.asksaveasfilename(
-                        defaultextension=".xlsx",
-                        filetypes=[("Excel files", "*.xlsx")],
-                        initialfile=f"【结果表】资金分析反馈{pd.Timestamp.now().strftime('%Y-%m-%d %H%M')}.xlsx"
-                    )
-                    if output_file:
-                        result_df.to_excel(output_file, index=False)
-                        result = messagebox.askquestion("成功", 
-                            f"结果已保存至:\n{output_file}\n\n是否打开输出目录？")
-                        if result == 'yes':
-                            self.window.after(100, lambda: self.open_file_location(output_file))
+                    # 取消保存时删除已生成的交易明细表临时文件
+                    engine.discard_transaction_table()
             
             except Exception as e:
                 messagebox.showerror("错误", f"处理过程中出错：{str(e)}")
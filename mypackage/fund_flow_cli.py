@@ -0,0 +1,157 @@
+"""资金分析命令行入口（无界面，用于批处理服务器）
+
+示例：
+    python -m mypackage.fund_flow_cli 案件目录 -p 映射方案.json -o 结果.xlsx
+    python -m mypackage.fund_flow_cli 案件1 案件2 案件3 -p 映射方案.json --per-dir -f parquet
+    python -m mypackage.fund_flow_cli 案件目录 -p 映射方案.json --transactions --no-details
+    python -m mypackage.fund_flow_cli 流水.csv 补充流水.parquet -p 映射方案.json --engine duckdb
+
+映射方案在资金分析窗口中通过“保存映射方案”生成，其中按表头保存了各种导出格式的映射，
+每个文件按自己的表头套用；找不到映射的文件会被跳过并报告。不指定映射方案时要求数据列名与必需字段一致。
+"""
+import os
+import sys
+import argparse
+import multiprocessing
+from .fund_flow_engine import (
+    DEFAULT_READ_WORKERS, PROCESS_BACKENDS, FundFlowEngine, collect_data_files, default_output_name
+)
+from .fund_flow_sql import HAS_DUCKDB
+from .result_writer import HAS_PYARROW, OUTPUT_FORMATS, format_extension, format_for_extension
+from .mapping_profiles import MappingProfileStore, DEFAULT_PROFILE_STORE
+
+PROCESS_MODES = ['full', 'streaming', 'incremental']
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def print_progress(text: str, percent: float = None):
+    if percent is None:
+        log(text)
+    else:
+        log(f"[{percent:5.1f}%] {text}")
+
+
+def report_file_error(file: str, error: Exception):
+    log(f"错误: 读取文件 {file} 时出错：{error}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='fund_flow_cli',
+        description='资金分析 - 账户间资金流向统计（命令行批处理）'
+    )
+    parser.add_argument(
+        'inputs', nargs='+', help='数据文件（xlsx/xls/csv/txt/parquet）或文件夹（文件夹中的 xlsx/xls/csv/txt）'
+    )
+    parser.add_argument('-p', '--profile', help='映射方案（JSON），在资金分析窗口中保存')
+    parser.add_argument(
+        '--mapping-store', metavar='PATH',
+        help=f'同时使用按表头保存的映射库（JSON），资金分析窗口使用的映射库位于 {DEFAULT_PROFILE_STORE}'
+    )
+    parser.add_argument('-o', '--output', help='结果文件路径，默认保存至首个文件所在目录')
+    parser.add_argument(
+        '-f', '--format',
+        choices=[ext.lstrip('.') for ext, _, _ in OUTPUT_FORMATS.values()],
+        help='输出格式，默认按 --output 的扩展名判断，否则为 xlsx'
+    )
+    parser.add_argument(
+        '-m', '--mode', choices=PROCESS_MODES, default='full',
+        help='处理方式：full 一次性处理，streaming 流式低内存，incremental 增量合并（默认 full）'
+    )
+    parser.add_argument(
+        '-e', '--engine', choices=PROCESS_BACKENDS, default='pandas',
+        help='计算引擎：pandas，或 duckdb（按 SQL 执行，直接读取 CSV/TXT/Parquet，需要 duckdb）'
+    )
+    parser.add_argument(
+        '-j', '--workers', type=int, default=DEFAULT_READ_WORKERS,
+        help=f'并行读取进程数（默认 {DEFAULT_READ_WORKERS}）'
+    )
+    parser.add_argument('--cache', action='store_true', help='使用解析缓存（需要 pyarrow）')
+    parser.add_argument(
+        '--transactions', action='store_true',
+        help='同时输出以交易对ID关联结果表的交易明细表（结果表名_交易明细.parquet，需要 pyarrow）'
+    )
+    parser.add_argument('--no-details', action='store_true', help='不生成关联交易详情列')
+    parser.add_argument(
+        '--per-dir', action='store_true',
+        help='每个输入文件夹作为一个独立案件分别处理，结果保存在各自目录中'
+    )
+    return parser
+
+
+def run_case(engine: FundFlowEngine, files, mode: str, output_file: str, format_name: str) -> str:
+    """处理一个案件并写出结果，返回结果文件路径"""
+    if not files:
+        raise ValueError("没有找到数据文件")
+    result_df = engine.run(files, mode)
+    if output_file is None:
+        output_file = os.path.join(os.path.dirname(files[0]), default_output_name(format_extension(format_name)))
+    transaction_file = engine.write(result_df, output_file, format_name)
+    log(f"结果已保存至: {output_file}（{len(result_df)} 行）")
+    if transaction_file:
+        log(f"交易明细表已保存至: {transaction_file}")
+    return output_file
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.per_dir and args.output:
+        parser.error('--per-dir 时结果保存在各案件目录中，不能同时指定 --output')
+    if args.transactions and not HAS_PYARROW:
+        parser.error('--transactions 需要安装 pyarrow')
+    if args.engine == 'duckdb' and not HAS_DUCKDB:
+        parser.error('--engine duckdb 需要安装 duckdb')
+
+    if args.format:
+        format_name = format_for_extension(args.format)
+    elif args.output:
+        format_name = format_for_extension(os.path.splitext(args.output)[1])
+    else:
+        format_name = format_for_extension('.xlsx')
+
+    engine_options = dict(
+        max_workers=args.workers,
+        use_cache=args.cache,
+        on_progress=print_progress,
+        on_warning=lambda message: log(f"警告: {message}"),
+        on_file_error=report_file_error,
+        profile_store=MappingProfileStore(args.mapping_store) if args.mapping_store else None,
+        transaction_table=args.transactions,
+        pair_details=not args.no_details,
+        backend=args.engine,
+    )
+    try:
+        if args.profile:
+            engine = FundFlowEngine.from_profile(args.profile, **engine_options)
+        else:
+            engine = FundFlowEngine(**engine_options)
+    except (OSError, ValueError) as e:
+        log(f"错误: 读取映射方案失败：{e}")
+        return 2
+
+    if args.per_dir:
+        cases = [[path] for path in args.inputs]
+    else:
+        cases = [args.inputs]
+
+    failed = 0
+    for case in cases:
+        log(f"==== 处理: {', '.join(case)}")
+        try:
+            run_case(engine, collect_data_files(case), args.mode, args.output, format_name)
+        except Exception as e:
+            failed += 1
+            log(f"错误: 处理 {', '.join(case)} 时出错：{e}")
+
+    if len(cases) > 1:
+        log(f"完成 {len(cases) - failed}/{len(cases)} 个案件")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,1383 @@
+import os
+import re
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Callable, List, Dict, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from .parsed_cache import ParsedFileCache
+from .dedup_index import DedupKeyIndex, hash_dedup_keys
+from .result_writer import HAS_PYARROW, ParquetChunkWriter, filter_parquet_rows, write_parquet, write_result
+from .mapping_profiles import MappingProfileStore, header_fingerprint, mapping_fits
+from .header_probe import probe_columns
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    guess_datetime_format = None
+
+# 交易对手分组键：付款方 -> 收款方
+PAIR_KEYS = ['付款方支付账号', '收款方支付账号']
+
+# 按交易对手聚合后的统计列（不含名称/调证账号等补充字段）
+PAIR_STAT_COLUMNS = [
+    '用户id', '交易对手', '交易笔数', '收入笔数', '支出笔数',
+    '进出类型', '流水总额', '净流入金额', '最早交易时间', '最新交易时间',
+    '交易天数跨度', '收入金额', '支出金额', '平均单笔收入金额',
+    '平均单笔支出金额', '最大单笔收入金额', '最大单笔支出金额',
+    '交易备注', '关联交易详情'
+]
+
+# 交易明细表（Parquet）的列：交易对ID 与结果表中的同名列对应
+TRANSACTION_TABLE_COLUMNS = [
+    '交易对ID', '交易日期时间', '借贷标志', '交易金额', '交易余额',
+    '查询账号', '支付机构内部订单号', '交易类型', '备注'
+]
+# 交易明细表与结果表保存在同一目录，文件名为 结果表文件名 + 后缀
+TRANSACTION_TABLE_SUFFIX = '_交易明细.parquet'
+
+# 流式处理时 CSV/TXT 每块读取的行数
+STREAM_CHUNK_SIZE = 200_000
+
+# 增量模式的累计状态文件及去重索引目录（与结果表保存在同一目录）
+INCREMENTAL_STATE_FILE = '【累计状态】资金分析.pkl'
+INCREMENTAL_STATE_VERSION = 2
+DEDUP_INDEX_DIR = '【去重索引】资金分析'
+
+# 计算引擎：pandas 为默认实现；duckdb 用嵌入式列式数据库按 SQL 执行同一逻辑（需要 duckdb）
+PROCESS_BACKENDS = ['pandas', 'duckdb']
+
+# 并行读取文件的默认进程数
+DEFAULT_READ_WORKERS = max(1, min(os.cpu_count() or 1, 8))
+
+
+def read_data_file(file_path: str, nrows: int = None) -> pd.DataFrame:
+    """按扩展名读取 Excel/CSV/TXT 数据文件，不支持的格式返回 None"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ['.xlsx', '.xls']:
+        return pd.read_excel(file_path, nrows=nrows)
+    elif ext == '.csv':
+        return pd.read_csv(file_path, nrows=nrows)
+    elif ext == '.txt':
+        return pd.read_csv(file_path, sep='\t', nrows=nrows)
+    elif ext == '.parquet':
+        df = pd.read_parquet(file_path)
+        return df if nrows is None else df.head(nrows)
+    return None
+
+
+def read_header(file_path: str) -> Union[List[str], None]:
+    """只读取表头（见 header_probe），不支持的格式返回 None"""
+    if os.path.splitext(file_path)[1].lower() not in ['.xlsx', '.xls', '.csv', '.txt', '.parquet']:
+        return None
+    return probe_columns(file_path)
+
+
+def apply_mapping(df: pd.DataFrame, rename_dict: Dict[str, str], file_path: str) -> pd.DataFrame:
+    """按字段映射重命名列并补充解析后的交易时间；整表读取和流式分块读取共用"""
+    # 映射中的源数据列为文本，Excel 中的数字、日期表头按文本匹配
+    return add_transaction_time(df.rename(columns=lambda col: rename_dict.get(str(col), col)), file_path)
+
+
+def read_mapped_file(file_path: str, rename_dict: Dict[str, str]) -> pd.DataFrame:
+    """读取数据文件并应用字段映射（供进程池调用，需为模块级函数）"""
+    df = read_data_file(file_path)
+    if df is not None:
+        df = apply_mapping(df, rename_dict, file_path)
+    return df
+
+
+def build_transaction_details(pair_id: np.ndarray, df: pd.DataFrame, n_pairs: int) -> pd.Series:
+    """生成每个交易对手的关联交易详情
+
+    先对全部流水一次性排序（组内按交易时间倒序），再逐组拼接一次字符串，
+    避免对每个分组做排序和逐行 apply。
+
+    Args:
+        pair_id: 每行流水所属交易对手的组号（0 ~ n_pairs-1）
+        df: 包含 交易日期时间/借贷标志/交易金额 的流水
+        n_pairs: 交易对手组数
+    Returns:
+        pd.Series: 以组号为索引的详情文本
+    """
+    ts = df['交易日期时间']
+
+    # 时间文本只精确到分钟，按分钟去重后再格式化
+    minute_codes, minutes = pd.factorize(ts.dt.floor('min'))
+    minute_text = np.append(
+        np.asarray(pd.DatetimeIndex(minutes).strftime('%Y-%m-%d %H:%M'), dtype=object), ''
+    )
+    sign = np.where(df['借贷标志'].to_numpy() == '贷', '+', '-').astype(object)
+    details = (
+        minute_text[minute_codes] + ' (' + sign
+        + df['交易金额'].astype(str).to_numpy(dtype=object) + ')'
+    )
+
+    # 组号升序、时间倒序（按位取反实现倒序，NaT 排最后），同一时间保持原始顺序
+    ts_values = ts.to_numpy(dtype='datetime64[ns]').view('i8')
+    order = np.lexsort((~ts_values, pair_id))
+    sorted_details = pd.Series(details[order]).groupby(pair_id[order], sort=True).agg('; '.join)
+    return sorted_details.reindex(range(n_pairs), fill_value='')
+
+
+def build_transaction_table(pair_id: np.ndarray, df: pd.DataFrame) -> pd.DataFrame:
+    """生成以交易对ID为键的交易明细表（每行一笔流水，列同 TRANSACTION_TABLE_COLUMNS）
+
+    排序与关联交易详情一致：交易对ID升序、组内交易时间倒序。列类型固定
+    （金额、余额为浮点数，时间为 datetime64，其余为文本），缺少的字段为空值，
+    分块写出时每块的类型都相同。
+
+    Args:
+        pair_id: 每行流水所属交易对手的组号，即结果表中的 交易对ID
+        df: 已完成字段映射并生成 交易日期时间 的流水（账号为空的流水需事先剔除）
+    """
+    n_rows = len(df)
+    ts_values = df['交易日期时间'].to_numpy(dtype='datetime64[ns]')
+    order = np.lexsort((~ts_values.view('i8'), pair_id))
+
+    def column(col):
+        if col in df.columns:
+            return df[col].take(order)
+        return pd.Series([None] * n_rows, dtype=object)
+
+    return pd.DataFrame({
+        '交易对ID': pair_id[order],
+        '交易日期时间': ts_values[order],
+        '借贷标志': column('借贷标志').astype('string').array,
+        '交易金额': pd.to_numeric(column('交易金额'), errors='coerce').to_numpy(dtype=np.float64),
+        '交易余额': pd.to_numeric(column('交易余额'), errors='coerce').to_numpy(dtype=np.float64),
+        '查询账号': column('查询账号').astype('string').array,
+        '支付机构内部订单号': column('支付机构内部订单号').astype('string').array,
+        '交易类型': column('交易类型').astype('string').array,
+        '备注': column('备注').astype('string').array,
+    }, columns=TRANSACTION_TABLE_COLUMNS)
+
+
+def summarize_pairs(df: pd.DataFrame):
+    """按交易对手（付款方支付账号, 收款方支付账号）计算可累加的部分统计量
+
+    使用一次 groupby 计算整体指标，再按 借贷标志 透视得到收入/支出指标。
+    结果中只包含笔数、金额合计、最大值和时间范围，可以在多批数据之间直接合并。
+
+    Args:
+        df: 已完成字段映射并生成 交易日期时间 的流水（账号为空的流水需事先剔除）
+    Returns:
+        tuple: (pair_index, pair_id, partial)
+            pair_index: 交易对手 MultiIndex（按账号排序）
+            pair_id: 每行流水对应的组号
+            partial: 以组号为索引、列为 PAIR_PARTIAL_COLUMNS 的 DataFrame
+    """
+    grouped = df.groupby(PAIR_KEYS, sort=True)
+    pair_index = grouped.size().index
+    n_pairs = len(pair_index)
+    pair_id = grouped.ngroup().to_numpy(dtype=np.int64)
+    amount = df['交易金额'].to_numpy()
+
+    totals = pd.DataFrame({'组号': pair_id, '交易金额': amount, '交易日期时间': df['交易日期时间'].to_numpy()}).groupby(
+        '组号', sort=True
+    ).agg(
+        交易笔数=('交易金额', 'size'),
+        流水总额=('交易金额', 'sum'),
+        最早交易时间=('交易日期时间', 'min'),
+        最新交易时间=('交易日期时间', 'max'),
+    )
+
+    # 按借贷标志透视：贷=收入，借=支出；无对应方向时取 0
+    flag = df['借贷标志'].to_numpy()
+    in_flag = np.isin(flag, ['贷', '借'])
+    by_flag = (
+        pd.DataFrame({'组号': pair_id[in_flag], '借贷标志': flag[in_flag], '交易金额': amount[in_flag]})
+        .groupby(['组号', '借贷标志'], sort=True)['交易金额']
+        .agg(['size', 'sum', 'max'])
+        .unstack('借贷标志', fill_value=0)
+        .reindex(
+            index=range(n_pairs),
+            columns=pd.MultiIndex.from_product([['size', 'sum', 'max'], ['贷', '借']]),
+            fill_value=0
+        )
+    )
+
+    partial = pd.DataFrame({
+        '交易笔数': totals['交易笔数'].to_numpy(),
+        '流水总额': totals['流水总额'].to_numpy(),
+        '最早交易时间': totals['最早交易时间'].to_numpy(),
+        '最新交易时间': totals['最新交易时间'].to_numpy(),
+        '收入笔数': by_flag[('size', '贷')].to_numpy(),
+        '收入金额': by_flag[('sum', '贷')].to_numpy(),
+        '最大单笔收入金额': by_flag[('max', '贷')].to_numpy(),
+        '支出笔数': by_flag[('size', '借')].to_numpy(),
+        '支出金额': by_flag[('sum', '借')].to_numpy(),
+        '最大单笔支出金额': by_flag[('max', '借')].to_numpy(),
+    })
+    return pair_index, pair_id, partial
+
+
+def collect_pair_remarks(pair_id: np.ndarray, remarks: pd.Series, n_pairs: int) -> pd.Series:
+    """备注按首次出现顺序去重后，按交易对手拼接"""
+    frame = pd.DataFrame({'组号': pair_id, '备注': remarks.to_numpy()}).dropna(subset=['备注'])
+    frame = frame.drop_duplicates(subset=['组号', '备注'], keep='first')
+    return (
+        frame['备注'].astype(str).groupby(frame['组号'], sort=True).agg('; '.join)
+        .reindex(range(n_pairs), fill_value='')
+    )
+
+
+def finish_pair_stats(pair_index: pd.MultiIndex, partial: pd.DataFrame,
+                      remarks: pd.Series, details: Union[pd.Series, None]) -> pd.DataFrame:
+    """由部分统计量计算均值、进出类型等派生指标，生成交易对手汇总表
+
+    Args:
+        pair_index: 交易对手 MultiIndex，与 partial 行一一对应
+        partial: summarize_pairs 输出（或多批合并后）的部分统计量
+        remarks: 每个交易对手的交易备注
+        details: 每个交易对手的关联交易详情，为 None 时不生成该列
+    Returns:
+        pd.DataFrame: 列顺序同 PAIR_STAT_COLUMNS
+    """
+    total_count = partial['交易笔数'].to_numpy()
+    credit_count = partial['收入笔数'].to_numpy()
+    debit_count = partial['支出笔数'].to_numpy()
+    flow_type = np.select(
+        [total_count == credit_count, total_count == debit_count],
+        ['只进不出', '只出不进'],
+        default='有进有出'
+    )
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        credit_mean = np.where(credit_count > 0, partial['收入金额'] / credit_count, 0)
+        debit_mean = np.where(debit_count > 0, partial['支出金额'] / debit_count, 0)
+
+    result = pd.DataFrame({
+        '用户id': pair_index.get_level_values(0),
+        '交易对手': pair_index.get_level_values(1),
+        '交易笔数': total_count,
+        '收入笔数': credit_count,
+        '支出笔数': debit_count,
+        '进出类型': flow_type,
+        '流水总额': partial['流水总额'].to_numpy(),
+        '净流入金额': (partial['收入金额'] - partial['支出金额']).to_numpy(),
+        '最早交易时间': partial['最早交易时间'].to_numpy(),
+        '最新交易时间': partial['最新交易时间'].to_numpy(),
+        '交易天数跨度': (partial['最新交易时间'] - partial['最早交易时间']).dt.days.to_numpy(),
+        '收入金额': partial['收入金额'].to_numpy(),
+        '支出金额': partial['支出金额'].to_numpy(),
+        '平均单笔收入金额': credit_mean,
+        '平均单笔支出金额': debit_mean,
+        '最大单笔收入金额': partial['最大单笔收入金额'].to_numpy(),
+        '最大单笔支出金额': partial['最大单笔支出金额'].to_numpy(),
+        '交易备注': remarks.to_numpy(),
+    })
+    if details is None:
+        return result[PAIR_STAT_COLUMNS[:-1]]
+    result['关联交易详情'] = details.to_numpy()
+    return result[PAIR_STAT_COLUMNS]
+
+
+def aggregate_pair_stats(df: pd.DataFrame, pair_details: bool = True,
+                         with_transactions: bool = False):
+    """按交易对手（付款方支付账号, 收款方支付账号）汇总流水
+
+    Args:
+        df: 已完成字段映射并生成 交易日期时间 的流水
+        pair_details: 是否生成关联交易详情（逐笔拼接文本，流水多时耗时最长）
+        with_transactions: 是否同时生成交易明细表，结果表首列增加 交易对ID
+    Returns:
+        pd.DataFrame: 列顺序同 PAIR_STAT_COLUMNS，按账号排序；
+            with_transactions=True 时为 (结果表, 交易明细表)
+    """
+    # 账号为空的流水不参与分组
+    df = df.dropna(subset=PAIR_KEYS)
+    pair_index, pair_id, partial = summarize_pairs(df)
+    n_pairs = len(pair_index)
+    remarks = collect_pair_remarks(pair_id, df['备注'], n_pairs)
+    details = build_transaction_details(pair_id, df, n_pairs) if pair_details else None
+    result = finish_pair_stats(pair_index, partial, remarks, details)
+    if not with_transactions:
+        return result
+    # 分组按账号排序，组号即结果表的行号
+    result.insert(0, '交易对ID', np.arange(n_pairs, dtype=np.int64))
+    return result, build_transaction_table(pair_id, df)
+
+
+# 对手账户类型判断所用关键词
+# 1. 最高优先级: 直接标注的个人
+EXPLICIT_PERSON_TAGS = ['（个人）', '(个人)', '个体户']
+
+# 2. 公司类型关键词
+COMPANY_KEYWORDS = [
+    '公司', '集团', '机构', '基金', '金服', '协会', '商贸', '银行', 
+    '证券', '保险', '投资', '企业', '工厂', '中心', '商城', '超市', 
+    '市场', '学校', '医院', '酒店', '餐厅', '网络', '科技', '信息',
+    '有限', '股份', '合伙'
+]
+
+# 3. 个人名称特征
+PERSON_FEATURES = [
+    # 维吾尔族人名特征
+    '买买提', '阿不都', '艾力', '麦麦提', '热依木', '吾买尔', '艾合买提', '依布拉音',
+    '阿布都', '阿迪力', '阿里木', '艾尔肯', '巴合提', '迪力夏提', '古力', '哈力克',
+    '艾克拜尔', '吾斯曼', '依米提', '玉素甫', '阿不力克', '阿不都拉', '阿不都热合曼',
+    '阿地力江', '阿合买提江', '阿克木', '艾克木', '艾力江', '艾买提', '艾沙江',
+    '艾斯卡尔', '巴哈尔', '巴哈提亚尔', '达吾提', '代力拜尔', '蒂力瓦尔', '地里夏提',
+    '东来提', '都拉提', '额勒斯', '额敏', '恩维尔', '喀德尔', '卡德尔', '卡斯木',
+    '凯赛尔', '库尔班', '库热西', '马合木提', '买合木提', '买买提江', '买提', '米吉提',
+    '努尔买买提', '努尔曼', '帕尔哈提', '热合曼', '热扎克', '赛迪克', '赛力克',
+    '司马义', '苏来曼', '苏联', '铁木尔', '托合提', '托乎提', '托合塔尔', '托克逊',
+    '外力', '维力', '乌买尔', '吾布力', '吾甫尔', '吾拉木', '西地克', '希尔艾力',
+    '肖开提', '亚库普', '亚森', '依布拉依木', '依德利斯', '依力亚斯', '依斯拉木',
+    '尤努斯', '玉山', '玉素甫江', '再努拉', '扎克尔', '珠马力',
+    # 藏族人名特征
+    '次仁', '卓玛', '索朗', '格桑', '仁增', '旺堆', '平措', '白玛', '降央', '央金',
+    '次旺', '普布', '拉巴', '白珍', '其美', '达瓦', '泽仁', '曲珍', '群培', '顿珠',
+    '洛桑', '嘉央', '强巴', '才旺', '扎西', '江措', '德吉', '桑珠', '朗杰', '嘎玛',
+    '更登', '旺姆', '加央', '曲木', '达珍', '南杰', '尼玛', '旺青', '斯朗', '白让',
+    '丹增', '益西', '多吉', '旺金', '降措', '次基', '玉珍', '拉姆', '达甲', '昂旺',
+    '贡嘎', '措姆', '其米', '次珍', '索娜', '达吉', '才让', '白旦', '才顿', '占堆',
+    '央宗', '白德', '多布杰', '白玛措', '噶玛', '降措', '绒措', '桑布', '却吉', '索朗旺堆',
+    # 蒙古族人名特征
+    '格日勒', '乌云', '呼和', '额尔德尼', '巴特尔', '苏和', '斯琴', '萨仁', '朝克图', '宝音',
+    '那顺', '道尔吉', '巴雅尔', '阿拉坦', '赛音', '满都拉', '图门', '图雅', '额日德尼', '乌兰',
+    '其其格', '齐日古嘎', '白音', '胡日查', '包银', '金巴图', '玛拉沁', '达来', '特木尔', '金花',
+    '锡林', '珠拉', '敖特根', '毕力格', '宝力高', '宝音吉雅', '布仁', '楚古拉', '达古拉', '达赖',
+    '额尔敦', '额日图', '格根', '根登', '和日勒', '贺希格', '吉尔格勒', '吉日嘎拉', '金格尔', '闵柱',
+    '那日苏', '纳森', '青格勒', '青格尔泰', '青斯格', '萨日娜', '色音', '苏布达', '苏和巴特尔', '苏勒',
+    # 回族人名特征
+    '马哈木提', '穆罕默德', '阿訇', '艾买提', '麦麦提', '阿卜杜拉', '阿里', '哈桑', '侯赛因', '伊布拉欣',
+    '叶海亚', '赛义德', '阿巴斯', '阿卜杜', '阿卜杜勒', '阿迪力', '阿訇', '艾山', '艾伟', '安外尔',
+    '白有志', '拜勒', '本扬', '布尔汗', '察勒', '常志宁', '丁守中', '丁元庆', '丁志诚', '冯天保',
+    '哈里勒', '哈米德', '海德尔', '胡赛尼', '胡有志', '霍志远', '贾福尔', '贾拉勒', '贾迈勒', '贾曼',
+    '贾米勒', '卡德尔', '卡迪尔', '卡米力', '马合木', '马吉德', '马坚', '马建国', '马金山', '马俊',
+    # 其他少数民族特征
+    '其其格', '阿依古丽', '玛依拉', '木合塔尔', '吐尔逊', '阿布都克热木', '卡米拉', '帕提曼',
+    '阿依努尔', '古丽娜尔', '米热古丽', '古力班', '热依汗', '热西旦', '赛乃姆', '沙代提',
+    '阿地力江', '吐尔洪', '阿布来提', '阿布都沙拉木', '玛依努尔', '木尔扎提', '努尔买买提',
+    '热合曼', '吐尔逊江', '阿卜杜拉曼', '阿布都热依木', '阿卜杜热合曼', '玛依努尔', '木尔扎提',
+    '努尔买买提', '热合曼', '吐尔逊江', '阿卜杜拉曼', '阿布都热依木', '阿卜杜热合曼', '阿布都外力',
+    '阿布都瓦依提', '阿布都热合曼', '艾力', '艾尼瓦尔', '艾斯卡尔', '安尼瓦尔', '巴合提亚尔',
+    '巴吾东', '达吾提', '迪力夏提', '东来提', '额勒斯', '恩维尔', '古力班', '哈力克'
+]
+
+
+def _compile_keywords(keywords: List[str]) -> re.Pattern:
+    """将关键词列表编译为一个正则（长词优先），一次扫描即可判断是否包含任一关键词"""
+    unique = sorted(set(keywords), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(k) for k in unique))
+
+
+EXPLICIT_PERSON_PATTERN = _compile_keywords(EXPLICIT_PERSON_TAGS)
+COMPANY_PATTERN = _compile_keywords(COMPANY_KEYWORDS)
+PERSON_PATTERN = _compile_keywords(PERSON_FEATURES)
+
+
+def classify_account_types(names: pd.Series) -> pd.Series:
+    """判断账户类型（向量化）
+
+    只对去重后的名称做一次关键词匹配，再映射回原顺序，耗时取决于不同名称的数量。
+
+    Args:
+        names: 商户名称
+    Returns:
+        pd.Series: "个人"/"公司"/None，索引与 names 一致
+    """
+    codes, uniques = pd.factorize(names)
+    text = pd.Series(uniques, dtype=object).astype(str)
+    length = text.str.len().to_numpy()
+
+    # 判断逻辑:
+    # 0. 名称只有一个字符时无法判断
+    # 1. 直接标注为个人的，判定为个人
+    # 2. 如果包含公司关键词且长度>=8，判定为公司
+    # 3. 如果包含个人名称特征且长度<=10，判定为个人
+    # 4. 仅从长度考虑：>10 为公司，2-4 个字为个人（普通中文姓名一般2-4个字）
+    labels = np.select(
+        [
+            length == 1,
+            text.str.contains(EXPLICIT_PERSON_PATTERN).to_numpy(),
+            text.str.contains(COMPANY_PATTERN).to_numpy() & (length >= 8),
+            text.str.contains(PERSON_PATTERN).to_numpy() & (length <= 10),
+            length > 10,
+            (length >= 2) & (length <= 4),
+        ],
+        [None, "个人", "公司", "个人", "公司", "个人"],
+        default=None
+    ).astype(object)
+
+    # 缺失值（codes 为 -1）返回 None
+    result = np.where(codes >= 0, labels[codes] if len(labels) else None, None)
+    return pd.Series(result, index=names.index, dtype=object)
+
+
+# 每个数据源（文件路径）检测到的交易时间格式，同一文件的后续分块直接复用
+_TIME_FORMAT_CACHE = {}
+
+
+def _compose_timestamps(values: np.ndarray) -> Union[np.ndarray, None]:
+    """将 YYYYMMDDhhmmss 形式的整数按位拆分，直接用 NumPy 组装为 datetime64[ns]
+
+    不足 14 位的按左侧补 0 理解（与按文本补齐后解析一致）。存在非法日期时间时返回 None。
+    """
+    year = values // 10**10
+    month = values // 10**8 % 100
+    day = values // 10**6 % 100
+    hour = values // 10**4 % 100
+    minute = values // 100 % 100
+    second = values % 100
+    in_range = (
+        (year >= 1678) & (year <= 2261) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+        & (hour < 24) & (minute < 60) & (second < 60)
+    )
+    if not in_range.all():
+        return None
+
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    # 2月30日之类的日期会溢出到下个月
+    if (days.astype('datetime64[M]') != months).any():
+        return None
+    seconds = (hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+    return (days.astype('datetime64[s]') + seconds).astype('datetime64[ns]')
+
+
+def _parse_numeric_timestamps(values: pd.Series) -> Union[pd.Series, None]:
+    """数值（或纯数字文本）形式的交易时间，缺失值解析为 NaT"""
+    numeric = pd.to_numeric(values, errors='coerce')
+    if (numeric.isna() & values.notna()).any():
+        return None
+    mask = numeric.notna().to_numpy()
+    numbers = numeric.to_numpy(dtype=np.float64, na_value=0)[mask]
+    if not (numbers == np.floor(numbers)).all():
+        return None
+    composed = _compose_timestamps(numbers.astype(np.int64))
+    if composed is None:
+        return None
+    result = np.full(len(values), np.datetime64('NaT'), dtype='datetime64[ns]')
+    result[mask] = composed
+    return pd.Series(result, index=values.index)
+
+
+def detect_time_format(values: pd.Series) -> str:
+    """检测交易时间的存储格式
+
+    Returns:
+        str: 'datetime'（已是日期时间）、'numeric'（YYYYMMDDhhmmss 数字/数字文本）、
+             strftime 格式串，或 'mixed'（逐个推断）
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return 'datetime'
+    if pd.api.types.is_numeric_dtype(values):
+        return 'numeric'
+    sample = values.dropna().head(1000).astype(str).str.strip()
+    if sample.empty or sample.str.fullmatch(r'\d{1,14}(\.0+)?').all():
+        return 'numeric'
+    if guess_datetime_format is None:
+        return 'mixed'
+    return guess_datetime_format(sample.iloc[0]) or 'mixed'
+
+
+def parse_transaction_time(values: pd.Series, source: str = None) -> pd.Series:
+    """将 交易时间 转换为 datetime64[ns]
+
+    按来源文件检测一次格式并缓存：已是日期时间的直接返回；YYYYMMDDhhmmss 形式的
+    数字（含纯数字文本）按位运算组装，不经过逐个字符串解析；其他文本按检测到的格式解析。
+    缓存的格式不适用于当前分块时重新检测，仍无法解析的按原有方式补齐 14 位后解析（报错与原来一致）。
+
+    Args:
+        values: 交易时间列
+        source: 数据来源（文件路径），用于缓存检测到的格式
+    Returns:
+        pd.Series: 索引与 values 一致
+    """
+    cached = _TIME_FORMAT_CACHE.get(source) if source else None
+    for time_format in ([cached] if cached else []) + [None]:
+        if time_format is None:
+            time_format = detect_time_format(values)
+        if time_format == 'datetime':
+            parsed = values if pd.api.types.is_datetime64_any_dtype(values) else None
+        elif time_format == 'numeric':
+            parsed = _parse_numeric_timestamps(values)
+        else:
+            try:
+                parsed = pd.to_datetime(values, format=time_format)
+            except (ValueError, TypeError):
+                parsed = None
+        if parsed is not None:
+            if source:
+                _TIME_FORMAT_CACHE[source] = time_format
+            return parsed
+
+    return pd.to_datetime(values.astype(str).str.pad(14, fillchar='0'), format='%Y%m%d%H%M%S')
+
+
+def add_transaction_time(df: pd.DataFrame, source: str = None) -> pd.DataFrame:
+    """按来源文件解析交易时间，生成 交易日期时间 列（缺少 交易时间 列时原样返回）"""
+    if '交易时间' in df.columns:
+        df['交易日期时间'] = parse_transaction_time(df['交易时间'], source)
+    return df
+
+
+def prepare_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """基础处理：解析交易时间（读取阶段未解析时）并剔除付款失败的流水"""
+    if not pd.api.types.is_datetime64_any_dtype(df.get('交易日期时间')):
+        df['交易日期时间'] = parse_transaction_time(df['交易时间'])
+    return df[df['备注'] != "付款失败"]
+
+
+def build_name_lookup(df: pd.DataFrame) -> pd.DataFrame:
+    """构建 df_received_name：每个收款账号最新一次交易的商户名称"""
+    df_received = df[df['借贷标志'] == '贷'].copy()
+    df_received = df_received.sort_values('交易日期时间', ascending=False)
+    df_received_name = df_received.drop_duplicates(
+        subset=['收款方支付账号', '收款方的商户名称'], keep='first'
+    )[['收款方支付账号', '收款方的商户名称', '交易日期时间']]
+    df_received_name = df_received_name.sort_values('交易日期时间', ascending=False)
+    df_received_name = df_received_name.drop_duplicates(subset=['收款方支付账号'], keep='first')
+    df_received_name = df_received_name.rename(
+        columns={'收款方支付账号': '账号', '收款方的商户名称': '系统姓名'}
+    )
+    return df_received_name
+
+
+def build_system_account_lookup(df: pd.DataFrame) -> pd.DataFrame:
+    """构建 df_system_account：每个支付账号最新一次交易对应的查询账号"""
+    df_borrow = df[df['借贷标志'] == '借'].copy()
+    df_borrow = df_borrow.sort_values('交易日期时间', ascending=False)
+    df_borrow_acc = df_borrow[['查询账号', '付款方支付账号', '交易日期时间']]
+    df_borrow_acc = df_borrow_acc.rename(columns={'付款方支付账号': '支付账号'})
+
+    df_credit = df[df['借贷标志'] == '贷'].copy()
+    df_credit = df_credit.sort_values('交易日期时间', ascending=False)
+    df_credit_acc = df_credit[['查询账号', '收款方支付账号', '交易日期时间']]
+    df_credit_acc = df_credit_acc.rename(columns={'收款方支付账号': '支付账号'})
+
+    df_system_account = pd.concat([df_borrow_acc, df_credit_acc], ignore_index=True)
+    # 只保留 查询账号 ≠ 支付账号 且 支付账号长度 > 3
+    df_system_account = df_system_account[
+        (df_system_account['查询账号'] != df_system_account['支付账号']) &
+        (df_system_account['支付账号'].astype(str).str.len() > 3)
+    ]
+
+    # 优先保留支付账号<>查询账号，再按时间倒序，仅保留每个支付账号的最新一条
+    df_system_account = df_system_account.sort_values('交易日期时间', ascending=False)
+    df_system_account = df_system_account.drop_duplicates(subset=['支付账号'], keep='first')
+    return df_system_account
+
+
+def enrich_pair_result(result: pd.DataFrame, df_received_name: pd.DataFrame,
+                       df_system_account: pd.DataFrame) -> pd.DataFrame:
+    """为交易对手汇总结果补充系统姓名、调证账号、对手账户类型等字段
+
+    Args:
+        result: aggregate_pair_stats 的输出
+        df_received_name: build_name_lookup 的输出
+        df_system_account: build_system_account_lookup 的输出
+    Returns:
+        pd.DataFrame: 最终结果表
+    """
+    # 5~6. 匹配系统姓名、对手系统姓名、调证账号、对手账号
+    # 用户id 与交易对手合并后只做一次哈希分解，每个不同账号只查一次映射表（两张表中账号均唯一），
+    # 之后按整数编号取值，代替原先的四次 merge（每次都复制整张结果表）
+    n_pairs = len(result)
+    codes, accounts = pd.factorize(
+        pd.concat([result['用户id'], result['交易对手']], ignore_index=True),
+        use_na_sentinel=False
+    )
+    accounts = pd.Index(accounts)
+    # 保持映射表原有的数组类型，按编号取值时不再逐个转换字符串
+    account_names = df_received_name.set_index('账号')['系统姓名'].reindex(accounts).array
+    query_accounts = df_system_account.set_index('支付账号')['查询账号'].reindex(accounts).array
+    # 账户类型只取决于系统姓名，同样按账号计算一次；先转为文本类型，加入结果表时不再逐行推断类型
+    account_types = pd.array(classify_account_types(pd.Series(account_names)), dtype='str')
+    user_codes, opponent_codes = codes[:n_pairs], codes[n_pairs:]
+
+    # 过滤掉没有调证账号的记录
+    user_query = pd.Series(query_accounts.take(user_codes))
+    keep = np.flatnonzero((user_query.notna() & (user_query != 'nan')).to_numpy(dtype=bool))
+    user_codes, opponent_codes = user_codes[keep], opponent_codes[keep]
+    del codes, user_query
+
+    # 先按编号取出查表得到的列（字段类型强制为文本），再按块取出保留的行并一次加入这些列：
+    # 不先复制整张表再逐列插入，取值时的临时数组也不与结果表同时占用内存
+    added = {
+        '调证账号': pd.Series(query_accounts.take(user_codes)).astype(str).array,
+        '对手账号': pd.Series(query_accounts.take(opponent_codes)).astype(str).array,
+        '系统姓名': account_names.take(user_codes),
+        '对手系统姓名': account_names.take(opponent_codes),
+        '对手账户类型': account_types.take(opponent_codes),
+    }
+    del user_codes, opponent_codes
+    result = result.take(keep).assign(
+        用户id=lambda df: df['用户id'].astype(str),
+        交易对手=lambda df: df['交易对手'].astype(str),
+        **added
+    )
+
+    # 7. 调整列顺序
+    final_columns = [
+        '用户id', '调证账号', '系统姓名', '交易对手', '对手账号', 
+        '对手账户类型', '对手系统姓名', '交易笔数', '收入笔数', '支出笔数',
+        '进出类型', '流水总额', '净流入金额', '最早交易时间', '最新交易时间',
+        '交易天数跨度', '收入金额', '支出金额', '平均单笔收入金额',
+        '平均单笔支出金额', '最大单笔收入金额', '最大单笔支出金额',
+        '交易备注', '关联交易详情'
+    ]
+    # 输出交易明细表时以 交易对ID 关联；未生成关联交易详情时不含该列
+    if '交易对ID' in result.columns:
+        final_columns.insert(0, '交易对ID')
+
+    # 写时复制机制下按列名选择不再复制数据
+    return result[[col for col in final_columns if col in result.columns]]
+
+
+class StreamingPairAggregator:
+    """流式累加交易对手统计量
+
+    每块流水都折叠进按交易对手维护的累计值（笔数、金额合计、最大值、时间范围、备注），
+    系统姓名和调证账号按账号只保留最新一条，因此内存占用取决于交易对手和账号数量，
+    与流水行数无关。唯一需要逐笔保留的是关联交易详情所需的（组号, 时间, 借贷, 金额），
+    可以通过 keep_details=False 关闭。指定 on_transactions 时，每块流水的交易明细表
+    （交易对ID 为此处的组号）交给该回调逐块写出，不在内存中保留。
+    """
+
+    SUM_COLUMNS = ['交易笔数', '流水总额', '收入笔数', '收入金额', '支出笔数', '支出金额']
+    MAX_COLUMNS = ['最大单笔收入金额', '最大单笔支出金额', '最新交易时间']
+    MIN_COLUMNS = ['最早交易时间']
+    COUNT_COLUMNS = ['交易笔数', '收入笔数', '支出笔数']
+
+    def __init__(self, keep_details: bool = True, on_transactions: Callable = None):
+        self.keep_details = keep_details
+        self.on_transactions = on_transactions
+        self.pair_ids = {}  # (付款方支付账号, 收款方支付账号) -> 组号
+        self.state = {}  # 列名 -> 按组号排列的累计值数组
+        self.remarks = {}  # 组号 -> 按首次出现顺序排列的备注
+        self.name_lookup = None
+        self.system_account_lookup = None
+        self._details = []
+        self._grow_state()
+
+    @staticmethod
+    def _keep_latest(current: pd.DataFrame, chunk: pd.DataFrame, key: str) -> pd.DataFrame:
+        """合并两份映射表，每个账号只保留交易时间最新的一条"""
+        if current is None:
+            return chunk
+        merged = pd.concat([current, chunk], ignore_index=True)
+        merged = merged.sort_values('交易日期时间', ascending=False, kind='mergesort')
+        return merged.drop_duplicates(subset=[key], keep='first')
+
+    def _grow_state(self):
+        """为新出现的交易对手扩展累计值数组（金额统一按浮点数累计）"""
+        n_pairs = len(self.pair_ids)
+        for col in self.SUM_COLUMNS + self.MAX_COLUMNS + self.MIN_COLUMNS:
+            current = self.state.get(col)
+            size = n_pairs - (0 if current is None else len(current))
+            if col in self.COUNT_COLUMNS:
+                fill = np.zeros(size, dtype=np.int64)
+            elif col.endswith('时间'):
+                fill = np.full(size, np.datetime64('NaT'), dtype='datetime64[ns]')
+            elif col in self.SUM_COLUMNS:
+                fill = np.zeros(size, dtype=np.float64)
+            else:
+                fill = np.full(size, np.nan, dtype=np.float64)
+            self.state[col] = fill if current is None else np.concatenate([current, fill])
+
+    def add_chunk(self, df: pd.DataFrame):
+        """折叠一块已映射、已去重的流水"""
+        df = prepare_transactions(df)
+        self.name_lookup = self._keep_latest(self.name_lookup, build_name_lookup(df), '账号')
+        self.system_account_lookup = self._keep_latest(
+            self.system_account_lookup, build_system_account_lookup(df), '支付账号'
+        )
+
+        df = df.dropna(subset=PAIR_KEYS)
+        if df.empty:
+            return
+
+        pair_index, local_id, partial = summarize_pairs(df)
+        global_id = np.fromiter(
+            (self.pair_ids.setdefault(pair, len(self.pair_ids)) for pair in pair_index),
+            dtype=np.int64, count=len(pair_index)
+        )
+        self._grow_state()
+
+        # 块内每个交易对手只出现一次，可以直接按组号累加
+        for col in self.SUM_COLUMNS:
+            self.state[col][global_id] += partial[col].to_numpy()
+        for col in self.MAX_COLUMNS:
+            self.state[col][global_id] = np.fmax(self.state[col][global_id], partial[col].to_numpy())
+        for col in self.MIN_COLUMNS:
+            self.state[col][global_id] = np.fmin(self.state[col][global_id], partial[col].to_numpy())
+
+        pair_id = global_id[local_id]
+        if self.on_transactions is not None:
+            self.on_transactions(build_transaction_table(pair_id, df))
+        remarks = pd.DataFrame({'组号': pair_id, '备注': df['备注'].to_numpy()}).dropna()
+        remarks = remarks.drop_duplicates(keep='first')
+        for gid, remark in zip(remarks['组号'].to_numpy(), remarks['备注'].to_numpy()):
+            self.remarks.setdefault(gid, {}).setdefault(str(remark), None)
+
+        if self.keep_details:
+            self._details.append((
+                pair_id,
+                df['交易日期时间'].to_numpy(),
+                (df['借贷标志'] == '贷').to_numpy(),
+                df['交易金额'].to_numpy(),
+            ))
+
+    def _merged_details(self):
+        """把逐块保存的详情数组合并为一组（组号, 时间, 是否为贷, 金额）"""
+        if len(self._details) > 1:
+            self._details = [tuple(np.concatenate(parts) for parts in zip(*self._details))]
+        return self._details[0] if self._details else None
+
+    def drop_details(self):
+        """不再保留关联交易详情所需的数据，之后导出的累计值也不含这部分"""
+        self.keep_details = False
+        self._details = []
+
+    def get_state(self) -> dict:
+        """导出全部累计值，供增量模式保存"""
+        return {
+            'keep_details': self.keep_details,
+            'pairs': list(self.pair_ids),
+            'state': self.state,
+            'remarks': self.remarks,
+            'name_lookup': self.name_lookup,
+            'system_account_lookup': self.system_account_lookup,
+            'details': self._merged_details(),
+        }
+
+    @classmethod
+    def from_state(cls, saved: dict) -> 'StreamingPairAggregator':
+        """由 get_state 导出的累计值恢复"""
+        aggregator = cls(keep_details=saved['keep_details'])
+        aggregator.pair_ids = {pair: i for i, pair in enumerate(saved['pairs'])}
+        aggregator.state = saved['state']
+        aggregator.remarks = saved['remarks']
+        aggregator.name_lookup = saved['name_lookup']
+        aggregator.system_account_lookup = saved['system_account_lookup']
+        aggregator._details = [saved['details']] if saved['details'] is not None else []
+        return aggregator
+
+    def finalize(self, pair_details: bool = True, with_pair_ids: bool = False):
+        """生成交易对手汇总表及两张映射表，结果与一次性处理一致（按账号排序）
+
+        Args:
+            pair_details: 是否输出关联交易详情列（keep_details=False 时该列为空）
+            with_pair_ids: 结果表首列增加 交易对ID（即组号，与逐块写出的交易明细表对应）
+        Returns:
+            tuple: (result, df_received_name, df_system_account)
+        """
+        n_pairs = len(self.pair_ids)
+        pair_index = pd.MultiIndex.from_tuples(list(self.pair_ids), names=PAIR_KEYS)
+        partial = pd.DataFrame(self.state)
+        remarks = pd.Series(['; '.join(self.remarks.get(i, ())) for i in range(n_pairs)], dtype=object)
+
+        if not pair_details:
+            details = None
+        elif self.keep_details and self._details:
+            pair_id, ts, is_credit, amount = self._merged_details()
+            details = build_transaction_details(pair_id, pd.DataFrame({
+                '交易日期时间': ts,
+                '借贷标志': np.where(is_credit, '贷', '借'),
+                '交易金额': amount,
+            }), n_pairs)
+        else:
+            details = pd.Series([''] * n_pairs, dtype=object)
+
+        result = finish_pair_stats(pair_index, partial, remarks, details)
+        if with_pair_ids:
+            result.insert(0, '交易对ID', np.arange(n_pairs, dtype=np.int64))
+        result = result.sort_values(['用户id', '交易对手'], kind='mergesort').reset_index(drop=True)
+        return result, self.name_lookup, self.system_account_lookup
+
+
+def file_fingerprint(file_path: str) -> tuple:
+    """（绝对路径, 大小, 修改时间），用于判断文件是否已合并过"""
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+
+def load_incremental_state(state_path: str) -> dict:
+    """读取增量模式的累计状态，不存在或版本不符时返回 None"""
+    if not os.path.exists(state_path):
+        return None
+    saved = pd.read_pickle(state_path)
+    if saved.get('version') != INCREMENTAL_STATE_VERSION:
+        return None
+    return saved
+
+
+def save_incremental_state(state_path: str, aggregator: StreamingPairAggregator, processed_files: set):
+    """保存增量模式的累计状态（先写临时文件再替换，避免中途失败损坏已有状态）"""
+    tmp_path = state_path + '.tmp'
+    pd.to_pickle({
+        'version': INCREMENTAL_STATE_VERSION,
+        'aggregator': aggregator.get_state(),
+        'processed_files': processed_files,
+    }, tmp_path)
+    os.replace(tmp_path, state_path)
+
+
+# 必需字段（字段映射的目标字段名）
+REQUIRED_COLUMNS = [
+    '查询账号', '付款方支付账号', '收款方支付账号', '支付机构内部订单号',
+    '交易时间', '借贷标志', '交易金额', '交易余额', '付款方银行卡号',
+    '收款方银行卡号', '交易类型', '收款方的商户名称', '备注'
+]
+
+# 去重方式及其依据的字段（映射后的目标字段名）
+DEDUP_BY_ORDER_NO = "根据【流水号】去重"
+DEDUP_BY_FIELDS = "根据【两端账号+日期时间+借贷方向+交易金额】去重"
+DEDUP_METHOD_COLUMNS = {
+    DEDUP_BY_ORDER_NO: ["支付机构内部订单号"],
+    DEDUP_BY_FIELDS: ["付款方支付账号", "收款方支付账号", "交易时间", "借贷标志", "交易金额"],
+}
+
+# 选择文件夹时读取的文件；Parquet 需单独选择（结果表、明细表也可能保存为 Parquet）
+DATA_FILE_PATTERNS = ['*.xlsx', '*.xls', '*.csv', '*.txt']
+MAPPING_PROFILE_VERSION = 2
+
+
+def collect_data_files(paths: List[str]) -> List[str]:
+    """展开输入路径：文件原样保留，文件夹取其中的 Excel/CSV/TXT 文件（不递归），去除重复"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = [str(f) for ext in DATA_FILE_PATTERNS for f in Path(path).glob(ext)]
+        else:
+            candidates = [str(path)]
+        for file in candidates:
+            if file not in files:
+                files.append(file)
+    return files
+
+
+def default_output_name(extension: str = '.xlsx') -> str:
+    """结果表默认文件名"""
+    return f"【结果表】资金分析反馈{pd.Timestamp.now().strftime('%Y-%m-%d %H%M')}{extension}"
+
+
+def transaction_table_path(output_file: str) -> str:
+    """交易明细表路径：与结果表同目录、同名，加 TRANSACTION_TABLE_SUFFIX 后缀"""
+    return os.path.splitext(output_file)[0] + TRANSACTION_TABLE_SUFFIX
+
+
+def default_state_path(files: List[str]) -> str:
+    """增量模式的累计状态文件：保存在首个文件所在目录"""
+    return os.path.join(os.path.dirname(files[0]), INCREMENTAL_STATE_FILE)
+
+
+def load_mapping_profile(profile_path: str) -> dict:
+    """读取映射方案（JSON）
+
+    Returns:
+        dict: {'column_mapping': 默认映射 {目标字段: 源数据列}, 'dedup_method': 去重方式或 None,
+               'header_mappings': {表头指纹: {'columns': 列名, 'column_mapping': 映射}}}
+    """
+    with open(profile_path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    mapping = profile.get('column_mapping')
+    if not isinstance(mapping, dict):
+        raise ValueError(f"映射方案格式错误（缺少 column_mapping）：{profile_path}")
+    dedup_method = profile.get('dedup_method')
+    if dedup_method is not None and dedup_method not in DEDUP_METHOD_COLUMNS:
+        raise ValueError(f"映射方案中的去重方式无法识别：{dedup_method}")
+    # 早期版本的映射方案只有一个映射，没有按表头区分
+    header_mappings = profile.get('header_mappings') or {}
+    return {'column_mapping': mapping, 'dedup_method': dedup_method, 'header_mappings': header_mappings}
+
+
+def save_mapping_profile(profile_path: str, column_mapping: Dict[str, str], dedup_method: str = None,
+                         header_mappings: Dict[str, dict] = None):
+    """保存映射方案（JSON），供命令行批处理使用"""
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': MAPPING_PROFILE_VERSION,
+            'column_mapping': column_mapping,
+            'dedup_method': dedup_method,
+            'header_mappings': header_mappings or {},
+        }, f, ensure_ascii=False, indent=2)
+
+
+class FundFlowEngine:
+    """资金分析流程：读取 → 字段映射 → 去重 → 汇总 → 写出
+
+    不依赖任何界面，图形界面和命令行共用。每个文件按表头单独确定字段映射，依次查找：
+    映射方案中的表头映射、映射库（profile_store）、默认映射（column_mapping，需与表头相符）、
+    列名与必需字段完全一致时的同名映射；都找不到的文件由 resolve_file_mappings 返回给调用方。
+    进度、警告和单个文件的读取错误通过回调通知调用方：
+        on_progress(text, percent)：percent 为 None 时只更新文字
+        on_warning(message)
+        on_file_error(file, error)：未提供时直接抛出异常
+    transaction_table=True 时同时生成以 交易对ID 关联结果表的交易明细表（Parquet），
+    运行期间先写入首个文件所在目录的临时文件，write 时移动到结果表旁边；
+    此时可以用 pair_details=False 省去拼接关联交易详情文本。
+    backend='duckdb' 时一次性处理和流式处理改由 DuckDB 按 SQL 执行（见 fund_flow_sql），
+    结果与 pandas 实现一致；增量模式仍使用 pandas。
+    """
+
+    def __init__(self, column_mapping: Dict[str, str] = None, dedup_method: str = None,
+                 max_workers: int = 1, use_cache: bool = False,
+                 on_progress: Callable = None, on_warning: Callable = None,
+                 on_file_error: Callable = None, header_mappings: Dict[str, dict] = None,
+                 profile_store: MappingProfileStore = None,
+                 transaction_table: bool = False, pair_details: bool = True, backend: str = 'pandas'):
+        if transaction_table and not HAS_PYARROW:
+            raise ValueError("输出交易明细表需要安装 pyarrow")
+        if backend not in PROCESS_BACKENDS:
+            raise ValueError(f"未知的计算引擎：{backend}")
+        self.column_mapping = column_mapping or {}  # 默认映射：目标字段 -> 源数据列
+        self.dedup_method = dedup_method  # None 表示不去重
+        self.header_mappings = MappingProfileStore(None)
+        self.header_mappings.update(header_mappings or {})
+        self.profile_store = profile_store
+        self.file_headers = {}  # 文件 -> 表头
+        self.file_mappings = {}  # 文件 -> 字段映射
+        self.max_workers = max(1, int(max_workers))
+        self.use_cache = use_cache
+        self.on_progress = on_progress
+        self.on_warning = on_warning
+        self.on_file_error = on_file_error
+        self.transaction_table = transaction_table
+        self.pair_details = pair_details
+        self.backend = backend
+        self.transaction_file = None  # 本次运行生成、尚未随结果表写出的交易明细表（临时文件）
+        self._transaction_writer = None
+
+    @classmethod
+    def from_profile(cls, profile_path: str, **kwargs) -> 'FundFlowEngine':
+        """按保存的映射方案创建"""
+        profile = load_mapping_profile(profile_path)
+        return cls(column_mapping=profile['column_mapping'], dedup_method=profile['dedup_method'],
+                   header_mappings=profile['header_mappings'], **kwargs)
+
+    def progress(self, text: str, percent: float = None):
+        if self.on_progress:
+            self.on_progress(text, percent)
+
+    def warn(self, message: str):
+        if self.on_warning:
+            self.on_warning(message)
+
+    def file_error(self, file: str, error: Exception):
+        if self.on_file_error is None:
+            raise error
+        self.on_file_error(file, error)
+
+    def mapping_for_header(self, columns: List[str]) -> Union[Dict[str, str], None]:
+        """按表头查找字段映射，找不到时返回 None"""
+        for store in (self.header_mappings, self.profile_store):
+            if store is not None:
+                mapping = store.get(columns)
+                if mapping is not None and mapping_fits(mapping, columns):
+                    return mapping
+        if mapping_fits(self.column_mapping, columns):
+            return dict(self.column_mapping)
+        if all(col in columns for col in REQUIRED_COLUMNS):
+            return {col: col for col in REQUIRED_COLUMNS}
+        return None
+
+    def resolve_file_mappings(self, files: List[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+        """确定每个文件的字段映射（只读取表头）
+
+        Returns:
+            dict: 找不到映射的表头 {表头指纹: (列名, [文件])}，同一种表头只需映射一次
+        """
+        unresolved = {}
+        for file in files:
+            if file in self.file_mappings:
+                continue
+            try:
+                columns = read_header(file)
+            except Exception as e:
+                self.file_error(file, e)
+                continue
+            if columns is None:
+                continue
+            self.file_headers[file] = columns
+            mapping = self.mapping_for_header(columns)
+            if mapping is None:
+                unresolved.setdefault(header_fingerprint(columns), (columns, []))[1].append(file)
+            else:
+                self.file_mappings[file] = mapping
+        return unresolved
+
+    def set_header_mapping(self, columns: List[str], files: List[str], column_mapping: Dict[str, str]):
+        """为某种表头指定映射，并记入映射库，之后相同表头的文件自动套用"""
+        for file in files:
+            self.file_mappings[file] = column_mapping
+        if self.profile_store is not None:
+            self.profile_store.put(columns, column_mapping)
+
+    def export_header_mappings(self) -> Dict[str, dict]:
+        """已确定的各表头映射（用于保存映射方案）"""
+        exported = {}
+        for file, mapping in self.file_mappings.items():
+            columns = self.file_headers.get(file)
+            if columns is not None:
+                exported[header_fingerprint(columns)] = {'columns': columns, 'column_mapping': mapping}
+        return exported
+
+    def get_rename_dict(self, file: str) -> Dict[str, str]:
+        """文件对应的重命名字典（源数据列 -> 目标字段）"""
+        mapping = self.file_mappings.get(file, self.column_mapping)
+        return {v: k for k, v in mapping.items() if v}
+
+    def mapped_files(self, files: List[str]) -> List[str]:
+        """确定各文件的映射，跳过找不到映射或无法读取表头的文件"""
+        for columns, unmatched in self.resolve_file_mappings(files).values():
+            for file in unmatched:
+                self.file_error(file, ValueError("表头没有匹配的字段映射，请先在映射方案中保存该表头的映射"))
+        return [file for file in files if file in self.file_mappings]
+
+    def new_transaction_file(self, files: List[str]) -> str:
+        """为本次运行的交易明细表创建临时文件（首个文件所在目录），丢弃上次未写出的明细表"""
+        self.discard_transaction_table()
+        fd, self.transaction_file = tempfile.mkstemp(
+            prefix='【交易明细】', suffix='.tmp.parquet', dir=os.path.dirname(os.path.abspath(files[0]))
+        )
+        os.close(fd)
+        return self.transaction_file
+
+    def discard_transaction_table(self):
+        """删除尚未写出的交易明细表（运行出错或取消保存时调用）"""
+        if self._transaction_writer is not None:
+            self._transaction_writer.close()
+            self._transaction_writer = None
+        if self.transaction_file is not None:
+            if os.path.exists(self.transaction_file):
+                os.remove(self.transaction_file)
+            self.transaction_file = None
+
+    def prune_transaction_table(self, result: pd.DataFrame, n_pairs: int):
+        """已逐块写出的交易明细表中去掉结果表未保留的交易对手（没有调证账号）的流水
+
+        n_pairs 为补充调证账号之前的交易对手数，没有交易对手被去掉时不必重写。
+        """
+        if len(result) == n_pairs:
+            return
+        self.progress("正在整理交易明细表...")
+        filter_parquet_rows(self.transaction_file, '交易对ID', result['交易对ID'].to_numpy())
+
+    def get_parsed_cache(self) -> Union[ParsedFileCache, None]:
+        """启用缓存且已安装 pyarrow 时返回解析缓存"""
+        if not self.use_cache or not ParsedFileCache.available():
+            return None
+        try:
+            return ParsedFileCache()
+        except OSError:
+            return None
+
+    def get_dedup_columns(self, columns) -> Union[List[str], None]:
+        """返回去重依据的字段（映射后的目标字段名），不去重或缺少字段时返回 None"""
+        if self.dedup_method is None:
+            return None
+        cols_to_check = DEDUP_METHOD_COLUMNS[self.dedup_method]
+        missing_cols = [col for col in cols_to_check if col not in columns]
+        if missing_cols:
+            if len(cols_to_check) == 1:
+                self.warn(f"找不到映射的列：{missing_cols[0]}")
+            else:
+                self.warn(f"找不到以下映射的列：{', '.join(missing_cols)}")
+            return None
+        return cols_to_check
+
+    def apply_deduplication(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按去重方式去除重复流水"""
+        cols_to_check = self.get_dedup_columns(df.columns)
+        if cols_to_check:
+            df = df.drop_duplicates(subset=cols_to_check, keep='first')
+        return df
+
+    def read_all_files(self, files: List[str]) -> List[pd.DataFrame]:
+        """读取并映射所有文件
+
+        先查询解析缓存，未命中的文件在进程数大于 1 时用进程池并行解析，字段映射在子进程中完成；
+        结果按文件顺序返回，保证去重 keep='first' 的语义不变。
+        """
+        cache = self.get_parsed_cache()
+        total_files = len(files)
+        results = [None] * total_files
+        done = 0
+
+        def report(i, note=""):
+            nonlocal done
+            done += 1
+            self.progress(
+                f"已读取 {done}/{total_files}{note}: {os.path.basename(files[i])}",
+                done / total_files * 50
+            )
+
+        pending = []
+        for i, file in enumerate(files):
+            df = cache.get(file, self.get_rename_dict(file)) if cache else None
+            if df is None:
+                pending.append(i)
+            else:
+                results[i] = df
+                report(i, "（缓存）")
+
+        if self.max_workers > 1 and len(pending) > 1:
+            workers = min(self.max_workers, len(pending))
+            self.progress(f"正在并行读取 {len(pending)} 个文件（{workers} 个进程）...")
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(read_mapped_file, files[i], self.get_rename_dict(files[i])): i
+                    for i in pending
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        self.file_error(files[i], e)
+                    report(i)
+        else:
+            for i in pending:
+                self.progress(f"正在读取文件: {os.path.basename(files[i])}...")
+                try:
+                    results[i] = read_mapped_file(files[i], self.get_rename_dict(files[i]))
+                except Exception as e:
+                    self.file_error(files[i], e)
+                report(i)
+
+        if cache:
+            for i in pending:
+                if results[i] is not None:
+                    cache.put(files[i], self.get_rename_dict(files[i]), results[i])
+            # 命中缓存的使用时间一次写入索引
+            cache.flush()
+
+        return [df for df in results if df is not None]
+
+    @staticmethod
+    def iter_data_chunks(file_path: str, chunksize: int = STREAM_CHUNK_SIZE):
+        """分块读取数据文件：CSV/TXT/Parquet 按 chunksize 行分块，Excel 整表作为一块"""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in ['.xlsx', '.xls']:
+            yield pd.read_excel(file_path)
+        elif ext == '.parquet':
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(file_path).iter_batches(batch_size=chunksize):
+                yield batch.to_pandas()
+        elif ext == '.csv':
+            yield from pd.read_csv(file_path, chunksize=chunksize)
+        elif ext == '.txt':
+            yield from pd.read_csv(file_path, sep='\t', chunksize=chunksize)
+
+    @staticmethod
+    def process_data(df: pd.DataFrame, pair_details: bool = True, with_transactions: bool = False):
+        """处理已映射、已去重的流水（对应SQL模型的逻辑，SQL 实现见 fund_flow_sql）
+
+        with_transactions=True 时返回 (结果表, 交易明细表)，见 aggregate_pair_stats
+        """
+        # 1. 基础处理
+        df = prepare_transactions(df)
+
+        # 1.1 构建 df_received_name / 1.2 构建 df_system_account
+        df_received_name = build_name_lookup(df)
+        df_system_account = build_system_account_lookup(df)
+
+        # 2~4. 按交易对手分组统计（向量化聚合）
+        result = aggregate_pair_stats(df, pair_details, with_transactions)
+        if with_transactions:
+            result, transactions = result
+
+        # 5~7. 匹配系统姓名、调证账号并计算对手账户类型
+        result = enrich_pair_result(result, df_received_name, df_system_account)
+        return (result, transactions) if with_transactions else result
+
+    def run_full(self, files: List[str]) -> pd.DataFrame:
+        """一次性处理：读取全部文件合并后去重并汇总"""
+        all_data = self.read_all_files(files)
+        if not all_data:
+            raise ValueError("没有成功读取任何数据文件")
+
+        self.progress("正在合并数据...")
+        combined_df = pd.concat(all_data, ignore_index=True)
+
+        self.progress("正在应用去重逻辑...")
+        combined_df = self.apply_deduplication(combined_df)
+
+        self.progress("正在处理数据...")
+        if not self.transaction_table:
+            return self.process_data(combined_df, self.pair_details)
+
+        result, transactions = self.process_data(combined_df, self.pair_details, with_transactions=True)
+        self.progress("正在写出交易明细表...")
+        # 没有调证账号的交易对手不出现在结果表中，其流水也不写入明细表
+        transactions = transactions[np.isin(transactions['交易对ID'].to_numpy(), result['交易对ID'].to_numpy())]
+        write_parquet(transactions, self.new_transaction_file(files))
+        return result
+
+    def run_streaming(self, files: List[str], state_path: str = None) -> pd.DataFrame:
+        """流式处理：逐文件分块读取、映射、去重，并折叠进交易对手累计值
+
+        指定 state_path 时为增量模式：先加载已有的累计状态（交易对手累计值、名称映射、
+        已出现的去重键、已合并的文件），跳过已合并过的文件，只处理新增流水，完成后保存状态。
+        交易明细表逐块写出；增量模式不输出交易明细表（明细需包含历次合并的全部流水）。
+        """
+        if self.transaction_table and state_path:
+            self.warn("增量模式不输出交易明细表，请使用一次性处理或流式处理")
+        elif self.transaction_table:
+            self._transaction_writer = ParquetChunkWriter(self.new_transaction_file(files))
+        aggregator = StreamingPairAggregator(
+            keep_details=self.pair_details,
+            on_transactions=self._transaction_writer.write if self._transaction_writer else None
+        )
+        processed_files = set()
+        dedup_path = os.path.join(os.path.dirname(state_path), DEDUP_INDEX_DIR) if state_path else None
+
+        saved = load_incremental_state(state_path) if state_path else None
+        if saved is not None:
+            aggregator = StreamingPairAggregator.from_state(saved['aggregator'])
+            processed_files = saved['processed_files']
+            # 不生成关联交易详情时累计状态中也不保留所需的逐笔数据；一旦丢弃，之后的批次无法再补全该列
+            if not self.pair_details:
+                aggregator.drop_details()
+            elif not aggregator.keep_details:
+                self.warn("之前的批次未生成关联交易详情，累计状态中没有所需的数据，关联交易详情列为空")
+
+        # 增量模式下去重索引保存在磁盘上，以内存映射方式加载；没有累计状态时从空索引开始
+        dedup_index = DedupKeyIndex(dedup_path if saved is not None else None)
+        dedup_columns = dedup_index.columns
+        if dedup_index.outdated:
+            self.warn("已有的去重索引由旧版本生成，历史流水不参与本次去重")
+
+        first_chunk = True
+        total_files = len(files)
+
+        for i, file in enumerate(files):
+            fingerprint = file_fingerprint(file)
+            if fingerprint in processed_files:
+                self.progress(f"已合并过，跳过: {os.path.basename(file)}", (i + 1) / total_files * 90)
+                continue
+
+            self.progress(f"正在流式读取文件: {os.path.basename(file)}...")
+            rename_dict = self.get_rename_dict(file)
+            try:
+                for chunk in self.iter_data_chunks(file):
+                    chunk = apply_mapping(chunk, rename_dict, file)
+
+                    # 去重键在所有分块、所有文件（增量模式下包括历史批次）之间共享
+                    if first_chunk:
+                        current_columns = self.get_dedup_columns(chunk.columns)
+                        if current_columns != dedup_columns and len(dedup_index):
+                            self.warn("去重方式与已有累计状态不一致，历史流水不参与本次去重")
+                        if current_columns != dedup_columns:
+                            dedup_index.reset(current_columns)
+                        dedup_columns = current_columns
+                        first_chunk = False
+                    if dedup_columns:
+                        chunk = chunk[dedup_index.filter_new(hash_dedup_keys(chunk, dedup_columns))]
+
+                    aggregator.add_chunk(chunk)
+            except Exception as e:
+                # 增量模式下不能保存只合并了一部分的文件，整体中止
+                if state_path:
+                    raise
+                self.file_error(file, e)
+                continue
+
+            processed_files.add(fingerprint)
+            self.progress(f"已处理: {os.path.basename(file)}", (i + 1) / total_files * 90)
+
+        if state_path:
+            self.progress("正在保存累计状态...")
+            # 先保存累计状态再保存去重索引：中途失败时最多导致下次少去重，不会误删流水
+            save_incremental_state(state_path, aggregator, processed_files)
+            dedup_index.save(dedup_path)
+
+        with_pair_ids = self._transaction_writer is not None
+        if with_pair_ids:
+            self._transaction_writer.close(empty=pd.DataFrame(columns=TRANSACTION_TABLE_COLUMNS))
+            self._transaction_writer = None
+
+        self.progress("正在汇总结果...")
+        pair_result = aggregator.finalize(self.pair_details, with_pair_ids)
+        n_pairs = len(pair_result[0])
+        result = enrich_pair_result(*pair_result)
+        if with_pair_ids:
+            self.prune_transaction_table(result, n_pairs)
+        return result
+
+    def run_sql(self, files: List[str]) -> pd.DataFrame:
+        """DuckDB 引擎：CSV/TXT/Parquet 由 DuckDB 直接读取，合并、去重、汇总均在 SQL 中完成
+
+        DuckDB 多线程执行，数据超出内存时溢写到磁盘，因此一次性处理和流式处理都走这里。
+        单个文件的表头或格式错误按 on_file_error 报告；数据内容错误在执行 SQL 时整体报错。
+        """
+        from .fund_flow_sql import DuckDBPairStats
+
+        stats = DuckDBPairStats()
+        try:
+            total_files = len(files)
+            for i, file in enumerate(files):
+                self.progress(f"正在登记文件: {os.path.basename(file)}...")
+                try:
+                    stats.add_file(file, self.get_rename_dict(file))
+                except Exception as e:
+                    self.file_error(file, e)
+                self.progress(f"已登记 {i + 1}/{total_files}: {os.path.basename(file)}", (i + 1) / total_files * 30)
+            if not stats.sources:
+                raise ValueError("没有成功读取任何数据文件")
+            mixed = stats.mixed_type_columns()
+            if mixed:
+                self.warn(
+                    f"字段 {', '.join(mixed)} 在部分文件中为数字、部分文件中为文本，DuckDB 引擎合并后统一按文本处理，"
+                    f"调证账号、对手账号及结果行顺序可能与 pandas 引擎不同；需要一致的结果请使用 pandas 引擎"
+                )
+
+            self.progress("正在用 DuckDB 汇总数据...", 40)
+            transaction_file = self.new_transaction_file(files) if self.transaction_table else None
+            result, df_received_name, df_system_account = stats.run(
+                self.get_dedup_columns(stats.columns), self.pair_details, transaction_file
+            )
+        finally:
+            stats.close()
+        n_pairs = len(result)
+        result = enrich_pair_result(result, df_received_name, df_system_account)
+        if transaction_file:
+            self.prune_transaction_table(result, n_pairs)
+        return result
+
+    def run(self, files: List[str], mode: str = 'full', state_path: str = None) -> pd.DataFrame:
+        """按处理方式运行：full 一次性处理，streaming 流式处理，incremental 增量合并"""
+        if state_path is None and mode == 'incremental':
+            state_path = default_state_path(files)
+        files = self.mapped_files(files)
+        if mode not in ('full', 'streaming', 'incremental'):
+            raise ValueError(f"未知的处理方式：{mode}")
+        try:
+            if mode == 'incremental':
+                if self.backend == 'duckdb':
+                    self.warn("增量模式使用 pandas 引擎")
+                result = self.run_streaming(files, state_path)
+            elif self.backend == 'duckdb':
+                result = self.run_sql(files)
+            elif mode == 'streaming':
+                result = self.run_streaming(files)
+            else:
+                result = self.run_full(files)
+        except Exception:
+            self.discard_transaction_table()
+            raise
+        self.progress("分析完成！", 100)
+        return result
+
+    def write(self, result_df: pd.DataFrame, output_file: str, format_name: str = None) -> Union[str, None]:
+        """写出结果表；本次运行生成了交易明细表时将其移动到结果表旁边，返回明细表路径"""
+        self.progress("正在保存结果...")
+        write_result(result_df, output_file, format_name, on_warning=self.warn)
+        if self.transaction_file is None:
+            return None
+        target = transaction_table_path(output_file)
+        try:
+            os.replace(self.transaction_file, target)
+        except OSError:
+            # 结果表保存在其他磁盘时无法直接改名
+            shutil.move(self.transaction_file, target)
+        self.transaction_file = None
+        return target
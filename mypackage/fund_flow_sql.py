@@ -0,0 +1,406 @@
+import os
+import tempfile
+from typing import Dict, List, Tuple, Union
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+from .fund_flow_engine import (
+    PAIR_KEYS, REQUIRED_COLUMNS, detect_time_format, finish_pair_stats, read_mapped_file
+)
+
+# pandas 读取 CSV 时默认视为空值的文本
+PANDAS_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+_NULLSTR = '[' + ', '.join("'" + value + "'" for value in PANDAS_NA_VALUES) + ']'
+
+# DuckDB 可以直接读取的格式；其余格式（Excel）先用 pandas 读取再注册为视图。
+# CSV/TXT 一律按文本读取，再按 pandas 的规则推断列类型（见 _infer_text_types），
+# 避免两边类型推断不同（如带前导 0 的数字账号）导致结果不一致
+SQL_READERS = {
+    '.csv': "read_csv({path}, header = true, all_varchar = true, nullstr = " + _NULLSTR + ")",
+    '.txt': "read_csv({path}, header = true, all_varchar = true, delim = '\t', nullstr = " + _NULLSTR + ")",
+    '.parquet': "read_parquet({path})",
+}
+TEXT_EXTENSIONS = ('.csv', '.txt')
+
+# 超出内存限制时的溢写目录
+DEFAULT_TEMP_DIRECTORY = os.path.join(tempfile.gettempdir(), 'aggd_duckdb')
+
+# 文件序号左移的位数：_seq = 文件序号 << 40 | 文件内行号，即合并后的原始行顺序
+ROW_BITS = 40
+
+TIME_SAMPLE_SIZE = 1000
+
+
+def q(name: str) -> str:
+    """SQL 标识符（列名、表名）加引号"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def literal(value: str) -> str:
+    """SQL 文本常量"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def compose_timestamp_sql(expr: str) -> str:
+    """YYYYMMDDhhmmss 形式的整数按位拆分为时间戳（同 _compose_timestamps）"""
+    v = f"CAST({expr} AS BIGINT)"
+    return (
+        f"make_timestamp({v} // 10000000000, {v} // 100000000 % 100, {v} // 1000000 % 100, "
+        f"{v} // 10000 % 100, {v} // 100 % 100, {v} % 100)"
+    )
+
+
+def is_numeric_type(sql_type: str) -> bool:
+    sql_type = sql_type.upper()
+    return sql_type.startswith(('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UTINYINT',
+                                'USMALLINT', 'UINTEGER', 'UBIGINT', 'UHUGEINT', 'FLOAT', 'DOUBLE',
+                                'DECIMAL'))
+
+
+def is_integer_type(sql_type: str) -> bool:
+    return is_numeric_type(sql_type) and not sql_type.upper().startswith(('FLOAT', 'DOUBLE', 'DECIMAL'))
+
+
+def type_category(sql_type: str) -> str:
+    """比较时的类型类别：数字、文本或其他（同类之间才按值比较）"""
+    if is_numeric_type(sql_type):
+        return 'number'
+    return 'text' if sql_type.upper() == 'VARCHAR' else sql_type.upper()
+
+
+class DuckDBPairStats:
+    """用 DuckDB 以 SQL 计算交易对手汇总，对应 FundFlowEngine.process_data 的 pandas 实现
+
+    CSV/TXT/Parquet 由 DuckDB 直接读取，多线程执行，超出内存限制时溢写到临时目录；
+    Excel 以及交易时间无法在 SQL 中按同一格式解析的文件，先用 pandas 读取再注册为视图。
+    去重（keep='first'）、备注拼接和关联交易详情的顺序都按原始行顺序（文件序号, 行号）确定，
+    与 pandas 实现一致；结果表的补充字段仍由 enrich_pair_result 生成。
+    金额合计使用补偿求和（kahan_sum），与 pandas 分组求和的结果一致。
+    例外：同一字段在不同文件中分别为数字和文本时，pandas 按不同的值处理，SQL 合并后统一为文本
+    （登记时记录各字段的类型，见 mixed_type_columns，由调用方提示用户）；
+    名称、调证账号映射中交易时间完全相同的记录，SQL 取原始顺序在前的一条（pandas 的排序不稳定）。
+
+    用法：
+        stats = DuckDBPairStats()
+        stats.add_file(file, rename_dict)  # 逐个登记文件
+        result, df_received_name, df_system_account = stats.run(dedup_columns)
+        stats.close()
+    """
+
+    def __init__(self, temp_directory: str = DEFAULT_TEMP_DIRECTORY, threads: int = None,
+                 memory_limit: str = None):
+        if not HAS_DUCKDB:
+            raise ValueError("DuckDB 引擎需要安装 duckdb")
+        self.con = duckdb.connect()
+        os.makedirs(temp_directory, exist_ok=True)
+        self.con.execute(f"SET temp_directory = {literal(temp_directory)}")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        if memory_limit:
+            self.con.execute(f"SET memory_limit = {literal(memory_limit)}")
+        self.sources = []  # 已登记的视图名
+        self.columns = set()  # 已登记文件中出现的目标字段
+        self.column_categories = {}  # 目标字段 -> 各文件中的类型类别
+
+    def close(self):
+        self.con.close()
+
+    def _describe(self, relation: str) -> Dict[str, str]:
+        rows = self.con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    def _infer_text_types(self, relation: str, columns: List[str]) -> Dict[str, str]:
+        """按 pandas 读取 CSV 的规则推断文本列的类型
+
+        全部为整数时为 BIGINT（有空值时为 DOUBLE），全部为数字时为 DOUBLE，
+        全部为空值时为 DOUBLE，否则为文本。所有列在一次扫描中统计。
+        """
+        exprs = []
+        for col in columns:
+            column = q(col)
+            exprs += [
+                f"count({column})",
+                f"count(*) FILTER (WHERE regexp_full_match({column}, '\\s*[+-]?[0-9]+\\s*'))",
+                f"count(TRY_CAST({column} AS BIGINT)) FILTER (WHERE regexp_full_match({column}, '\\s*[+-]?[0-9]+\\s*'))",
+                f"count(TRY_CAST({column} AS DOUBLE))",
+            ]
+        row = self.con.execute(f"SELECT count(*), {', '.join(exprs)} FROM {relation}").fetchone()
+        total, counts = row[0], row[1:]
+        types = {}
+        for i, col in enumerate(columns):
+            n_values, n_int, n_bigint, n_float = counts[4 * i:4 * i + 4]
+            if n_values == 0:
+                types[col] = 'DOUBLE'
+            elif n_int == n_values:
+                # 超出 int64 范围的整数 pandas 不再按数字处理
+                if n_bigint < n_int:
+                    types[col] = 'VARCHAR'
+                else:
+                    types[col] = 'BIGINT' if n_values == total else 'DOUBLE'
+            elif n_float == n_values:
+                types[col] = 'DOUBLE'
+            else:
+                types[col] = 'VARCHAR'
+        return types
+
+    def _time_expression(self, relation: str, column: str, sql_type: str) -> Union[str, None]:
+        """交易时间转换为时间戳的 SQL 表达式；无法在 SQL 中解析时返回 None
+
+        与 parse_transaction_time 相同：日期时间原样使用，数字按 YYYYMMDDhhmmss 拆分，
+        文本按抽样检测到的格式解析（整列都能按该格式解析时才使用）。
+
+        Args:
+            column: 交易时间列的 SQL 表达式
+        """
+        upper = sql_type.upper()
+        if upper.startswith(('TIMESTAMP', 'DATE')):
+            return f"CAST({column} AS TIMESTAMP)"
+        if is_numeric_type(upper):
+            return compose_timestamp_sql(column)
+        if upper != 'VARCHAR':
+            return None
+
+        sample = self.con.execute(
+            f"SELECT {column} FROM {relation} WHERE {column} IS NOT NULL LIMIT {TIME_SAMPLE_SIZE}"
+        ).fetchall()
+        time_format = detect_time_format(pd.Series([row[0] for row in sample], dtype=object))
+        if time_format == 'numeric':
+            expr = compose_timestamp_sql(f"CAST({column} AS DOUBLE)")
+            check = f"TRY_CAST({column} AS DOUBLE) IS NULL"
+        elif time_format in ('mixed', 'datetime'):
+            return None
+        else:
+            expr = f"strptime({column}, {literal(time_format)})"
+            check = f"try_strptime({column}, {literal(time_format)}) IS NULL"
+        unparsed = self.con.execute(
+            f"SELECT count(*) FROM {relation} WHERE {column} IS NOT NULL AND {check}"
+        ).fetchone()[0]
+        return expr if unparsed == 0 else None
+
+    def add_file(self, file_path: str, rename_dict: Dict[str, str]):
+        """登记一个数据文件，按 rename_dict（源数据列 -> 目标字段）映射为必需字段"""
+        file_index = len(self.sources)
+        view = f"src_{file_index}"
+        ext = os.path.splitext(file_path)[1].lower()
+
+        select = None
+        if ext in SQL_READERS:
+            relation = SQL_READERS[ext].format(path=literal(file_path))
+            types = self._describe(relation)
+            # 与 DataFrame.rename 一致：映射到的列改名，未映射但同名的列保留
+            sources = {target: src for src, target in rename_dict.items() if src in types}
+            for col in REQUIRED_COLUMNS:
+                if col in types and col not in rename_dict and col not in sources:
+                    sources[col] = col
+            values = {target: q(src) for target, src in sources.items()}
+            if ext in TEXT_EXTENSIONS:
+                types.update(self._infer_text_types(relation, list(set(sources.values()))))
+                values = {
+                    target: value if types[sources[target]] == 'VARCHAR'
+                    else f"CAST({value} AS {types[sources[target]]})"
+                    for target, value in values.items()
+                }
+            time_expr = 'NULL'
+            if '交易时间' in sources:
+                time_expr = self._time_expression(
+                    relation, values['交易时间'], types[sources['交易时间']]
+                )
+            if time_expr is not None:
+                select = [f"{value} AS {q(target)}" for target, value in values.items()]
+                select.append(f"{time_expr} AS {q('交易日期时间')}")
+                select.append(f"(CAST({file_index} AS BIGINT) << {ROW_BITS}) | (ordinality - 1) AS _seq")
+                from_clause = f"{relation} WITH ORDINALITY"
+                targets = list(sources)
+
+        if select is None:
+            df = read_mapped_file(file_path, rename_dict)
+            if df is None:
+                raise ValueError(f"不支持的文件格式：{file_path}")
+            targets = [col for col in REQUIRED_COLUMNS if col in df.columns]
+            df = df[targets + ['交易日期时间']] if '交易日期时间' in df.columns else df[targets]
+            df['_seq'] = (file_index << ROW_BITS) | np.arange(len(df), dtype=np.int64)
+            self.con.register(f"{view}_df", df)
+            select = [q(col) for col in df.columns]
+            if '交易日期时间' not in df.columns:
+                select.append(f"NULL AS {q('交易日期时间')}")
+            from_clause = f"{view}_df"
+
+        self.con.execute(f"CREATE OR REPLACE TEMP VIEW {view} AS SELECT {', '.join(select)} FROM {from_clause}")
+        self.sources.append(view)
+        self.columns.update(targets)
+        types = self._describe(view)
+        for col in targets:
+            self.column_categories.setdefault(col, set()).add(type_category(types[col]))
+
+    def mixed_type_columns(self) -> List[str]:
+        """在一些文件中为数字、另一些文件中为文本的字段，这些字段的结果与 pandas 实现不同"""
+        return [col for col in REQUIRED_COLUMNS if {'number', 'text'} <= self.column_categories.get(col, set())]
+
+    def _create_transactions(self, dedup_columns: Union[List[str], None]):
+        """合并全部文件、去重并剔除付款失败的流水（对应 apply_deduplication 与 prepare_transactions）"""
+        union = ' UNION ALL BY NAME '.join(f"SELECT * FROM {view}" for view in self.sources)
+        qualify = ''
+        if dedup_columns:
+            partition = ', '.join(q(col) for col in dedup_columns)
+            qualify = f"QUALIFY row_number() OVER (PARTITION BY {partition} ORDER BY _seq) = 1"
+        # 映射中缺少的字段补为空值
+        missing = [f"NULL AS {q(col)}" for col in REQUIRED_COLUMNS if col not in self.columns]
+        extra = ''.join(', ' + col for col in missing)
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE tx AS
+            SELECT * FROM (SELECT *{extra} FROM ({union}) {qualify})
+            WHERE CAST({q('备注')} AS VARCHAR) IS DISTINCT FROM '付款失败'
+        """)
+
+    def _lookups(self) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """对应 build_name_lookup / build_system_account_lookup：每个账号取交易时间最新的一条"""
+        flag = f"CAST({q('借贷标志')} AS VARCHAR)"
+        latest = f"ORDER BY {q('交易日期时间')} DESC NULLS LAST, _seq"
+        df_received_name = self.con.execute(f"""
+            SELECT {q('收款方支付账号')} AS {q('账号')}, {q('收款方的商户名称')} AS {q('系统姓名')},
+                   {q('交易日期时间')}
+            FROM tx WHERE {flag} = '贷'
+            QUALIFY row_number() OVER (PARTITION BY {q('收款方支付账号')} {latest}) = 1
+        """).df()
+        types = self._describe('tx')
+
+        def differs(account):
+            # pandas 中文本与数字比较时总是不相等
+            if type_category(types['查询账号']) != type_category(types[account]):
+                return 'true'
+            return f"{q('查询账号')} IS DISTINCT FROM {q(account)}"
+
+        df_system_account = self.con.execute(f"""
+            SELECT {q('查询账号')}, {q('支付账号')}, {q('交易日期时间')} FROM (
+                SELECT {q('查询账号')}, {q('付款方支付账号')} AS {q('支付账号')}, {q('交易日期时间')}, _seq
+                FROM tx WHERE {flag} = '借' AND {differs('付款方支付账号')}
+                UNION ALL BY NAME
+                SELECT {q('查询账号')}, {q('收款方支付账号')} AS {q('支付账号')}, {q('交易日期时间')}, _seq
+                FROM tx WHERE {flag} = '贷' AND {differs('收款方支付账号')}
+            )
+            WHERE length(coalesce(CAST({q('支付账号')} AS VARCHAR), 'nan')) > 3
+            QUALIFY row_number() OVER (PARTITION BY {q('支付账号')} {latest}) = 1
+        """).df()
+        return df_received_name, df_system_account
+
+    def _by_pair(self, sql: str, n_pairs: int) -> pd.Series:
+        """执行返回 (pair_id, 文本) 的查询，按组号排列，没有记录的组为空文本"""
+        rows = self.con.execute(sql).fetchall()
+        values = pd.Series([text for _, text in rows], index=[pair_id for pair_id, _ in rows], dtype=object)
+        return values.reindex(range(n_pairs), fill_value='')
+
+    def _pair_stats(self, pair_details: bool) -> pd.DataFrame:
+        """对应 aggregate_pair_stats：按交易对手汇总，组号按账号排序"""
+        payer, payee = (q(col) for col in PAIR_KEYS)
+        amount = q('交易金额')
+        # 金额为整数时合计仍为整数（与 pandas 一致）
+        total_type = 'BIGINT' if is_integer_type(self._describe('tx')['交易金额']) else 'DOUBLE'
+        flag = f"CAST({q('借贷标志')} AS VARCHAR)"
+
+        def by_flag(value):
+            count = f"count(*) FILTER (WHERE {flag} = '{value}')"
+            return (
+                f"{count}, "
+                f"CAST(coalesce(kahan_sum({amount}) FILTER (WHERE {flag} = '{value}'), 0) AS {total_type}), "
+                f"CASE WHEN {count} = 0 THEN 0 ELSE max({amount}) FILTER (WHERE {flag} = '{value}') END"
+            )
+
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP TABLE pairs AS
+            SELECT row_number() OVER (ORDER BY {payer}, {payee}) - 1 AS pair_id, * FROM (
+                SELECT {payer}, {payee},
+                       count(*) AS n_total,
+                       CAST(coalesce(kahan_sum({amount}), 0) AS {total_type}) AS amount_total,
+                       min({q('交易日期时间')}) AS first_time,
+                       max({q('交易日期时间')}) AS last_time,
+                       {by_flag('贷')}, {by_flag('借')}
+                FROM tx WHERE {payer} IS NOT NULL AND {payee} IS NOT NULL
+                GROUP BY {payer}, {payee}
+            )
+        """)
+        self.con.execute(f"""
+            CREATE OR REPLACE TEMP VIEW pair_tx AS
+            SELECT p.pair_id, t.* FROM tx t JOIN pairs p ON t.{payer} = p.{payer} AND t.{payee} = p.{payee}
+        """)
+
+        stats = self.con.execute("SELECT * FROM pairs ORDER BY pair_id").df()
+        pair_index = pd.MultiIndex.from_arrays([stats.iloc[:, 1], stats.iloc[:, 2]], names=PAIR_KEYS)
+        partial = stats.iloc[:, 3:].set_axis([
+            '交易笔数', '流水总额', '最早交易时间', '最新交易时间',
+            '收入笔数', '收入金额', '最大单笔收入金额', '支出笔数', '支出金额', '最大单笔支出金额',
+        ], axis=1)
+        for col in ['最早交易时间', '最新交易时间']:
+            partial[col] = partial[col].astype('datetime64[ns]')
+        n_pairs = len(partial)
+
+        # 备注：按首次出现顺序去重后拼接（同 collect_pair_remarks）
+        remarks = self._by_pair(f"""
+            SELECT pair_id, string_agg(CAST({q('备注')} AS VARCHAR), '; ' ORDER BY first_seq)
+            FROM (
+                SELECT pair_id, {q('备注')}, min(_seq) AS first_seq FROM pair_tx
+                WHERE {q('备注')} IS NOT NULL GROUP BY pair_id, {q('备注')}
+            ) GROUP BY pair_id
+        """, n_pairs)
+
+        details = None
+        if pair_details:
+            # 关联交易详情：组内按交易时间倒序，同一时间保持原始顺序（同 build_transaction_details）
+            text = (
+                f"coalesce(strftime({q('交易日期时间')}, '%Y-%m-%d %H:%M'), '') || ' (' || "
+                f"CASE WHEN {flag} = '贷' THEN '+' ELSE '-' END || "
+                f"coalesce(CAST({amount} AS VARCHAR), 'nan') || ')'"
+            )
+            details = self._by_pair(f"""
+                SELECT pair_id, string_agg({text}, '; ' ORDER BY {q('交易日期时间')} DESC NULLS LAST, _seq)
+                FROM pair_tx GROUP BY pair_id
+            """, n_pairs)
+
+        return finish_pair_stats(pair_index, partial, remarks, details)
+
+    def write_transaction_table(self, output_file: str):
+        """把交易明细表直接由 DuckDB 写为 Parquet（列及类型同 build_transaction_table）"""
+        text = [
+            f"CAST({q(col)} AS VARCHAR) AS {q(col)}" for col in ['查询账号', '支付机构内部订单号', '交易类型', '备注']
+        ]
+        self.con.execute(f"""
+            COPY (
+                SELECT pair_id AS {q('交易对ID')},
+                       CAST({q('交易日期时间')} AS TIMESTAMP_NS) AS {q('交易日期时间')},
+                       CAST({q('借贷标志')} AS VARCHAR) AS {q('借贷标志')},
+                       TRY_CAST({q('交易金额')} AS DOUBLE) AS {q('交易金额')},
+                       TRY_CAST({q('交易余额')} AS DOUBLE) AS {q('交易余额')},
+                       {', '.join(text)}
+                FROM pair_tx
+                ORDER BY pair_id, {q('交易日期时间')} DESC NULLS LAST, _seq
+            ) TO {literal(output_file)} (FORMAT parquet)
+        """)
+
+    def run(self, dedup_columns: Union[List[str], None] = None, pair_details: bool = True,
+            transaction_file: str = None):
+        """执行汇总
+
+        Args:
+            dedup_columns: 去重依据的字段，None 表示不去重
+            pair_details: 是否生成关联交易详情
+            transaction_file: 指定时同时写出交易明细表，结果表首列增加 交易对ID
+        Returns:
+            tuple: (result, df_received_name, df_system_account)，可直接传给 enrich_pair_result
+        """
+        if not self.sources:
+            raise ValueError("没有成功读取任何数据文件")
+        self._create_transactions(dedup_columns)
+        df_received_name, df_system_account = self._lookups()
+        result = self._pair_stats(pair_details)
+        if transaction_file:
+            self.write_transaction_table(transaction_file)
+            result.insert(0, '交易对ID', np.arange(len(result), dtype=np.int64))
+        return result, df_received_name, df_system_account
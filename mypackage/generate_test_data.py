@@ -113,6 +113,192 @@ def generate_test_data(num_records=3000):
     
     return df, mapping_df
 
+# ---------------------------------------------------------------------------
+# 向量化生成器：用于基准测试（benchmarks/bench_fund_flow.py），可生成百万至上亿行流水。
+# 字段与 generate_test_data 相同，所有列都由 NumPy 按列生成，不逐行调用 random。
+# ---------------------------------------------------------------------------
+
+DIGITS = '0123456789'
+HEX_DIGITS = '0123456789ABCDEF'
+WXID_CHARS = 'abcdefghijklmnopqrstuvwxyz0123456789'
+TRANSACTION_TYPES = ['转账', '支付', '充值', '提现']
+REMARKS = ['日常交易', '商品购买', '服务费用', '付款成功', '转账成功']
+START_DATE = np.datetime64('2023-01-01T00:00:00', 's')
+END_DATE = np.datetime64('2025-01-01T00:00:00', 's')
+
+
+def random_strings(rng, n, alphabet, length, prefix=''):
+    """生成 n 个由 alphabet 中字符组成的定长随机文本（按字节矩阵生成后整体转换）"""
+    chars = np.frombuffer(alphabet.encode('ascii'), dtype='S1')
+    matrix = chars[rng.integers(0, len(alphabet), size=(n, length))]
+    if prefix:
+        head = np.frombuffer(prefix.encode('ascii'), dtype='S1')
+        matrix = np.hstack([np.broadcast_to(head, (n, len(head))), matrix])
+    return matrix.view(f'S{matrix.shape[1]}').ravel().astype(str)
+
+
+def hex_ids(start, n, width=12, prefix='ORDER'):
+    """连续编号的订单号：prefix + width 位十六进制（按位运算生成，保证唯一）"""
+    ids = np.arange(start, start + n, dtype=np.uint64)
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64) * np.uint64(4)
+    digits = (ids[:, None] >> shifts) & np.uint64(15)
+    chars = np.frombuffer(HEX_DIGITS.encode('ascii'), dtype='S1')
+    head = np.frombuffer(prefix.encode('ascii'), dtype='S1')
+    matrix = np.hstack([np.broadcast_to(head, (n, len(head))), chars[digits.astype(np.intp)]])
+    return matrix.view(f'S{matrix.shape[1]}').ravel().astype(str)
+
+
+def merchant_names(rng, n):
+    """商户名称：30% 为个人（姓 + 名 +（个人）），其余为 地区 + 行业 + 公司类型"""
+    persons = np.array([f"{a}{b}（个人）" for a in '张王李赵周吴郑黄' for b in '伟明俊杰强晶婷静'])
+    companies = np.array([
+        f"{a}{b}{c}" for a in ['北京', '上海', '广州', '深圳', '杭州']
+        for b in ['科技', '贸易', '商务', '电子', '网络'] for c in ['有限公司', '股份公司', '商贸公司']
+    ])
+    is_person = rng.random(n) < 0.3
+    return np.where(
+        is_person,
+        persons[rng.integers(0, len(persons), n)],
+        companies[rng.integers(0, len(companies), n)]
+    )
+
+
+def as_column(values):
+    """转为 pandas 默认的文本数组，之后按编号 take 取值，不再逐行转换"""
+    return pd.Series(values).array
+
+
+def make_account_pool(num_accounts=10000, seed=0):
+    """生成账号池：每个账号有支付账号、对应微信号、银行卡号和商户名称
+
+    Returns:
+        dict: 各字段为长度 num_accounts 的数组；'query' 为支付账号与微信号首尾相接，
+              编号 i 为支付账号，i + num_accounts 为其微信号
+    """
+    rng = np.random.default_rng(seed)
+    account = random_strings(rng, num_accounts, DIGITS, 16)
+    wxid = random_strings(rng, num_accounts, WXID_CHARS, 19, prefix='wxid_')
+    return {
+        'account': as_column(account),
+        'wxid': as_column(wxid),
+        'query': as_column(np.concatenate([account, wxid])),
+        'card': as_column(random_strings(rng, num_accounts, DIGITS, 16)),
+        'name': as_column(merchant_names(rng, num_accounts)),
+    }
+
+
+def account_weights(num_accounts, skew):
+    """账号被选中的概率：按排名服从 Zipf 分布，skew=0 时均匀分布，越大越集中于少数账号"""
+    if skew <= 0:
+        return None
+    weights = 1.0 / np.arange(1, num_accounts + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_synthetic_chunk(rng, pool, num_records, order_start=0, skew=0.0,
+                             duplicate_rate=0.0, failure_rate=0.0):
+    """生成一批流水（字段同 generate_test_data）
+
+    Args:
+        rng: numpy.random.Generator
+        pool: make_account_pool 的输出
+        num_records: 行数（含重复行）
+        order_start: 订单号起始编号，分批生成时保证订单号不重复
+        skew: 账号集中度（Zipf 指数）
+        duplicate_rate: 重复导出的流水占比（整行重复，订单号相同）
+        failure_rate: 备注为“付款失败”的流水占比
+    """
+    num_accounts = len(pool['account'])
+    n_unique = num_records - int(round(num_records * duplicate_rate))
+    p = account_weights(num_accounts, skew)
+
+    payer = rng.choice(num_accounts, size=n_unique, p=p)
+    receiver = rng.choice(num_accounts, size=n_unique, p=p)
+    # 收付款双方不能是同一个账号
+    receiver = np.where(receiver == payer, (receiver + 1) % num_accounts, receiver)
+    is_debit = rng.random(n_unique) < 0.5
+    # 查询账号为本方账号，30% 为其微信号
+    own = np.where(is_debit, payer, receiver) + (rng.random(n_unique) < 0.3) * num_accounts
+
+    seconds = rng.integers(0, (END_DATE - START_DATE).astype(np.int64), n_unique)
+    times = pd.DatetimeIndex(START_DATE + seconds.astype('timedelta64[s]'))
+    # 交易时间为 YYYYMMDDhhmmss 形式的整数
+    time_numbers = (
+        times.year.to_numpy(np.int64) * 10**10 + times.month.to_numpy(np.int64) * 10**8
+        + times.day.to_numpy(np.int64) * 10**6 + times.hour.to_numpy(np.int64) * 10**4
+        + times.minute.to_numpy(np.int64) * 100 + times.second.to_numpy(np.int64)
+    )
+
+    # 备注最后一项为“付款失败”
+    remark_codes = rng.integers(0, len(REMARKS), n_unique)
+    if failure_rate > 0:
+        remark_codes[rng.random(n_unique) < failure_rate] = len(REMARKS)
+
+    df = pd.DataFrame({
+        '查询账号': pool['query'].take(own),
+        '付款方支付帐号': pool['account'].take(payer),
+        '收款方支付帐号': pool['account'].take(receiver),
+        '支付机构内部订单号': hex_ids(order_start, n_unique),
+        '交易时间': time_numbers,
+        '借贷标志': as_column(['贷', '借']).take(is_debit.astype(np.intp)),
+        '交易金额': np.round(rng.uniform(100, 10000, n_unique), 2),
+        '交易余额': np.round(rng.uniform(1000, 100000, n_unique), 2),
+        '付款方银行卡号': pool['card'].take(payer),
+        '收款方银行卡号': pool['card'].take(receiver),
+        '交易类型': as_column(TRANSACTION_TYPES).take(rng.integers(0, len(TRANSACTION_TYPES), n_unique)),
+        '收款方的商户名称': pool['name'].take(receiver),
+        '备注': as_column(REMARKS + ['付款失败']).take(remark_codes),
+    })
+
+    if n_unique < num_records:
+        # 重复导出的流水随机插入，而不是集中在末尾
+        copies = rng.integers(0, n_unique, num_records - n_unique)
+        order = rng.permutation(np.concatenate([np.arange(n_unique), copies]))
+        df = df.take(order).reset_index(drop=True)
+    return df
+
+
+def account_mapping(pool):
+    """支付账号与微信号的映射表（同 generate_test_data 返回的 mapping_df）"""
+    return pd.DataFrame({'支付账号': pool['account'], '微信号': pool['wxid']})
+
+
+def generate_synthetic_data(num_records=1_000_000, num_accounts=10000, skew=0.0,
+                            duplicate_rate=0.0, failure_rate=0.0, seed=0):
+    """向量化生成测试数据，返回值同 generate_test_data：(流水, 账号映射)"""
+    pool = make_account_pool(num_accounts, seed)
+    rng = np.random.default_rng(seed + 1)
+    df = generate_synthetic_chunk(rng, pool, num_records, 0, skew, duplicate_rate, failure_rate)
+    return df, account_mapping(pool)
+
+
+def write_synthetic_files(output_dir, num_records, rows_per_file=1_000_000, file_format='csv',
+                          num_accounts=10000, skew=0.0, duplicate_rate=0.0, failure_rate=0.0, seed=0):
+    """分批生成并写出多个数据文件（内存占用只取决于 rows_per_file），返回文件路径列表
+
+    file_format: 'csv'、'parquet' 或 'xlsx'（xlsx 单表最多约 100 万行）
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    pool = make_account_pool(num_accounts, seed)
+    rng = np.random.default_rng(seed + 1)
+    files = []
+    for i, start in enumerate(range(0, num_records, rows_per_file)):
+        n = min(rows_per_file, num_records - start)
+        df = generate_synthetic_chunk(rng, pool, n, start, skew, duplicate_rate, failure_rate)
+        path = os.path.join(output_dir, f'test_data_{i + 1}.{file_format}')
+        if file_format == 'csv':
+            df.to_csv(path, index=False)
+        elif file_format == 'parquet':
+            df.to_parquet(path, index=False)
+        elif file_format == 'xlsx':
+            df.to_excel(path, index=False)
+        else:
+            raise ValueError(f"不支持的文件格式：{file_format}")
+        files.append(path)
+    account_mapping(pool).to_csv(os.path.join(output_dir, 'account_mapping.csv'), index=False)
+    return files
+
+
 def main():
     # 创建输出目录
     output_dir = 'test_data'
@@ -0,0 +1,113 @@
+import os
+from collections import defaultdict
+from functools import lru_cache
+from typing import Union
+import pandas as pd
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    HAS_OPENPYXL = False
+
+# openpyxl 只读模式可以只解析第一行的格式
+READ_ONLY_EXCEL = ('.xlsx', '.xlsm')
+
+
+def _dedup_names(names: list) -> list:
+    """与 pandas 读取时的处理一致：重复列名依次加 .1、.2 后缀"""
+    counts = defaultdict(int)
+    result = []
+    for name in names:
+        cur_count = counts[name]
+        while cur_count > 0:
+            counts[name] = cur_count + 1
+            name = f"{name}.{cur_count}"
+            cur_count = counts[name]
+        result.append(name)
+        counts[name] = cur_count + 1
+    return result
+
+
+def _is_blank(value) -> bool:
+    return value is None or value == ''
+
+
+def _header_value(value):
+    """与 pandas 的 openpyxl 读取一致：保留单元格原类型，整数值的浮点数转为 int"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _probe_xlsx(file_path: str, sheet_name: Union[str, int]) -> list:
+    """只读模式读取工作表第一行，列数与 pandas 一致取各行最后一个非空单元格的最大列号
+
+    第一行之后的行只在工作表尺寸超出表头宽度时扫描，且只读取表头右侧的列。
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        if isinstance(sheet_name, int):
+            worksheet = workbook.worksheets[sheet_name]
+        else:
+            worksheet = workbook[sheet_name]
+        values = list(next(worksheet.iter_rows(min_row=1, max_row=1, values_only=True), None) or [])
+        # 与 pandas 一致，去掉行尾的空单元格
+        while values and _is_blank(values[-1]):
+            values.pop()
+        width = len(values)
+        max_column = worksheet.max_column
+        # 尺寸信息缺失时（max_column 为 None）同样需要扫描
+        if max_column is None or max_column > width:
+            for row in worksheet.iter_rows(min_row=2, min_col=width + 1, max_col=max_column, values_only=True):
+                for offset in range(len(row) - 1, -1, -1):
+                    if not _is_blank(row[offset]):
+                        width = max(width, len(values) + offset + 1)
+                        break
+    finally:
+        workbook.close()
+
+    values += [None] * (width - len(values))
+    names = [
+        f"Unnamed: {i}" if _is_blank(value) else _header_value(value)
+        for i, value in enumerate(values)
+    ]
+    return _dedup_names(names)
+
+
+@lru_cache(maxsize=256)
+def _probe_cached(file_path: str, size: int, mtime_ns: int, sheet_name, sep) -> tuple:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in READ_ONLY_EXCEL and HAS_OPENPYXL:
+        return tuple(_probe_xlsx(file_path, sheet_name))
+    if ext == '.parquet':
+        import pyarrow.parquet as pq
+        # 带索引写出的 Parquet 中索引列不属于数据列
+        names = pq.read_schema(file_path).names
+        return tuple(str(col) for col in names if not str(col).startswith('__index_level_'))
+    if ext in ('.xlsx', '.xlsm', '.xls'):
+        header = pd.read_excel(file_path, sheet_name=sheet_name, nrows=0)
+    elif sep is None:
+        header = pd.read_csv(file_path, nrows=0)
+    else:
+        header = pd.read_csv(file_path, sep=sep, nrows=0)
+    return tuple(header.columns)
+
+
+def probe_columns(file_path: str, sheet_name: Union[str, int] = 0, sep: str = None) -> list:
+    """只读取表头，返回与 pandas 读取整个文件时相同的列名（数字、日期等表头保留原类型）
+
+    xlsx 用 openpyxl 只读模式读取第一行（表头右侧有数据时补 Unnamed 列），Parquet 读取文件元数据，CSV/TXT 及 xls 用 pandas 的 nrows=0，
+    无论文件多大都不需要解析数据行。结果按（路径, 大小, 修改时间）缓存，
+    同一文件在多个对话框中重复选择时直接返回。TXT 默认按制表符分隔。
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    if sep is None and file_path.lower().endswith('.txt'):
+        sep = '\t'
+    return list(_probe_cached(file_path, stat.st_size, stat.st_mtime_ns, sheet_name, sep))
+
+
+def column_by_text(columns, text: str):
+    """下拉框只能返回文本，按文本找回原列名（数字、日期等表头），找不到时原样返回"""
+    return next((col for col in columns if str(col) == text), text)
@@ -0,0 +1,84 @@
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Iterable, List, Union
+
+# 默认保存位置（与解析缓存同在用户目录下）
+DEFAULT_PROFILE_STORE = os.path.join(os.path.expanduser('~'), '.aggd_workflow', 'mapping_profiles.json')
+PROFILE_STORE_VERSION = 1
+
+
+def normalize_header(columns: Iterable) -> List[str]:
+    """表头规范化：列名统一转为文本（不去空白，映射中的源数据列需与文件中的列名完全一致）"""
+    return [str(col) for col in columns]
+
+
+def header_fingerprint(columns: Iterable) -> str:
+    """表头指纹：与列顺序无关，同一家机构导出的流水表头相同即可匹配"""
+    raw = json.dumps(sorted(set(normalize_header(columns))), ensure_ascii=False)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def mapping_fits(column_mapping: Dict[str, str], columns: Iterable) -> bool:
+    """映射中用到的源数据列是否都在表头中"""
+    header = set(normalize_header(columns))
+    return bool(column_mapping) and all(src in header for src in column_mapping.values() if src)
+
+
+class MappingProfileStore:
+    """按表头指纹保存的字段映射（目标字段 -> 源数据列）
+
+    每种表头（通常对应一家支付机构的导出格式）只需映射一次，之后遇到相同表头的文件自动套用。
+    path 为 None 时只保存在内存中（例如从映射方案文件中读入的映射）。
+    """
+
+    def __init__(self, path: Union[str, None] = DEFAULT_PROFILE_STORE):
+        self.path = path
+        self.profiles = self._load() if path else {}
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == PROFILE_STORE_VERSION:
+                return data['profiles']
+        except (OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': PROFILE_STORE_VERSION, 'profiles': self.profiles},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def get(self, columns: Iterable) -> Union[Dict[str, str], None]:
+        """按表头查找已保存的映射，没有时返回 None"""
+        profile = self.profiles.get(header_fingerprint(columns))
+        return dict(profile['column_mapping']) if profile else None
+
+    def put(self, columns: Iterable, column_mapping: Dict[str, str], save: bool = True):
+        """保存某种表头的映射"""
+        self.profiles[header_fingerprint(columns)] = {
+            'columns': normalize_header(columns),
+            'column_mapping': dict(column_mapping),
+            'updated': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        if save:
+            self.save()
+
+    def update(self, profiles: Dict[str, dict]):
+        """合并其他来源（如映射方案文件）中的映射，不写入磁盘"""
+        self.profiles.update(profiles)
+
+    def remove(self, columns: Iterable):
+        self.profiles.pop(header_fingerprint(columns), None)
+        self.save()
@@ -1,28 +1,29 @@
+import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
+from datetime import datetime
 import pandas as pd
-import dash
-from dash import html, dcc
-import dash_cytoscape as cyto
-import threading
-import webbrowser
-from dash.dependencies import Input, Output, State
-import json
-import re
-import networkx as nx
+from .header_probe import probe_columns
+from .money_flow_graph import FlowGraph, aggregate_flow_elements, build_flow_elements, format_node_values
+from .money_flow_server import open_graph
 
 class MoneyFlowViewer(tk.Toplevel):
     def __init__(self, master):
         super().__init__(master)
         self.title("自定义流向图")
-        self.geometry("650x550")
+        self.geometry("650x620")
         self.grab_set()
         self.df = None
+        self.file_path = None
+        self.columns = []  # 只读取表头得到的字段列表，数据在生成流向图时再读取
         self.node1_var = tk.StringVar()
         self.node2_var = tk.StringVar()
         self.node1_custom_var = tk.StringVar()
         self.node2_custom_var = tk.StringVar()
         self.mode_var = tk.StringVar(value="normal")
+        self.aggregate_var = tk.BooleanVar(value=False)
+        self.amount_var = tk.StringVar()
+        self.time_var = tk.StringVar()
         self.label_fields = []
         self.create_widgets()
 
@@ -84,6 +85,18 @@ class MoneyFlowViewer(tk.Toplevel):
         # 排除自身选项
         self.exclude_self_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(self.cond_frame, text="排除流向自身", variable=self.exclude_self_var).grid(row=0, column=0, sticky="w")
+
+        # 合并链路：同一起点到同一终点的流水合并为一条边，点击链路时再查看明细
+        ttk.Checkbutton(
+            self.cond_frame, text="合并同向链路（汇总笔数、金额、起止时间，线宽按金额）",
+            variable=self.aggregate_var
+        ).grid(row=1, column=0, columnspan=4, sticky="w")
+        ttk.Label(self.cond_frame, text="金额字段：").grid(row=2, column=0, sticky="w")
+        self.amount_cb = ttk.Combobox(self.cond_frame, textvariable=self.amount_var, state="readonly", width=20)
+        self.amount_cb.grid(row=2, column=1, padx=5, sticky="w")
+        ttk.Label(self.cond_frame, text="时间字段：").grid(row=2, column=2, sticky="w")
+        self.time_cb = ttk.Combobox(self.cond_frame, textvariable=self.time_var, state="readonly", width=20)
+        self.time_cb.grid(row=2, column=3, padx=5, sticky="w")
         
         # 初始显示普通模式
         self.toggle_mode()
@@ -104,7 +117,7 @@ class MoneyFlowViewer(tk.Toplevel):
             self.custom_fields_frame.pack(fill=tk.X)  # 在容器内显示自定义模式
             
         # 如果已加载文件，更新字段选择器
-        if self.df is not None:
+        if self.columns:
             self.show_field_selectors()
 
     def setup_custom_fields(self):
@@ -130,26 +143,36 @@ class MoneyFlowViewer(tk.Toplevel):
         filename = filedialog.askopenfilename(title="选择数据文件", filetypes=filetypes)
         if not filename:
             return
+        if not filename.endswith(('.xlsx', '.xls', '.csv')):
+            messagebox.showerror("错误", "仅支持Excel或CSV文件")
+            return
         try:
-            if filename.endswith(('.xlsx', '.xls')):
-                self.df = pd.read_excel(filename, dtype=str)
-            elif filename.endswith('.csv'):
-                self.df = pd.read_csv(filename, dtype=str)
-            else:
-                messagebox.showerror("错误", "仅支持Excel或CSV文件")
-                return
-            self.df.fillna("", inplace=True)
+            # 选择字段只需要表头；字段都按文本处理（下拉框和自定义格式中的列名均为文本）
+            self.columns = [str(col) for col in probe_columns(filename)]
+            self.file_path = filename
+            self.df = None
             self.show_field_selectors()
         except Exception as e:
             messagebox.showerror("错误", f"读取文件失败：{e}")
 
+    def load_data(self) -> pd.DataFrame:
+        """读取完整数据（首次生成流向图时读取，之后复用）"""
+        if self.df is None:
+            if self.file_path.endswith(('.xlsx', '.xls')):
+                self.df = pd.read_excel(self.file_path, dtype=str)
+            else:
+                self.df = pd.read_csv(self.file_path, dtype=str)
+            self.df.fillna("", inplace=True)
+            self.df.columns = [str(col) for col in self.df.columns]
+        return self.df
+
     def show_field_selectors(self):
         for widget in self.fields_frame.winfo_children():
             widget.destroy()
         for widget in self.label_frame.winfo_children():
             widget.destroy()
 
-        columns = list(self.df.columns)
+        columns = list(self.columns)
         if len(columns) < 2:
             messagebox.showerror("错误", "数据字段不足")
             return
@@ -170,6 +193,12 @@ class MoneyFlowViewer(tk.Toplevel):
             ttk.Label(self.fields_frame, 
                      text="提示: 直接选择字段作为节点").grid(row=2, column=0, columnspan=2, sticky="w", pady=5)
         
+        # 合并链路的金额、时间字段（可不选），默认选中列名含“金额”“时间”的字段
+        self.amount_cb['values'] = [''] + columns
+        self.time_cb['values'] = [''] + columns
+        self.amount_var.set(next((c for c in columns if '金额' in c), ''))
+        self.time_var.set(next((c for c in columns if '时间' in c), ''))
+
         self.label_selectors = []
         self.label_selector_vars = []
         self.add_label_selector(columns)
@@ -210,31 +239,35 @@ class MoneyFlowViewer(tk.Toplevel):
         self.update_label_selectors()
         
         if len(self.label_selectors) == 1 and not self.label_selector_vars[0].get():
-            self.add_label_selector(self.df.columns)
+            self.add_label_selector(self.columns)
 
     def on_label_selected(self, idx):
         if idx == len(self.label_selectors) - 1 and self.label_selector_vars[idx].get():
             if len(self.get_available_label_fields()) > 0:
-                self.add_label_selector(self.df.columns)
+                self.add_label_selector(self.columns)
         self.update_label_selectors()
 
     def get_available_label_fields(self):
         selected = [v.get() for v in self.label_selector_vars if v.get()]
-        return [c for c in self.df.columns if c not in selected]
+        return [c for c in self.columns if c not in selected]
 
     def update_label_selectors(self):
         selected = [v.get() for v in self.label_selector_vars if v.get()]
         for i, cb in enumerate(self.label_selectors):
             current = self.label_selector_vars[i].get()
-            values = [c for c in self.df.columns if c not in selected or c == current]
+            values = [c for c in self.columns if c not in selected or c == current]
             cb['values'] = values
 
     def generate_flow(self):
-        if self.df is None:
+        if not self.columns:
             messagebox.showerror("错误", "请先导入数据文件")
             return
-            
-        df = self.df.copy()
+
+        try:
+            df = self.load_data().copy()
+        except Exception as e:
+            messagebox.showerror("错误", f"读取文件失败：{e}")
+            return
         mode = self.mode_var.get()
         
         if mode == "normal":
@@ -244,9 +277,6 @@ class MoneyFlowViewer(tk.Toplevel):
             if not node1_field or not node2_field or node1_field == node2_field:
                 messagebox.showerror("错误", "请选择不同的节点字段")
                 return
-                
-            node1_values = df[node1_field].astype(str)
-            node2_values = df[node2_field].astype(str)
             
         else:
             node1_format = self.node1_custom_var.get().strip()
@@ -256,374 +286,36 @@ class MoneyFlowViewer(tk.Toplevel):
                 messagebox.showerror("错误", "自定义节点格式不能为空")
                 return
                 
-            node1_values = df.apply(lambda row: self.format_custom_node(row, node1_format), axis=1)
-            node2_values = df.apply(lambda row: self.format_custom_node(row, node2_format), axis=1)
-            
             node1_field = "__node1_custom"
             node2_field = "__node2_custom"
-            df[node1_field] = node1_values
-            df[node2_field] = node2_values
+            df[node1_field] = format_node_values(df, node1_format)
+            df[node2_field] = format_node_values(df, node2_format)
 
-        if self.exclude_self_var.get():
-            df = df[df[node1_field] != df[node2_field]]
-        
         label_fields = [v.get() for v in self.label_selector_vars if v.get()]
+        if self.aggregate_var.get():
+            # 合并链路模式下备注字段作为明细列，可不选
+            try:
+                elements, edge_details = aggregate_flow_elements(
+                    df, node1_field, node2_field, self.amount_var.get() or None, self.time_var.get() or None,
+                    label_fields, self.exclude_self_var.get()
+                )
+            except Exception as e:
+                messagebox.showerror("错误", f"合并链路失败：{e}")
+                return
+            self.show_dash(elements, edge_details)
+            return
+
         if not label_fields:
             messagebox.showerror("错误", "请至少选择一个链路备注字段")
             return
 
-        nodes = set(df[node1_field].tolist() + df[node2_field].tolist())
-        elements = [{'data': {'id': n, 'label': n}} for n in nodes]
-        
-        for _, row in df.iterrows():
-            label = ", ".join([f"{f}:{row[f]}" for f in label_fields])
-            elements.append({
-                'data': {
-                    'source': row[node1_field],
-                    'target': row[node2_field],
-                    'label': label
-                }
-            })
-            
+        elements = build_flow_elements(df, node1_field, node2_field, label_fields, self.exclude_self_var.get())
         self.show_dash(elements)
 
-    def format_custom_node(self, row, pattern):
-        matches = re.findall(r'\{([^{}]+)\}', pattern)
-        
-        formatted = pattern
-        for field in matches:
-            if field in row:
-                formatted = formatted.replace(f'{{{field}}}', str(row[field]))
-        
-        return formatted
-
-    def show_dash(self, elements):
-        def run_dash():
-            def filter_components(run_clicks, reset_clicks, n_value, stored_elements, current_elements):
-                ctx = dash.callback_context
-                if not ctx.triggered:
-                    return dash.no_update, dash.no_update
-                
-                trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
-                
-                if trigger_id == 'reset-btn':
-                    return stored_elements, stored_elements
-                
-                if trigger_id == 'run-filter-btn' and n_value:
-                    G = nx.Graph()
-                    node_map = {}
-                    
-                    for elem in stored_elements:
-                        if 'source' in elem['data']:
-                            source = elem['data']['source']
-                            target = elem['data']['target']
-                            G.add_edge(source, target)
-                        else:
-                            node_id = elem['data']['id']
-                            G.add_node(node_id)
-                            node_map[node_id] = elem
-                    
-                    components = list(nx.connected_components(G))
-                    sorted_components = sorted(components, 
-                                            key=lambda x: len(x), 
-                                            reverse=True)[:int(n_value)]
-                    
-                    new_elements = []
-                    selected_nodes = set()
-                    
-                    for comp in sorted_components:
-                        selected_nodes.update(comp)
-                        for node in comp:
-                            new_elements.append(node_map[node])
-                    
-                    for elem in stored_elements:
-                        if 'source' in elem['data']:
-                            source = elem['data']['source']
-                            target = elem['data']['target']
-                            if source in selected_nodes and target in selected_nodes:
-                                new_elements.append(elem)
-                    
-                    return new_elements, stored_elements
-                
-                return current_elements, stored_elements
-
-            default_layout = {'name': 'breadthfirst'}
-            default_edge_style = 'bezier'
-            default_font_size = 16
-            default_edge_width = 2
-            default_edge_color = '#888'
-            default_font_color = '#000'
-            default_node_color = '#000'
-
-            app = dash.Dash()
-            app.layout = html.Div([
-                html.Div([
-                    html.Button("一键重新分布", id="btn-layout", n_clicks=0, style={"marginRight": "10px"}),
-                    html.Button("切换链路样式", id="btn-style", n_clicks=0, style={"marginRight": "10px"}),
-                    html.Button("字体放大", id="btn-font-up", n_clicks=0, style={"marginRight": "10px"}),
-                    html.Button("字体缩小", id="btn-font-down", n_clicks=0, style={"marginRight": "10px"}),
-                    dcc.Clipboard(
-                        id="cytoscape-copy",
-                        title="复制图表信息",
-                        style={
-                            "display": "inline-block",
-                            "fontSize": 20,
-                            "verticalAlign": "top",
-                            "cursor": "pointer",
-                            "marginRight": "10px"
-                        }
-                    ),
-                    html.Button("线条加粗", id="btn-line-thicker", n_clicks=0, style={"marginRight": "10px"}),
-                    html.Button("线条变细", id="btn-line-thinner", n_clicks=0, style={"marginRight": "10px"}),
-                ], style={"marginBottom": "10px", "display": "flex", "flexWrap": "wrap", "alignItems": "center"}),
-                
-                html.Div([
-                    dcc.Input(
-                        id='component-limit-input',
-                        type='number',
-                        min=1,
-                        placeholder='限定链路数量（按长度）',
-                        style={'width': '180px', 'marginRight': '10px'}
-                    ),
-                    html.Button('运行', id='run-filter-btn', n_clicks=0, style={'marginRight': '10px'}),
-                    html.Button('重置', id='reset-btn', n_clicks=0)
-                ], style={'marginBottom': '10px'}),
-                
-                dcc.Store(id='original-elements-store', data=elements),
-                
-                html.Div([
-                    html.Div([
-                        html.Label("线条颜色: ", style={'marginRight': '5px'}),
-                        dcc.Input(
-                            id='edge-color-picker',
-                            type='text',
-                            value=default_edge_color,
-                            style={'width': '80px', 'marginRight': '10px'}
-                        ),
-                        html.Div(
-                            id='edge-color-preview',
-                            style={
-                                'width': '30px',
-                                'height': '20px',
-                                'background': default_edge_color,
-                                'display': 'inline-block',
-                                'border': '1px solid #000',
-                                'verticalAlign': 'middle'
-                            }
-                        )
-                    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '20px'}),
-                    
-                    html.Div([
-                        html.Label("字体颜色: ", style={'marginRight': '5px'}),
-                        dcc.Input(
-                            id='font-color-picker',
-                            type='text',
-                            value=default_font_color,
-                            style={'width': '80px', 'marginRight': '10px'}
-                        ),
-                        html.Div(
-                            id='font-color-preview',
-                            style={
-                                'width': '30px',
-                                'height': '20px',
-                                'background': default_font_color,
-                                'display': 'inline-block',
-                                'border': '1px solid #000',
-                                'verticalAlign': 'middle'
-                            }
-                        )
-                    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': '20px'}),
-                    
-                    html.Div([
-                        html.Label("节点颜色: ", style={'marginRight': '5px'}),
-                        dcc.Input(
-                            id='node-color-picker',
-                            type='text',
-                            value=default_node_color,
-                            style={'width': '80px', 'marginRight': '10px'}
-                        ),
-                        html.Div(
-                            id='node-color-preview',
-                            style={
-                                'width': '30px',
-                                'height': '20px',
-                                'background': default_node_color,
-                                'display': 'inline-block',
-                                'border': '1px solid #000',
-                                'verticalAlign': 'middle'
-                            }
-                        )
-                    ], style={'display': 'inline-block', 'verticalAlign': 'middle'})
-                ], style={"marginBottom": "10px"}),
-                
-                cyto.Cytoscape(
-                    id='cytoscape',
-                    elements=elements,
-                    layout=default_layout,
-                    style={'width': '100%', 'height': '600px'},
-                    stylesheet=[
-                        {
-                            'selector': 'edge',
-                            'style': {
-                                'curve-style': default_edge_style,
-                                'target-arrow-shape': 'triangle',
-                                'label': 'data(label)',
-                                'font-size': '12px',
-                                'width': default_edge_width,
-                                'line-color': default_edge_color,
-                                'color': default_font_color
-                            }
-                        },
-                        {
-                            'selector': 'node',
-                            'style': {
-                                'label': 'data(label)',
-                                'font-size': f'{default_font_size}px',
-                                'background-color': default_node_color,
-                                'color': default_font_color
-                            }
-                        }
-                    ]
-                )
-            ])
-            
-            edge_styles = ['bezier', 'straight', 'taxi', 'unbundled-bezier', 'haystack']
-            layout_types = ['breadthfirst', 'circle', 'grid', 'cose', 'concentric']
-            font_size = [default_font_size]
-            edge_style_idx = [0]
-            layout_idx = [0]
-            edge_width = [default_edge_width]
-            edge_color = [default_edge_color]
-            font_color = [default_font_color]
-            node_color = [default_node_color]
-            
-            @app.callback(
-                Output('cytoscape', 'layout'),
-                Output('original-elements-store', 'data'),
-                Input('btn-layout', 'n_clicks'),
-                State('original-elements-store', 'data'),
-                prevent_initial_call=True
-            )
-            def update_layout(n_clicks, stored_elements):
-                layout_idx[0] = (layout_idx[0] + 1) % len(layout_types)
-                return {'name': layout_types[layout_idx[0]]}, stored_elements
-            
-            @app.callback(
-                Output('cytoscape', 'stylesheet'),
-                Input('btn-style', 'n_clicks'),
-                Input('btn-font-up', 'n_clicks'),
-                Input('btn-font-down', 'n_clicks'),
-                Input('btn-line-thicker', 'n_clicks'),
-                Input('btn-line-thinner', 'n_clicks'),
-                Input('edge-color-picker', 'value'),
-                Input('font-color-picker', 'value'),
-                Input('node-color-picker', 'value'),
-                State('cytoscape', 'stylesheet'),
-                prevent_initial_call=True
-            )
-            def update_style(n_style, n_up, n_down, n_thicker, n_thinner, 
-                            edge_color_value, font_color_value, node_color_value, stylesheet):
-                ctx = dash.callback_context
-                if not ctx.triggered:
-                    return stylesheet
-                
-                btn_id = ctx.triggered[0]['prop_id'].split('.')[0]
-                updated = False
-                
-                if btn_id == 'btn-style':
-                    edge_style_idx[0] = (edge_style_idx[0] + 1) % len(edge_styles)
-                    updated = True
-                
-                elif btn_id == 'btn-font-up':
-                    font_size[0] = min(font_size[0] + 2, 40)
-                    updated = True
-                
-                elif btn_id == 'btn-font-down':
-                    font_size[0] = max(font_size[0] - 2, 8)
-                    updated = True
-                
-                elif btn_id == 'btn-line-thicker':
-                    edge_width[0] = min(edge_width[0] + 1, 10)
-                    updated = True
-                
-                elif btn_id == 'btn-line-thinner':
-                    edge_width[0] = max(edge_width[0] - 1, 1)
-                    updated = True
-                
-                elif btn_id == 'edge-color-picker':
-                    edge_color[0] = edge_color_value
-                    updated = True
-                elif btn_id == 'font-color-picker':
-                    font_color[0] = font_color_value
-                    updated = True
-                elif btn_id == 'node-color-picker':
-                    node_color[0] = node_color_value
-                    updated = True
-                
-                if updated:
-                    new_stylesheet = [
-                        {
-                            'selector': 'edge',
-                            'style': {
-                                'curve-style': edge_styles[edge_style_idx[0]],
-                                'target-arrow-shape': 'triangle',
-                                'label': 'data(label)',
-                                'font-size': '12px',
-                                'width': edge_width[0],
-                                'line-color': edge_color[0],
-                                'color': font_color[0]
-                            }
-                        },
-                        {
-                            'selector': 'node',
-                            'style': {
-                                'label': 'data(label)',
-                                'font-size': f'{font_size[0]}px',
-                                'background-color': node_color[0],
-                                'color': font_color[0]
-                            }
-                        }
-                    ]
-                    return new_stylesheet
-                
-                return stylesheet
-            
-            @app.callback(
-                Output('cytoscape', 'elements'),
-                Output('original-elements-store', 'data', allow_duplicate=True),
-                Input('run-filter-btn', 'n_clicks'),
-                Input('reset-btn', 'n_clicks'),
-                State('component-limit-input', 'value'),
-                State('original-elements-store', 'data'),
-                State('cytoscape', 'elements'),
-                prevent_initial_call=True
-            )
-            def update_filter(run_clicks, reset_clicks, n_value, stored_elements, current_elements):
-                return filter_components(run_clicks, reset_clicks, n_value, stored_elements, current_elements)
-            
-            @app.callback(
-                Output('edge-color-preview', 'style'),
-                Input('edge-color-picker', 'value')
-            )
-            def update_edge_color_preview(color):
-                return {'background': color, 'width': '30px', 'height': '20px', 'display': 'inline-block', 'border': '1px solid #000', 'verticalAlign': 'middle'}
-            
-            @app.callback(
-                Output('font-color-preview', 'style'),
-                Input('font-color-picker', 'value')
-            )
-            def update_font_color_preview(color):
-                return {'background': color, 'width': '30px', 'height': '20px', 'display': 'inline-block', 'border': '1px solid #000', 'verticalAlign': 'middle'}
-            
-            @app.callback(
-                Output('node-color-preview', 'style'),
-                Input('node-color-picker', 'value')
-            )
-            def update_node_color_preview(color):
-                return {'background': color, 'width': '30px', 'height': '20px', 'display': 'inline-block', 'border': '1px solid #000', 'verticalAlign': 'middle'}
-            
-            port = 8050
-            webbrowser.open(f"http://localhost:{port}")
-            app.run(port=port)
-
-        threading.Thread(target=run_dash, daemon=True).start()
\ No newline at end of file
+    def show_dash(self, elements, edge_details=None):
+        # 所有流向图共用一个常驻的 Web 服务，每张图注册后在自己的地址下打开
+        title = f"{os.path.basename(self.file_path)} {datetime.now().strftime('%H:%M:%S')}"
+        try:
+            open_graph(FlowGraph(elements, edge_details, title))
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"启动流向图服务失败：{e}")
@@ -0,0 +1,269 @@
+"""流向图节点分析：加权度、PageRank、中介中心性、过手率和社区划分
+
+在流向图的有向 CSR 邻接（同向的多条边合并）上按整列运算，稀疏矩阵乘向量用 np.bincount 完成，
+每项指标第一次使用时计算，之后随图缓存：
+    - 加权度：流入、流出金额（未选择金额字段时为笔数）
+    - PageRank：按金额加权的资金汇聚程度
+    - 中介中心性：Brandes 算法，节点较多时随机抽样起点近似
+    - 过手率：流入与流出金额中较小者占较大者的比例，接近 1 表示资金快进快出
+    - 社区：节点不多时用 Louvain（networkx），较多时用标签传播
+"""
+import threading
+from typing import Dict, List
+
+import networkx as nx
+import numpy as np
+
+from .money_flow_layout import _gather
+
+# 节点数不超过该值时精确计算中介中心性，否则抽样 BETWEENNESS_SAMPLES 个起点
+EXACT_BETWEENNESS_LIMIT = 500
+BETWEENNESS_SAMPLES = 128
+# 节点数不超过该值时用 Louvain 划分社区，否则用标签传播
+LOUVAIN_NODE_LIMIT = 20000
+LABEL_PROPAGATION_ITERATIONS = 30
+PAGERANK_DAMPING = 0.85
+
+# 可用于节点大小的指标
+SIZE_METRICS = {
+    'strength': '加权度',
+    'pagerank': 'PageRank',
+    'betweenness': '中介中心性',
+    'passthrough': '过手率',
+}
+COMMUNITY_COLORS = [
+    '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b',
+    '#e377c2', '#17becf', '#bcbd22', '#7f7f7f', '#aec7e8', '#ffbb78',
+]
+# 超出调色板的社区及单独的节点
+OTHER_COMMUNITY_COLOR = '#cccccc'
+
+
+class GraphAnalytics:
+    """一张流向图的节点分析结果，各指标按需计算并缓存（线程安全）"""
+
+    def __init__(self, graph, seed: int = 0):
+        self.graph = graph
+        self.seed = seed
+        n = graph.n_nodes
+        # 边权重：合并链路为金额合计（无金额时为笔数），普通模式为合并的行数
+        amounts = np.array(
+            [e['data'].get('amount', e['data'].get('count', 1)) for e in graph.edge_elements], dtype=np.float64)
+        # 同一起点、终点的多条边（普通模式下备注不同）合并，避免重复计算最短路
+        pairs, inverse = np.unique(graph.source * max(n, 1) + graph.target, return_inverse=True)
+        self.source = pairs // max(n, 1)
+        self.target = pairs % max(n, 1)
+        self.weight = np.bincount(inverse, weights=np.abs(np.nan_to_num(amounts)), minlength=len(pairs))
+        self.out_edges = np.argsort(self.source, kind='stable')
+        self.out_offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.source, minlength=n), out=self.out_offsets[1:])
+        self._cache = {}
+        self._lock = threading.RLock()
+
+    def _cached(self, name, compute):
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = compute()
+            return self._cache[name]
+
+    def in_strength(self) -> np.ndarray:
+        return self._cached('in_strength', lambda: np.bincount(
+            self.target, weights=self.weight, minlength=self.graph.n_nodes))
+
+    def out_strength(self) -> np.ndarray:
+        return self._cached('out_strength', lambda: np.bincount(
+            self.source, weights=self.weight, minlength=self.graph.n_nodes))
+
+    def strength(self) -> np.ndarray:
+        return self.in_strength() + self.out_strength()
+
+    def passthrough(self) -> np.ndarray:
+        """过手率：min(流入, 流出) / max(流入, 流出)，只进或只出的节点为 0"""
+        def compute():
+            low = np.minimum(self.in_strength(), self.out_strength())
+            high = np.maximum(self.in_strength(), self.out_strength())
+            return np.divide(low, high, out=np.zeros_like(low), where=high > 0)
+        return self._cached('passthrough', compute)
+
+    def pagerank(self, damping: float = PAGERANK_DAMPING, tol: float = 1e-10, max_iter: int = 100) -> np.ndarray:
+        """按金额加权的 PageRank（幂迭代），没有流出的节点把得分平均分给所有节点"""
+        def compute():
+            n = self.graph.n_nodes
+            if n == 0:
+                return np.zeros(0)
+            out = self.out_strength()
+            share = self.weight / np.where(out > 0, out, 1)[self.source]
+            dangling = out == 0
+            rank = np.full(n, 1.0 / n)
+            for _ in range(max_iter):
+                spread = np.bincount(self.target, weights=rank[self.source] * share, minlength=n)
+                new = damping * (spread + rank[dangling].sum() / n) + (1 - damping) / n
+                if np.abs(new - rank).sum() < n * tol:
+                    rank = new
+                    break
+                rank = new
+            return rank / rank.sum()
+        return self._cached('pagerank', compute)
+
+    def _dependencies(self, source: int) -> np.ndarray:
+        """Brandes 算法：从 source 出发的最短路（不计权重）对各节点的依赖度"""
+        n = self.graph.n_nodes
+        dist = np.full(n, -1, dtype=np.int64)
+        sigma = np.zeros(n)
+        dist[source] = 0
+        sigma[source] = 1.0
+        frontier = np.array([source], dtype=np.int64)
+        levels = []  # 每层最短路上的边 (前驱, 后继)
+        depth = 0
+        while len(frontier):
+            starts = self.out_offsets[frontier]
+            counts = self.out_offsets[frontier + 1] - starts
+            edges = self.out_edges[_gather(starts, counts)]
+            owner = np.repeat(frontier, counts)
+            heads = self.target[edges]
+            fresh = heads[dist[heads] < 0]
+            dist[fresh] = depth + 1
+            on_path = dist[heads] == depth + 1
+            owner, heads = owner[on_path], heads[on_path]
+            sigma += np.bincount(heads, weights=sigma[owner], minlength=n)
+            levels.append((owner, heads))
+            frontier = np.unique(fresh)
+            depth += 1
+        delta = np.zeros(n)
+        for owner, heads in reversed(levels):
+            delta += np.bincount(owner, weights=sigma[owner] / sigma[heads] * (1 + delta[heads]), minlength=n)
+        delta[source] = 0
+        return delta
+
+    def betweenness(self) -> np.ndarray:
+        """有向图的中介中心性（按 (n-1)(n-2) 归一化），节点较多时抽样起点后按比例放大"""
+        def compute():
+            n = self.graph.n_nodes
+            if n <= EXACT_BETWEENNESS_LIMIT:
+                sources = np.arange(n)
+            else:
+                rng = np.random.default_rng(self.seed)
+                sources = rng.choice(n, BETWEENNESS_SAMPLES, replace=False)
+            total = np.zeros(n)
+            for source in sources.tolist():
+                total += self._dependencies(source)
+            if len(sources):
+                total *= n / len(sources)
+            return total / ((n - 1) * (n - 2)) if n > 2 else total
+        return self._cached('betweenness', compute)
+
+    def _label_propagation(self, iterations: int = LABEL_PROPAGATION_ITERATIONS) -> np.ndarray:
+        """加权标签传播（无向）：每轮随机一半节点改用相邻节点中权重合计最大的标签"""
+        n = self.graph.n_nodes
+        rng = np.random.default_rng(self.seed)
+        tails = np.concatenate([self.source, self.target])
+        heads = np.concatenate([self.target, self.source])
+        weights = np.concatenate([self.weight, self.weight]) + 1e-12
+        labels = np.arange(n, dtype=np.int64)
+        for _ in range(iterations):
+            keys, inverse = np.unique(tails * n + labels[heads], return_inverse=True)
+            score = np.bincount(inverse, weights=weights)
+            node, label = keys // n, keys % n
+            # 与当前标签并列最大时保留当前标签
+            score = score * (1 + 1e-9 * (label == labels[node]))
+            order = np.lexsort((-score, node))
+            first = order[np.r_[True, node[order][1:] != node[order][:-1]]]
+            best = labels.copy()
+            best[node[first]] = label[first]
+            if (best == labels).all():
+                break
+            update = rng.random(n) < 0.5
+            labels[update] = best[update]
+        return labels
+
+    def _louvain(self) -> np.ndarray:
+        nx_graph = nx.Graph()
+        nx_graph.add_nodes_from(range(self.graph.n_nodes))
+        # 互相转账的两个方向合并为一条无向边
+        for u, v, w in zip(self.source.tolist(), self.target.tolist(), self.weight.tolist()):
+            if nx_graph.has_edge(u, v):
+                nx_graph[u][v]['weight'] += w
+            else:
+                nx_graph.add_edge(u, v, weight=w)
+        labels = np.zeros(self.graph.n_nodes, dtype=np.int64)
+        for i, members in enumerate(nx.community.louvain_communities(nx_graph, weight='weight', seed=self.seed)):
+            labels[list(members)] = i
+        return labels
+
+    def communities(self) -> np.ndarray:
+        """各节点的社区编号，按社区大小排序（0 为最大的社区）"""
+        def compute():
+            n = self.graph.n_nodes
+            if n == 0:
+                return np.zeros(0, dtype=np.int64)
+            labels = self._louvain() if n <= LOUVAIN_NODE_LIMIT else self._label_propagation()
+            _, codes, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+            rank = np.empty(len(sizes), dtype=np.int64)
+            rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+            return rank[codes]
+        return self._cached('communities', compute)
+
+    def community_sizes(self) -> np.ndarray:
+        return np.bincount(self.communities())
+
+    def metric(self, name: str) -> np.ndarray:
+        if name == 'strength':
+            return self.strength()
+        if name == 'pagerank':
+            return self.pagerank()
+        if name == 'betweenness':
+            return self.betweenness()
+        if name == 'passthrough':
+            return self.passthrough()
+        raise ValueError(f"未知的指标：{name}")
+
+    def node_styles(self, nodes, size_metric: str = None, color_by: str = None) -> Dict[int, dict]:
+        """指定节点的大小（0~1，按指标最大值开方缩放）和颜色（按社区）"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        styles = {node: {} for node in nodes.tolist()}
+        if size_metric:
+            values = self.metric(size_metric)
+            top = values.max() if len(values) else 0
+            sizes = np.sqrt(values[nodes] / top) if top > 0 else np.zeros(len(nodes))
+            for node, size in zip(nodes.tolist(), np.round(sizes, 3).tolist()):
+                styles[node]['size'] = size
+        if color_by == 'community':
+            communities = self.communities()
+            community_sizes = self.community_sizes()
+            for node in nodes.tolist():
+                community = communities[node]
+                styles[node]['community'] = int(community)
+                styles[node]['color'] = (COMMUNITY_COLORS[community]
+                                         if community < len(COMMUNITY_COLORS) and community_sizes[community] > 1
+                                         else OTHER_COMMUNITY_COLOR)
+        return styles
+
+    def decorate(self, elements: list, size_metric: str = None, color_by: str = None) -> list:
+        """在节点元素的 data 中加入 size、color，供样式表按数据设置节点大小和颜色"""
+        if not size_metric and not color_by:
+            return elements
+        index = self.graph.node_index
+        nodes = [index[e['data']['id']] for e in elements if 'source' not in e['data']]
+        styles = self.node_styles(nodes, size_metric, color_by)
+        return [
+            e if 'source' in e['data'] else
+            {**e, 'data': {**e['data'], **styles[index[e['data']['id']]]}}
+            for e in elements
+        ]
+
+    def ranking(self, metric: str, limit: int = 20) -> List[dict]:
+        """按指标从高到低排列的节点（枢纽账户排名）"""
+        values = self.metric(metric)
+        top = np.argsort(-values, kind='stable')[:limit]
+        graph = self.graph
+        return [
+            {
+                '节点': graph.node_ids[node],
+                '流入': round(float(self.in_strength()[node]), 2),
+                '流出': round(float(self.out_strength()[node]), 2),
+                'PageRank': round(float(self.pagerank()[node]), 6),
+                '过手率': round(float(self.passthrough()[node]), 3),
+                SIZE_METRICS[metric]: round(float(values[node]), 6),
+            }
+            for node in top.tolist()
+        ]
@@ -0,0 +1,336 @@
+"""流向图快照导出：当前显示的节点、链路、样式和布局坐标写成一个独立的 HTML（或 JSON）文件
+
+快照不依赖 Python 服务和外部脚本，双击即可在浏览器中打开。为了让十万条链路的图也能很快打开：
+    - 节点用 0 开始的整数编号，链路只记录两端的编号
+    - 节点 id、标签和链路标签合并为一个去重的字符串字典，其余位置只存字典下标
+    - 坐标在导出时按服务端布局算好，取整后平铺为一维数组
+    - 页面用 canvas 直接绘制，不做浏览器端布局
+"""
+import json
+import os
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from .money_flow_graph import FlowGraph
+from .money_flow_layout import BROWSER_LAYOUT_LIMIT
+
+SNAPSHOT_VERSION = 1
+# 链路粗细分档（与 flow_stylesheet 中线宽在 edge_width 到 6 倍之间缩放一致）
+WEIGHT_LEVELS = 100
+DEFAULT_SNAPSHOT_STYLE = {
+    'edge_width': 2,
+    'edge_color': '#888',
+    'font_color': '#000',
+    'node_color': '#000',
+    'font_size': 16,
+}
+
+
+def snapshot_data(graph, nodes, layout_name: str, style: Dict = None, title: str = '资金流向图') -> dict:
+    """流向图中指定节点及其之间链路的快照数据
+
+    Args:
+        graph: FlowGraph
+        nodes: 要导出的节点编号（通常为当前显示的节点）
+        layout_name: 坐标使用的布局（服务端计算并缓存）
+        style: 线宽、颜色、字号，缺省项取 DEFAULT_SNAPSHOT_STYLE
+    """
+    nodes = np.asarray(nodes, dtype=np.int64)
+    mask = graph.node_mask(nodes)
+    edges = np.flatnonzero(mask[graph.source] & mask[graph.target])
+    # 全图节点编号 -> 快照内的编号
+    local = np.full(graph.n_nodes, -1, dtype=np.int64)
+    local[nodes] = np.arange(len(nodes))
+
+    node_data = [graph.node_elements[i]['data'] for i in nodes.tolist()]
+    edge_data = [graph.edge_elements[i]['data'] for i in edges.tolist()]
+    node_ids = [data['id'] for data in node_data]
+    strings = pd.Series(
+        node_ids + [data.get('label', data['id']) for data in node_data]
+        + [data.get('label', '') for data in edge_data],
+        dtype=object
+    ).astype(str)
+    codes, labels = pd.factorize(strings)
+    n_nodes = len(nodes)
+
+    magnitude = np.log1p(np.maximum(graph.edge_weight[edges], 0))
+    span = magnitude.max() - magnitude.min() if len(edges) else 0
+    weight = (magnitude - magnitude.min()) / span if span > 0 else np.zeros(len(edges))
+
+    # 节点较多时与页面一致使用整张图的服务端布局，较少时（页面中由浏览器布局）只对导出的部分布局
+    if n_nodes > BROWSER_LAYOUT_LIMIT:
+        coords = graph.layout(layout_name)[nodes]
+    else:
+        coords = FlowGraph(graph.elements(nodes, edges)).layout(layout_name)
+    positions = np.rint(coords).astype(np.int64)
+    return {
+        'version': SNAPSHOT_VERSION,
+        'title': title,
+        'layout': layout_name,
+        'style': {**DEFAULT_SNAPSHOT_STYLE, **(style or {})},
+        'labels': labels.tolist(),
+        'node_id': codes[:n_nodes].tolist(),
+        'node_label': codes[n_nodes:2 * n_nodes].tolist(),
+        'positions': positions.reshape(-1).tolist(),
+        'edges': np.column_stack([local[graph.source[edges]], local[graph.target[edges]]]).reshape(-1).tolist(),
+        'edge_label': codes[2 * n_nodes:].tolist(),
+        'edge_weight': np.rint(weight * WEIGHT_LEVELS).astype(np.int64).tolist(),
+    }
+
+
+def snapshot_json(data: dict) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def snapshot_html(data: dict) -> str:
+    """把快照数据嵌入自带绘图脚本的 HTML 页面"""
+    payload = snapshot_json(data).replace('</', '<\\/')
+    title = (data.get('title') or '资金流向图').replace('&', '&amp;').replace('<', '&lt;')
+    return SNAPSHOT_TEMPLATE.replace('__TITLE__', title).replace('__DATA__', payload)
+
+
+def export_snapshot(graph, path: str, nodes, layout_name: str, style: Dict = None,
+                    title: str = '资金流向图') -> str:
+    """导出快照，扩展名为 .json 时只写数据，否则写 HTML 页面；返回写出的路径"""
+    data = snapshot_data(graph, nodes, layout_name, style, title)
+    content = snapshot_json(data) if os.path.splitext(path)[1].lower() == '.json' else snapshot_html(data)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+
+SNAPSHOT_TEMPLATE = r"""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+  html, body { margin: 0; height: 100%; font-family: sans-serif; font-size: 13px; }
+  #bar { padding: 6px 10px; border-bottom: 1px solid #ccc; display: flex; gap: 10px; align-items: center; }
+  #view { position: absolute; top: 38px; left: 0; right: 0; bottom: 0; }
+  canvas { width: 100%; height: 100%; display: block; cursor: grab; }
+  #info { position: absolute; top: 46px; right: 10px; width: 320px; max-height: 60%; overflow: auto;
+          background: rgba(255,255,255,0.95); border: 1px solid #ccc; padding: 6px; display: none;
+          white-space: pre-wrap; }
+</style>
+</head>
+<body>
+<div id="bar">
+  <b id="title"></b><span id="note"></span>
+  <input id="search" placeholder="查找节点" style="width: 180px">
+  <button id="fit">适应窗口</button>
+</div>
+<div id="view"><canvas id="canvas"></canvas></div>
+<div id="info"></div>
+<script type="application/json" id="snapshot-data">__DATA__</script>
+<script>
+(function () {
+  var data = JSON.parse(document.getElementById('snapshot-data').textContent);
+  var L = data.labels, P = data.positions, ES = data.edges, S = data.style;
+  var N = data.node_label.length, E = data.edge_label.length;
+  var RADIUS = 15, LEVELS = 6;
+  document.getElementById('title').textContent = data.title;
+  document.getElementById('note').textContent = N + ' 个节点、' + E + ' 条链路';
+
+  // 按线宽分档，每档一次绘制
+  var buckets = [];
+  for (var b = 0; b < LEVELS; b++) buckets.push([]);
+  for (var e = 0; e < E; e++) buckets[Math.min(LEVELS - 1, Math.floor(data.edge_weight[e] * LEVELS / 101))].push(e);
+
+  var canvas = document.getElementById('canvas'), ctx = canvas.getContext('2d');
+  var scale = 1, ox = 0, oy = 0, dpr = window.devicePixelRatio || 1, selected = -1, pending = false;
+
+  function fit() {
+    var minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+    for (var i = 0; i < N; i++) {
+      var x = P[2 * i], y = P[2 * i + 1];
+      if (x < minX) minX = x; if (x > maxX) maxX = x;
+      if (y < minY) minY = y; if (y > maxY) maxY = y;
+    }
+    if (!N) { minX = minY = 0; maxX = maxY = 1; }
+    var w = canvas.clientWidth, h = canvas.clientHeight;
+    scale = Math.min(w / (maxX - minX + 4 * RADIUS), h / (maxY - minY + 4 * RADIUS));
+    ox = w / 2 - scale * (minX + maxX) / 2;
+    oy = h / 2 - scale * (minY + maxY) / 2;
+    redraw();
+  }
+
+  function resize() {
+    canvas.width = canvas.clientWidth * dpr;
+    canvas.height = canvas.clientHeight * dpr;
+    redraw();
+  }
+
+  function redraw() {
+    if (!pending) { pending = true; requestAnimationFrame(draw); }
+  }
+
+  function inView(x, y, margin) {
+    var sx = x * scale + ox, sy = y * scale + oy;
+    return sx > -margin && sy > -margin && sx < canvas.clientWidth + margin && sy < canvas.clientHeight + margin;
+  }
+
+  function drawLabel(text, x, y, size) {
+    var lines = text.split('\n');
+    for (var k = 0; k < lines.length; k++) ctx.fillText(lines[k], x, y + k * size * 1.2);
+  }
+
+  function draw() {
+    pending = false;
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    ctx.setTransform(scale * dpr, 0, 0, scale * dpr, ox * dpr, oy * dpr);
+    ctx.lineCap = 'round';
+    ctx.strokeStyle = S.edge_color;
+    for (var b = 0; b < LEVELS; b++) {
+      var list = buckets[b];
+      if (!list.length) continue;
+      ctx.lineWidth = Math.max(S.edge_width * (1 + 5 * b / (LEVELS - 1)), 0.5 / scale);
+      ctx.beginPath();
+      for (var j = 0; j < list.length; j++) {
+        var s = ES[2 * list[j]], t = ES[2 * list[j] + 1];
+        ctx.moveTo(P[2 * s], P[2 * s + 1]);
+        ctx.lineTo(P[2 * t], P[2 * t + 1]);
+      }
+      ctx.stroke();
+    }
+
+    // 放大到一定程度后才画箭头和标签
+    var visibleNodes = [], visibleEdges = [];
+    for (var i = 0; i < N; i++) if (inView(P[2 * i], P[2 * i + 1], 50)) visibleNodes.push(i);
+    var detailed = RADIUS * scale >= 4;
+    if (detailed) {
+      for (var e = 0; e < E; e++) {
+        var s2 = ES[2 * e], t2 = ES[2 * e + 1];
+        if (inView(P[2 * s2], P[2 * s2 + 1], 50) || inView(P[2 * t2], P[2 * t2 + 1], 50)) visibleEdges.push(e);
+        if (visibleEdges.length > 5000) break;
+      }
+      ctx.fillStyle = S.edge_color;
+      ctx.beginPath();
+      for (var a = 0; a < visibleEdges.length; a++) {
+        var u = ES[2 * visibleEdges[a]], v = ES[2 * visibleEdges[a] + 1];
+        var dx = P[2 * v] - P[2 * u], dy = P[2 * v + 1] - P[2 * u + 1], len = Math.sqrt(dx * dx + dy * dy) || 1;
+        var ux = dx / len, uy = dy / len, tipX = P[2 * v] - ux * RADIUS, tipY = P[2 * v + 1] - uy * RADIUS;
+        var size = 4 + 2 * S.edge_width;
+        ctx.moveTo(tipX, tipY);
+        ctx.lineTo(tipX - ux * size - uy * size / 2, tipY - uy * size + ux * size / 2);
+        ctx.lineTo(tipX - ux * size + uy * size / 2, tipY - uy * size - ux * size / 2);
+        ctx.closePath();
+      }
+      ctx.fill();
+    }
+
+    ctx.fillStyle = S.node_color;
+    ctx.beginPath();
+    var r = Math.max(RADIUS, 1.5 / scale);
+    for (var n = 0; n < visibleNodes.length; n++) {
+      var k = visibleNodes[n], x = P[2 * k], y = P[2 * k + 1];
+      if (detailed) { ctx.moveTo(x + r, y); ctx.arc(x, y, r, 0, 2 * Math.PI); }
+      else ctx.rect(x - r, y - r, 2 * r, 2 * r);
+    }
+    ctx.fill();
+    if (selected >= 0) {
+      ctx.strokeStyle = '#d62728';
+      ctx.lineWidth = 3 / scale;
+      ctx.beginPath();
+      ctx.arc(P[2 * selected], P[2 * selected + 1], r + 4 / scale, 0, 2 * Math.PI);
+      ctx.stroke();
+    }
+
+    ctx.fillStyle = S.font_color;
+    ctx.textAlign = 'center';
+    if (S.font_size * scale >= 6 && visibleNodes.length <= 2000) {
+      ctx.font = S.font_size + 'px sans-serif';
+      for (var m = 0; m < visibleNodes.length; m++) {
+        var q = visibleNodes[m];
+        drawLabel(L[data.node_label[q]], P[2 * q], P[2 * q + 1] - RADIUS - 4, S.font_size);
+      }
+    }
+    if (12 * scale >= 6 && visibleEdges.length && visibleEdges.length <= 1000) {
+      ctx.font = '12px sans-serif';
+      for (var z = 0; z < visibleEdges.length; z++) {
+        var ez = visibleEdges[z], p = ES[2 * ez], o = ES[2 * ez + 1];
+        drawLabel(L[data.edge_label[ez]], (P[2 * p] + P[2 * o]) / 2, (P[2 * p + 1] + P[2 * o + 1]) / 2, 12);
+      }
+    }
+  }
+
+  function nodeAt(sx, sy) {
+    var x = (sx - ox) / scale, y = (sy - oy) / scale, best = -1;
+    var limit = Math.max(RADIUS, 6 / scale), bestD = limit * limit;
+    for (var i = 0; i < N; i++) {
+      var dx = P[2 * i] - x, dy = P[2 * i + 1] - y, d = dx * dx + dy * dy;
+      if (d <= bestD) { bestD = d; best = i; }
+    }
+    return best;
+  }
+
+  function showInfo(node) {
+    var info = document.getElementById('info');
+    selected = node;
+    if (node < 0) { info.style.display = 'none'; redraw(); return; }
+    var lines = ['节点：' + L[data.node_id[node]]];
+    if (data.node_label[node] !== data.node_id[node]) lines.push(L[data.node_label[node]]);
+    var shown = 0, total = 0;
+    for (var e = 0; e < E; e++) {
+      var s = ES[2 * e], t = ES[2 * e + 1];
+      if (s !== node && t !== node) continue;
+      total++;
+      if (shown++ < 50) {
+        lines.push((s === node ? '→ ' + L[data.node_id[t]] : '← ' + L[data.node_id[s]]) + '  ' + L[data.edge_label[e]]);
+      }
+    }
+    lines.splice(1, 0, '相连链路：' + total);
+    info.textContent = lines.join('\n');
+    info.style.display = 'block';
+    redraw();
+  }
+
+  var dragging = false, moved = false, lastX = 0, lastY = 0;
+  canvas.addEventListener('mousedown', function (ev) { dragging = true; moved = false; lastX = ev.clientX; lastY = ev.clientY; });
+  window.addEventListener('mouseup', function (ev) {
+    if (dragging && !moved) {
+      var rect = canvas.getBoundingClientRect();
+      showInfo(nodeAt(ev.clientX - rect.left, ev.clientY - rect.top));
+    }
+    dragging = false;
+  });
+  window.addEventListener('mousemove', function (ev) {
+    if (!dragging) return;
+    var dx = ev.clientX - lastX, dy = ev.clientY - lastY;
+    if (Math.abs(dx) + Math.abs(dy) > 2) moved = true;
+    ox += dx; oy += dy; lastX = ev.clientX; lastY = ev.clientY;
+    redraw();
+  });
+  canvas.addEventListener('wheel', function (ev) {
+    ev.preventDefault();
+    var rect = canvas.getBoundingClientRect(), sx = ev.clientX - rect.left, sy = ev.clientY - rect.top;
+    var factor = Math.exp(-ev.deltaY * 0.0015);
+    ox = sx - (sx - ox) * factor; oy = sy - (sy - oy) * factor; scale *= factor;
+    redraw();
+  }, { passive: false });
+  document.getElementById('fit').addEventListener('click', fit);
+  document.getElementById('search').addEventListener('keydown', function (ev) {
+    if (ev.key !== 'Enter') return;
+    var text = this.value.trim();
+    for (var i = 0; i < N; i++) {
+      if (L[data.node_id[i]] === text || L[data.node_label[i]] === text) {
+        scale = Math.max(scale, 1);
+        ox = canvas.clientWidth / 2 - P[2 * i] * scale;
+        oy = canvas.clientHeight / 2 - P[2 * i + 1] * scale;
+        showInfo(i);
+        return;
+      }
+    }
+    alert('找不到节点：' + text);
+  });
+  window.addEventListener('resize', resize);
+  resize();
+  fit();
+})();
+</script>
+</body>
+</html>
+"""
@@ -0,0 +1,584 @@
+import re
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Union
+import numpy as np
+import pandas as pd
+from .fund_flow_engine import parse_transaction_time
+from .money_flow_analytics import GraphAnalytics
+from .money_flow_layout import BROWSER_LAYOUT_LIMIT, compute_layout
+from .money_flow_trace import FlowTracer
+
+# 自定义节点格式中的字段占位符，如 '{姓名}（{身份证号}）'
+FIELD_PATTERN = re.compile(r'\{([^{}]+)\}')
+
+# 点击合并后的链路时最多返回的流水行数
+DETAIL_ROW_LIMIT = 1000
+# 边数超过该值时，初始只显示权重最大的这些边所连接的节点（及节点之间的链路），其余通过点击节点逐步展开
+VIEW_EDGE_LIMIT = 3000
+# 点击节点时每次最多展开的相邻节点数（按边权重取前若干个）
+EXPAND_NODE_LIMIT = 500
+# 服务端最多保留的流向图数量，超出时丢弃最久未使用的
+GRAPH_STORE_SIZE = 8
+TIME_DISPLAY_FORMAT = '%Y-%m-%d %H:%M:%S'
+# 边编号的前缀（Cytoscape 中节点与边共用 id）
+EDGE_ID_PREFIX = '→e'
+
+
+def edge_id_prefix(node_ids) -> str:
+    """不会与节点 id 重复的边 id 前缀：有节点以前缀开头时重复前缀首字符，直到没有节点以其开头"""
+    prefix = EDGE_ID_PREFIX
+    node_ids = [str(node) for node in node_ids]
+    while any(node.startswith(prefix) for node in node_ids):
+        prefix = prefix[0] + prefix
+    return prefix
+
+
+def compile_node_template(pattern: str, columns) -> List[Tuple[bool, str]]:
+    """把自定义节点格式拆分为 (是否字段, 文本) 片段，只解析一次
+
+    数据中不存在的字段按原文保留（含大括号），与逐行替换时的行为一致。
+    """
+    columns = set(columns)
+    parts = []
+    for i, text in enumerate(FIELD_PATTERN.split(pattern)):
+        # split 结果中奇数位置为捕获到的字段名
+        if i % 2 == 1:
+            if text in columns:
+                parts.append((True, text))
+                continue
+            text = f'{{{text}}}'
+        if not text:
+            continue
+        if parts and not parts[-1][0]:
+            parts[-1] = (False, parts[-1][1] + text)
+        else:
+            parts.append((False, text))
+    return parts
+
+
+def format_node_values(df: pd.DataFrame, pattern: str) -> pd.Series:
+    """按自定义节点格式整列拼接节点名称"""
+    result = None
+    for is_field, text in compile_node_template(pattern, df.columns):
+        # 缺失值按逐行 str() 的结果写作 'nan'，不让整行节点名称变为缺失
+        part = df[text].astype(str).fillna('nan') if is_field else text
+        result = part if result is None else result + part
+    if result is None:
+        result = ''
+    if isinstance(result, str):
+        return pd.Series(result, index=df.index, dtype=str)
+    return result
+
+
+def build_edge_labels(df: pd.DataFrame, label_fields: List[str]) -> pd.Series:
+    """整列拼接链路备注：'字段1:值1, 字段2:值2'"""
+    label = None
+    for i, field in enumerate(label_fields):
+        prefix = f'{field}:' if i == 0 else f', {field}:'
+        part = prefix + df[field].astype(str).fillna('nan')
+        label = part if label is None else label + part
+    return label
+
+
+def build_flow_elements(df: pd.DataFrame, source_field: str, target_field: str,
+                        label_fields: List[str], exclude_self: bool = True) -> list:
+    """生成 Cytoscape 元素列表（节点在前，边在后）
+
+    节点与备注均按整列拼接生成；起点、终点和备注都相同的平行边合并为一条，
+    data 中的 count 为合并的行数，多于一行时在备注后注明“×行数”。
+    """
+    source = df[source_field].astype(str)
+    target = df[target_field].astype(str)
+    if exclude_self:
+        keep = (source != target).to_numpy()
+        source, target, df = source[keep], target[keep], df[keep]
+    # 缺失的起点、终点按文本 'nan' 处理，groupby 不会丢弃这些行
+    source, target = source.fillna('nan'), target.fillna('nan')
+
+    edges = pd.DataFrame({
+        'source': source.to_numpy(),
+        'target': target.to_numpy(),
+        'label': build_edge_labels(df, label_fields).to_numpy(),
+    })
+    edges = edges.groupby(['source', 'target', 'label'], sort=False).size().reset_index(name='count')
+    counts = edges['count']
+    labels = edges['label'].where(counts == 1, edges['label'] + ' ×' + counts.astype(str))
+
+    nodes = pd.unique(pd.concat([edges['source'], edges['target']], ignore_index=True))
+    nodes = nodes.tolist()
+    prefix = edge_id_prefix(nodes)
+    elements = [{'data': {'id': node, 'label': node}} for node in nodes]
+    elements.extend(
+        {'data': {'id': f'{prefix}{i}', 'source': s, 'target': t, 'label': label, 'count': count}}
+        for i, (s, t, label, count) in enumerate(zip(edges['source'].tolist(), edges['target'].tolist(),
+                                                     labels.tolist(), counts.tolist()))
+    )
+    return elements
+
+
+def parse_amounts(values: pd.Series) -> np.ndarray:
+    """金额列转为 float64，去掉千分位逗号，无法解析的为 NaN"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    text = values.astype(str).str.replace(',', '', regex=False).str.strip()
+    return pd.to_numeric(text, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+def parse_times(values: pd.Series) -> pd.Series:
+    """时间列转为 datetime64，先按资金分析的交易时间格式检测解析，失败时逐个宽松解析（无法解析的为 NaT）"""
+    values = values.mask(values.astype(str).str.strip() == '')
+    try:
+        return parse_transaction_time(values)
+    except (ValueError, TypeError):
+        return pd.to_datetime(values, errors='coerce', format='mixed')
+
+
+class EdgeDetailIndex:
+    """合并链路的原始流水索引：按边编号取出该边对应的流水行
+
+    行号按边编号稳定排序后存放（offsets 为各边的起止位置），取某条边的明细只需切片，
+    点击链路时才按需取出，不随图一起发送到浏览器。
+    """
+
+    def __init__(self, df: pd.DataFrame, edge_codes: np.ndarray, n_edges: int, time_column: str = None,
+                 amounts: np.ndarray = None):
+        self.df = df.reset_index(drop=True)
+        self.order = np.argsort(edge_codes, kind='stable')
+        self.offsets = np.zeros(n_edges + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_codes, minlength=n_edges), out=self.offsets[1:])
+        self.time_column = time_column
+        self.amounts = amounts  # 各行解析后的金额（与 df 行对应），用于资金追踪
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row_count(self, edge: int) -> int:
+        return int(self.offsets[edge + 1] - self.offsets[edge])
+
+    def rows(self, edge: int, limit: int = DETAIL_ROW_LIMIT) -> pd.DataFrame:
+        """返回第 edge 条边的流水（按时间排序，最多 limit 行）"""
+        rows = self.order[self.offsets[edge]:self.offsets[edge + 1]]
+        detail = self.df.iloc[rows]
+        if self.time_column:
+            detail = detail.sort_values(self.time_column, kind='stable')
+        return detail.head(limit)
+
+
+def aggregate_flow_elements(df: pd.DataFrame, source_field: str, target_field: str,
+                            amount_field: str = None, time_field: str = None,
+                            detail_fields: List[str] = None,
+                            exclude_self: bool = True) -> Tuple[list, EdgeDetailIndex]:
+    """合并链路模式：同一起点到同一终点的所有流水合并为一条边
+
+    边的 data 中包含 笔数 count、金额合计 amount、最早/最晚时间 first_time/last_time，
+    以及按金额（未指定金额字段时按笔数）对数缩放到 0~1 的 weight，用于控制线宽。
+    每行流水的明细不放入元素，由返回的 EdgeDetailIndex 按 data 中的 edge 编号按需查询，
+    明细包含起点、终点、时间、金额及 detail_fields 列。
+
+    Returns:
+        (元素列表, EdgeDetailIndex)
+    """
+    source = df[source_field].astype(str)
+    target = df[target_field].astype(str)
+    if exclude_self:
+        keep = (source != target).to_numpy()
+        source, target, df = source[keep], target[keep], df[keep]
+    # 起点或终点缺失时按文本 'nan' 作为节点（与逐行 str() 的结果一致），
+    # 否则 factorize 将其编号为 -1，起点终点组合后会并入其他节点的边
+    source, target = source.fillna('nan'), target.fillna('nan')
+
+    n_rows = len(df)
+    node_codes, nodes = pd.factorize(pd.concat([source, target], ignore_index=True))
+    pair_keys = node_codes[:n_rows].astype(np.int64) * max(len(nodes), 1) + node_codes[n_rows:]
+    edge_codes, unique_pairs = pd.factorize(pair_keys)
+    n_edges = len(unique_pairs)
+    edge_source = unique_pairs // max(len(nodes), 1)
+    edge_target = unique_pairs % max(len(nodes), 1)
+
+    counts = np.bincount(edge_codes, minlength=n_edges)
+    amounts = parse_amounts(df[amount_field]) if amount_field else None
+    if amounts is not None:
+        totals = np.bincount(edge_codes, weights=np.nan_to_num(amounts), minlength=n_edges)
+        magnitude = np.log1p(np.abs(totals))
+    else:
+        totals = None
+        magnitude = np.log1p(counts)
+    span = magnitude.max() - magnitude.min() if n_edges else 0
+    weights = (magnitude - magnitude.min()) / span if span > 0 else np.zeros(n_edges)
+
+    first_times = last_times = None
+    if time_field:
+        times = parse_times(df[time_field])
+        grouped = pd.Series(times.to_numpy()).groupby(edge_codes)
+        first_times, last_times = (
+            values.reindex(range(n_edges)).dt.strftime(TIME_DISPLAY_FORMAT).fillna('').tolist()
+            for values in (grouped.min(), grouped.max())
+        )
+
+    # 明细只保留需要展示的列
+    columns = [source_field, target_field]
+    for col in [time_field, amount_field] + list(detail_fields or []):
+        if col and col not in columns:
+            columns.append(col)
+    detail_df = df[columns].copy()
+    detail_time_column = None
+    if time_field:
+        detail_df['__time'] = times.to_numpy()
+        detail_time_column = '__time'
+    details = EdgeDetailIndex(detail_df, edge_codes, n_edges, detail_time_column, amounts)
+
+    node_list = nodes.tolist()
+    prefix = edge_id_prefix(node_list)
+    elements = [{'data': {'id': node, 'label': node}} for node in node_list]
+    counts = counts.tolist()
+    weights = np.round(weights, 4).tolist()
+    totals = np.round(totals, 2).tolist() if totals is not None else None
+    for i in range(n_edges):
+        label = f"{counts[i]}笔"
+        data = {
+            'id': f'{prefix}{i}',
+            'source': node_list[edge_source[i]],
+            'target': node_list[edge_target[i]],
+            'edge': i,
+            'count': counts[i],
+            'weight': weights[i],
+        }
+        if totals is not None:
+            data['amount'] = totals[i]
+            label += f" 合计{totals[i]:,.2f}"
+        if first_times is not None:
+            data['first_time'] = first_times[i]
+            data['last_time'] = last_times[i]
+        data['label'] = label
+        elements.append({'data': data})
+    return elements, details
+
+
+def flow_stylesheet(edge_style: str = 'bezier', edge_width: float = 2, edge_color: str = '#888',
+                    font_color: str = '#000', node_color: str = '#000', font_size: int = 16) -> List[Dict]:
+    """流向图样式表；合并链路（带 weight）的线宽在 edge_width 到其 6 倍之间按金额缩放"""
+    return [
+        {
+            'selector': 'edge',
+            'style': {
+                'curve-style': edge_style,
+                'target-arrow-shape': 'triangle',
+                'label': 'data(label)',
+                'font-size': '12px',
+                'width': edge_width,
+                'line-color': edge_color,
+                'color': font_color
+            }
+        },
+        {
+            'selector': 'edge[weight]',
+            'style': {
+                'width': f'mapData(weight, 0, 1, {edge_width}, {edge_width * 6})'
+            }
+        },
+        {
+            'selector': 'node',
+            'style': {
+                'label': 'data(label)',
+                'font-size': f'{font_size}px',
+                'background-color': node_color,
+                'color': font_color,
+                'text-wrap': 'wrap'
+            }
+        },
+        {
+            # 节点分析：按指标设置大小，按社区设置颜色
+            'selector': 'node[size]',
+            'style': {
+                'width': 'mapData(size, 0, 1, 15, 80)',
+                'height': 'mapData(size, 0, 1, 15, 80)'
+            }
+        },
+        {
+            'selector': 'node[color]',
+            'style': {
+                'background-color': 'data(color)'
+            }
+        },
+        {
+            # 资金追踪的起点
+            'selector': 'node[trace_start]',
+            'style': {
+                'background-color': '#d62728',
+                'border-width': 3,
+                'border-color': '#d62728'
+            }
+        }
+    ]
+
+
+def edge_detail_records(details: Union[EdgeDetailIndex, None], edge_data: dict,
+                        limit: int = DETAIL_ROW_LIMIT) -> Tuple[str, List[Dict], List[str]]:
+    """点击链路时的明细：返回 (标题, 行记录, 列名)"""
+    if not edge_data:
+        return '', [], []
+    title = f"{edge_data.get('source')} → {edge_data.get('target')}"
+    if details is None or 'edge' not in edge_data:
+        return f"{title}：{edge_data.get('label', '')}", [], []
+
+    edge = int(edge_data['edge'])
+    total = details.row_count(edge)
+    title += f"：共 {total} 笔"
+    if 'amount' in edge_data:
+        title += f"，合计 {edge_data['amount']:,.2f}"
+    if edge_data.get('first_time'):
+        title += f"，{edge_data['first_time']} 至 {edge_data['last_time']}"
+    if total > limit:
+        title += f"（显示前 {limit} 笔）"
+
+    rows = details.rows(edge, limit)
+    rows = rows.drop(columns=[details.time_column]) if details.time_column else rows
+    columns = [str(col) for col in rows.columns]
+    records = rows.astype(str).to_dict('records')
+    return title, records, columns
+
+
+class ComponentIndex:
+    """连通分量索引（并查集），生成流向图时建立一次
+
+    合并（hook）与路径压缩（pointer jumping）都按整列数组运算：每轮把每条边两端的根
+    挂到较小的根上，再反复令 parent = parent[parent] 直到每个节点直接指向根，至多几十轮。
+    分量按节点数从大到小编号（节点数相同时按最小节点编号），节点和边都按分量顺序排好并记录偏移，
+    取前 N 个分量或某个节点所在的分量都只是切片，耗时与结果大小成正比。
+    """
+
+    def __init__(self, source: np.ndarray, target: np.ndarray, n_nodes: int):
+        parent = np.arange(n_nodes, dtype=np.int64)
+        while True:
+            root_s, root_t = parent[source], parent[target]
+            differ = root_s != root_t
+            if not differ.any():
+                break
+            low = np.minimum(root_s[differ], root_t[differ])
+            high = np.maximum(root_s[differ], root_t[differ])
+            np.minimum.at(parent, high, low)
+            while True:
+                grand = parent[parent]
+                if np.array_equal(grand, parent):
+                    break
+                parent = grand
+
+        # 根按节点数从大到小排序后重新编号
+        roots, component, sizes = np.unique(parent, return_inverse=True, return_counts=True)
+        rank = np.empty(len(roots), dtype=np.int64)
+        rank[np.argsort(-sizes, kind='stable')] = np.arange(len(roots))
+        self.component = rank[component.reshape(-1)]  # 节点 -> 分量编号（0 为最大的分量）
+        self.sizes = np.sort(sizes)[::-1].copy()  # 各分量的节点数
+
+        self.nodes = np.argsort(self.component, kind='stable')
+        self.node_offsets = np.zeros(len(roots) + 1, dtype=np.int64)
+        np.cumsum(self.sizes, out=self.node_offsets[1:])
+        edge_component = self.component[source]
+        self.edges = np.argsort(edge_component, kind='stable')
+        self.edge_offsets = np.zeros(len(roots) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_component, minlength=len(roots)), out=self.edge_offsets[1:])
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def top(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """节点数最多的 n 个分量：返回 (节点编号, 边编号)"""
+        n = max(0, min(int(n), len(self)))
+        return self.nodes[:self.node_offsets[n]], self.edges[:self.edge_offsets[n]]
+
+    def of_node(self, node: int) -> Tuple[np.ndarray, np.ndarray]:
+        """节点所在的分量：返回 (节点编号, 边编号)"""
+        c = self.component[node]
+        return (self.nodes[self.node_offsets[c]:self.node_offsets[c + 1]],
+                self.edges[self.edge_offsets[c]:self.edge_offsets[c + 1]])
+
+
+class FlowGraph:
+    """保存在服务端的流向图
+
+    节点、边按编号存放：source/target 为各边两端的节点编号，无向邻接以 CSR 形式保存
+    （incident_edges[incident_offsets[v]:incident_offsets[v + 1]] 为与节点 v 相连的边），
+    浏览器与服务端之间只传递节点编号和新增的元素，不再来回发送整张图。
+    """
+
+    def __init__(self, elements: list, edge_details: EdgeDetailIndex = None, title: str = '资金流向图'):
+        self.title = title
+        self.node_elements = [e for e in elements if 'source' not in e['data']]
+        self.edge_elements = [e for e in elements if 'source' in e['data']]
+        self.node_ids = [e['data']['id'] for e in self.node_elements]
+        self.node_index = {node: i for i, node in enumerate(self.node_ids)}
+        n_edges = len(self.edge_elements)
+        prefix = edge_id_prefix(self.node_ids)
+        for i, e in enumerate(self.edge_elements):
+            e['data'].setdefault('id', f'{prefix}{i}')
+        self.source = np.fromiter(
+            (self.node_index[e['data']['source']] for e in self.edge_elements), dtype=np.int64, count=n_edges)
+        self.target = np.fromiter(
+            (self.node_index[e['data']['target']] for e in self.edge_elements), dtype=np.int64, count=n_edges)
+        # 边权重：合并链路为 weight，否则为合并的行数
+        self.edge_weight = np.fromiter(
+            (e['data'].get('weight', e['data'].get('count', 1)) for e in self.edge_elements),
+            dtype=np.float64, count=n_edges)
+        self.edge_details = edge_details
+
+        ends = np.concatenate([self.source, self.target])
+        self.incident_edges = np.argsort(ends, kind='stable') % max(n_edges, 1)
+        self.incident_offsets = np.zeros(self.n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(ends, minlength=self.n_nodes), out=self.incident_offsets[1:])
+        self.components = ComponentIndex(self.source, self.target, self.n_nodes)
+        self._initial_view = None
+        self._layouts = {}  # 布局名称 -> 整张图的坐标
+        self._layout_lock = threading.Lock()
+        self._tracer = None
+        self._analytics = None
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.edge_elements)
+
+    def node_mask(self, nodes) -> np.ndarray:
+        mask = np.zeros(self.n_nodes, dtype=bool)
+        mask[np.asarray(nodes, dtype=np.int64)] = True
+        return mask
+
+    def elements(self, nodes, edges) -> list:
+        return [self.node_elements[i] for i in np.asarray(nodes).tolist()] + \
+            [self.edge_elements[i] for i in np.asarray(edges).tolist()]
+
+    def elements_for(self, nodes) -> list:
+        """指定节点及其之间的边"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        mask = self.node_mask(nodes)
+        return self.elements(nodes, np.flatnonzero(mask[self.source] & mask[self.target]))
+
+    def initial_view(self, edge_limit: int = VIEW_EDGE_LIMIT) -> Tuple[np.ndarray, np.ndarray]:
+        """初始显示的 (节点编号, 边编号)，只计算一次
+
+        边数不超过 edge_limit 时为整张图，否则为权重最大的 edge_limit 条边所连接的节点及其之间的边。
+        """
+        if self._initial_view is None:
+            if self.n_edges <= edge_limit:
+                self._initial_view = (np.arange(self.n_nodes), np.arange(self.n_edges))
+            else:
+                top = np.argsort(-self.edge_weight, kind='stable')[:edge_limit]
+                nodes = np.unique(np.concatenate([self.source[top], self.target[top]]))
+                mask = self.node_mask(nodes)
+                self._initial_view = (nodes, np.flatnonzero(mask[self.source] & mask[self.target]))
+        return self._initial_view
+
+    def layout(self, name: str) -> np.ndarray:
+        """整张图的布局坐标，每种布局只计算一次"""
+        with self._layout_lock:
+            if name not in self._layouts:
+                self._layouts[name] = compute_layout(self, name)
+            return self._layouts[name]
+
+    def tracer(self) -> FlowTracer:
+        """资金追踪索引，第一次追踪时建立"""
+        with self._layout_lock:
+            if self._tracer is None:
+                self._tracer = FlowTracer(self)
+            return self._tracer
+
+    def analytics(self) -> GraphAnalytics:
+        """节点分析（中心性、社区），各指标第一次使用时计算"""
+        with self._layout_lock:
+            if self._analytics is None:
+                self._analytics = GraphAnalytics(self)
+            return self._analytics
+
+    def positions(self, name: str, nodes) -> Dict[str, dict]:
+        """指定节点的坐标，用于 cytoscape 的 preset 布局：节点 id -> {'x', 'y'}"""
+        nodes = np.asarray(nodes, dtype=np.int64)
+        coords = np.round(self.layout(name)[nodes], 1).tolist()
+        return {self.node_ids[i]: {'x': x, 'y': y} for i, (x, y) in zip(nodes.tolist(), coords)}
+
+    def cytoscape_layout(self, name: str, nodes) -> dict:
+        """显示指定节点时的布局：节点较少时交给浏览器计算，否则发送服务端算好的坐标（preset）"""
+        if len(nodes) <= BROWSER_LAYOUT_LIMIT:
+            return {'name': name}
+        return {'name': 'preset', 'positions': self.positions(name, nodes), 'fit': True}
+
+    def positioned(self, name: str, elements: list) -> list:
+        """给元素中的节点加上布局坐标（preset 布局下追加节点时使用）"""
+        nodes = [self.node_index[e['data']['id']] for e in elements if 'source' not in e['data']]
+        positions = self.positions(name, nodes)
+        return [
+            e if 'source' in e['data'] else {**e, 'position': positions[e['data']['id']]}
+            for e in elements
+        ]
+
+    def incident(self, node: int) -> np.ndarray:
+        return self.incident_edges[self.incident_offsets[node]:self.incident_offsets[node + 1]]
+
+    def expand(self, node: int, visible, limit: int = EXPAND_NODE_LIMIT) -> Tuple[np.ndarray, list]:
+        """展开节点的相邻节点：返回 (新增节点编号, 新增元素)
+
+        新增节点为尚未显示的相邻节点（按边权重取前 limit 个），新增元素包括这些节点，
+        以及它们与已显示节点、彼此之间的边。
+        """
+        visible_mask = self.node_mask(visible)
+        edges = self.incident(node)
+        neighbors = np.where(self.source[edges] == node, self.target[edges], self.source[edges])
+        hidden = ~visible_mask[neighbors]
+        edges, neighbors = edges[hidden], neighbors[hidden]
+        order = np.argsort(-self.edge_weight[edges], kind='stable')
+        new_nodes = pd.unique(neighbors[order])[:limit]
+        if not len(new_nodes):
+            return new_nodes, []
+
+        shown = visible_mask
+        shown[new_nodes] = True
+        new_edges = np.unique(np.concatenate([self.incident(v) for v in new_nodes.tolist()]))
+        new_edges = new_edges[shown[self.source[new_edges]] & shown[self.target[new_edges]]]
+        elements = [self.node_elements[i] for i in new_nodes.tolist()]
+        elements += [self.edge_elements[i] for i in new_edges.tolist()]
+        return new_nodes, elements
+
+
+class GraphStore:
+    """按编号保存流向图（线程安全），浏览器端只保存编号
+
+    最多保留 max_graphs 张图，超出时丢弃最久未使用的。
+    """
+
+    def __init__(self, max_graphs: int = GRAPH_STORE_SIZE):
+        self.max_graphs = max_graphs
+        self._graphs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, graph: FlowGraph) -> str:
+        graph_id = uuid.uuid4().hex
+        with self._lock:
+            self._graphs[graph_id] = graph
+            while len(self._graphs) > self.max_graphs:
+                self._graphs.popitem(last=False)
+        return graph_id
+
+    def get(self, graph_id: str) -> Union[FlowGraph, None]:
+        with self._lock:
+            graph = self._graphs.get(graph_id)
+            if graph is not None:
+                self._graphs.move_to_end(graph_id)
+            return graph
+
+    def graph_ids(self) -> List[str]:
+        """已保存的图编号（最近使用的在后）"""
+        with self._lock:
+            return list(self._graphs)
+
+    def remove(self, graph_id: str):
+        with self._lock:
+            self._graphs.pop(graph_id, None)
+
+    def __len__(self):
+        return len(self._graphs)
+
+
+GRAPH_STORE = GraphStore()
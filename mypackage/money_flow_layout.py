@@ -0,0 +1,241 @@
+"""流向图布局（服务端计算）
+
+节点较多时由浏览器计算 breadthfirst、cose 等布局会卡住页面，这里用 numpy 按整列运算计算坐标，
+以 preset 布局发送给浏览器，浏览器只负责绘制。各连通分量分别布局后按行排布，互不重叠。
+"""
+import numpy as np
+
+# 与浏览器端切换顺序一致的布局
+LAYOUT_NAMES = ['breadthfirst', 'circle', 'grid', 'cose', 'concentric']
+# 显示的节点数超过该值时改由服务端计算布局
+BROWSER_LAYOUT_LIMIT = 1000
+# 相邻节点的间距（cytoscape 坐标）
+NODE_SPACING = 60.0
+# 力导向布局：节点数不超过该值的分量逐对精确计算斥力，更大的分量用网格（FFT 卷积）近似
+EXACT_FORCE_LIMIT = 256
+FORCE_ITERATIONS = 100
+FFT_GRID_LIMIT = 512
+# 精确计算斥力时每批最多的节点对数，控制内存占用
+PAIR_BATCH_SIZE = 2_000_000
+
+
+def _component_ranks(components):
+    """按分量顺序排列的节点及其在分量内的序号"""
+    nodes = components.nodes
+    comp = components.component[nodes]
+    rank = np.arange(len(nodes)) - components.node_offsets[comp]
+    return nodes, comp, rank
+
+
+def _gather(starts, counts):
+    """CSR 切片拼接：返回所有 [start, start + count) 的下标"""
+    total = int(counts.sum())
+    base = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return base + np.arange(total)
+
+
+def grid_positions(components) -> np.ndarray:
+    nodes, comp, rank = _component_ranks(components)
+    side = np.ceil(np.sqrt(components.sizes[comp]))
+    local = np.empty((len(nodes), 2))
+    local[nodes, 0] = rank % side
+    local[nodes, 1] = rank // side
+    return local
+
+
+def circle_positions(components) -> np.ndarray:
+    nodes, comp, rank = _component_ranks(components)
+    size = components.sizes[comp]
+    radius = np.maximum(size / (2 * np.pi), 0.5)
+    angle = 2 * np.pi * rank / size
+    local = np.empty((len(nodes), 2))
+    local[nodes, 0] = radius * np.cos(angle)
+    local[nodes, 1] = radius * np.sin(angle)
+    return local
+
+
+def concentric_positions(components, degree: np.ndarray) -> np.ndarray:
+    """度数高的节点在内圈：第 r 圈（r >= 1）放 6r 个节点"""
+    comp_of = components.component
+    nodes = np.lexsort((-degree, comp_of))
+    comp = comp_of[nodes]
+    k = np.arange(len(nodes)) - components.node_offsets[comp]
+    ring = np.zeros(len(nodes), dtype=np.int64)
+    outer = k > 0
+    ring[outer] = np.floor((-3 + np.sqrt(12 * k[outer] - 3)) / 6).astype(np.int64) + 1
+    # 修正浮点误差：第 r 圈之前共有 1 + 3r(r-1) 个节点
+    before = 1 + 3 * ring * (ring - 1)
+    ring[outer & (k < before)] -= 1
+    before = np.where(ring > 0, 1 + 3 * ring * (ring - 1), 0)
+    angle = 2 * np.pi * (k - before) / np.maximum(6 * ring, 1)
+    local = np.empty((len(nodes), 2))
+    local[nodes, 0] = ring * np.cos(angle)
+    local[nodes, 1] = ring * np.sin(angle)
+    return local
+
+
+def breadthfirst_positions(graph, degree: np.ndarray) -> np.ndarray:
+    """每个分量以度数最高的节点为根逐层展开，同层节点按发现顺序横向排列（子节点靠近父节点）"""
+    components = graph.components
+    n = graph.n_nodes
+    comp_of = components.component
+    by_degree = np.lexsort((-degree, comp_of))
+    roots = by_degree[components.node_offsets[:-1]]
+
+    level = np.full(n, -1, dtype=np.int64)
+    found = np.zeros(n, dtype=np.int64)
+    level[roots] = 0
+    found[roots] = np.arange(len(roots))
+    counter = len(roots)
+    frontier = roots
+    depth = 0
+    while len(frontier):
+        starts = graph.incident_offsets[frontier]
+        counts = graph.incident_offsets[frontier + 1] - starts
+        edges = graph.incident_edges[_gather(starts, counts)]
+        owner = np.repeat(frontier, counts)
+        neighbors = graph.source[edges] + graph.target[edges] - owner
+        neighbors = neighbors[level[neighbors] < 0]
+        # 保持首次发现的顺序
+        _, first = np.unique(neighbors, return_index=True)
+        frontier = neighbors[np.sort(first)]
+        depth += 1
+        level[frontier] = depth
+        found[frontier] = counter + np.arange(len(frontier))
+        counter += len(frontier)
+
+    order = np.lexsort((found, level, comp_of))
+    group = comp_of[order] * (level.max() + 1) + level[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, sizes)
+    local = np.empty((n, 2))
+    local[order, 0] = rank - (np.repeat(sizes, sizes) - 1) / 2
+    local[order, 1] = level[order] * 2.0
+    return local
+
+
+def _limit_step(pos, disp, temperature):
+    length = np.sqrt((disp ** 2).sum(-1, keepdims=True)) + 1e-9
+    return pos + disp / length * np.minimum(length, temperature)
+
+
+def _exact_force(pos, rows, heads, tails, temperature):
+    """一批同样大小的分量：pos 为 (分量数, 节点数, 2)，边以 (分量行, 端点列) 给出"""
+    delta = pos[:, :, None, :] - pos[:, None, :, :]
+    dist2 = (delta ** 2).sum(-1) + 1e-9
+    disp = (delta / dist2[..., None]).sum(2)
+    size = pos.shape[1]
+    flat = pos.reshape(-1, 2)
+    d = flat[rows * size + heads] - flat[rows * size + tails]
+    pull = d * np.sqrt((d ** 2).sum(-1, keepdims=True))
+    disp = disp.reshape(-1, 2)
+    np.subtract.at(disp, rows * size + heads, pull)
+    np.add.at(disp, rows * size + tails, pull)
+    return _limit_step(pos, disp.reshape(pos.shape), temperature)
+
+
+def _grid_repulsion(pos: np.ndarray, grid_limit: int = FFT_GRID_LIMIT) -> np.ndarray:
+    """网格近似斥力：节点计数落到网格上，与 1/d 斥力核做 FFT 卷积，再按所在格子取值"""
+    n = len(pos)
+    low = pos.min(0)
+    span = (pos.max(0) - low).max() + 1e-9
+    size = int(min(grid_limit, max(16, 2 ** int(np.ceil(np.log2(np.sqrt(n) * 2))))))
+    step = span / (size - 1)
+    cell = np.clip(((pos - low) / step).astype(np.int64), 0, size - 1)
+    density = np.bincount(cell[:, 0] * size + cell[:, 1], minlength=size * size).reshape(size, size)
+
+    offset = np.fft.fftfreq(2 * size, 1 / (2 * size)) * step
+    dx, dy = offset[:, None], offset[None, :]
+    dist2 = dx ** 2 + dy ** 2
+    dist2[0, 0] = np.inf
+    spectrum = np.fft.rfft2(density, s=(2 * size, 2 * size))
+    fx = np.fft.irfft2(spectrum * np.fft.rfft2(dx / dist2), s=(2 * size, 2 * size))[:size, :size]
+    fy = np.fft.irfft2(spectrum * np.fft.rfft2(dy / dist2), s=(2 * size, 2 * size))[:size, :size]
+    return np.stack([fx[cell[:, 0], cell[:, 1]], fy[cell[:, 0], cell[:, 1]]], axis=1)
+
+
+def _large_force(n, heads, tails, iterations, rng):
+    """单个较大分量的力导向布局（Fruchterman-Reingold，理想边长为 1）"""
+    pos = rng.random((n, 2)) * np.sqrt(n)
+    temperature = np.sqrt(n) / 10
+    for i in range(iterations):
+        disp = _grid_repulsion(pos)
+        d = pos[heads] - pos[tails]
+        pull = d * np.sqrt((d ** 2).sum(-1, keepdims=True))
+        for axis in (0, 1):
+            disp[:, axis] += (np.bincount(tails, weights=pull[:, axis], minlength=n)
+                              - np.bincount(heads, weights=pull[:, axis], minlength=n))
+        pos = _limit_step(pos, disp, temperature * (1 - i / iterations) + 0.01)
+    return pos
+
+
+def force_positions(graph, iterations: int = FORCE_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """力导向布局：小分量按大小分批精确计算，大分量逐个用网格近似斥力"""
+    components = graph.components
+    rng = np.random.default_rng(seed)
+    local = np.zeros((graph.n_nodes, 2))
+    # 节点在所属分量内的序号
+    column = np.zeros(graph.n_nodes, dtype=np.int64)
+    column[components.nodes] = _component_ranks(components)[2]
+
+    sizes = components.sizes
+    for size in np.unique(sizes[(sizes > 1) & (sizes <= EXACT_FORCE_LIMIT)]).tolist():
+        comps = np.flatnonzero(sizes == size)
+        per_batch = max(1, PAIR_BATCH_SIZE // (size * size))
+        for start in range(0, len(comps), per_batch):
+            batch = comps[start:start + per_batch]
+            members = components.nodes[components.node_offsets[batch][:, None] + np.arange(size)]
+            edge_counts = components.edge_offsets[batch + 1] - components.edge_offsets[batch]
+            edges = components.edges[_gather(components.edge_offsets[batch], edge_counts)]
+            rows = np.repeat(np.arange(len(batch)), edge_counts)
+            pos = rng.random((len(batch), size, 2)) * np.sqrt(size)
+            temperature = max(np.sqrt(size) / 10, 0.5)
+            for i in range(iterations):
+                pos = _exact_force(pos, rows, column[graph.source[edges]], column[graph.target[edges]],
+                                   temperature * (1 - i / iterations) + 0.01)
+            local[members.reshape(-1)] = pos.reshape(-1, 2)
+
+    for comp in np.flatnonzero(sizes > EXACT_FORCE_LIMIT).tolist():
+        members = components.nodes[components.node_offsets[comp]:components.node_offsets[comp + 1]]
+        edges = components.edges[components.edge_offsets[comp]:components.edge_offsets[comp + 1]]
+        local[members] = _large_force(len(members), column[graph.source[edges]], column[graph.target[edges]],
+                                      iterations, rng)
+    return local
+
+
+def pack_components(local: np.ndarray, components, gap: float = 2.0) -> np.ndarray:
+    """各分量平移到互不重叠的位置：按分量顺序（从大到小）逐行排布"""
+    nodes = components.nodes
+    starts = components.node_offsets[:-1]
+    low = np.minimum.reduceat(local[nodes], starts, axis=0)
+    high = np.maximum.reduceat(local[nodes], starts, axis=0)
+    width, height = (high - low + gap).T
+    row_width = max(np.sqrt((width * height).sum()) * 1.2, width.max())
+    begin = np.cumsum(width) - width
+    row = np.floor(begin / row_width).astype(np.int64)
+    rows, first, row_index = np.unique(row, return_index=True, return_inverse=True)
+    row_height = np.maximum.reduceat(height, first)
+    row_top = np.cumsum(row_height) - row_height
+    offset = np.stack([begin - row * row_width, row_top[row_index]], axis=1) - low
+    return local + offset[components.component]
+
+
+def compute_layout(graph, name: str) -> np.ndarray:
+    """计算整张图的布局，返回 (节点数, 2) 的坐标"""
+    if graph.n_nodes == 0:
+        return np.zeros((0, 2))
+    degree = np.diff(graph.incident_offsets)
+    if name == 'grid':
+        local = grid_positions(graph.components)
+    elif name == 'circle':
+        local = circle_positions(graph.components)
+    elif name == 'concentric':
+        local = concentric_positions(graph.components, degree)
+    elif name == 'breadthfirst':
+        local = breadthfirst_positions(graph, degree)
+    elif name == 'cose':
+        local = force_positions(graph)
+    else:
+        raise ValueError(f"未知的布局：{name}")
+    return pack_components(local, graph.components) * NODE_SPACING
@@ -0,0 +1,657 @@
+"""资金流向图 Web 服务
+
+所有流向图共用一个常驻的 Dash 应用：第一次生成流向图时在后台线程启动（端口被占用时依次尝试后续端口），
+之后生成的图只需注册到 GRAPH_STORE，在各自的地址 /graph/<图编号> 下打开。
+回调只通过页面中保存的图编号取图，样式等页面状态也保存在浏览器端，多个页面、多个用户互不影响。
+
+安装 waitress 时使用其多线程 WSGI 服务，否则使用 werkzeug 的多线程服务。
+默认只监听本机；多人在其他电脑上查看时，用环境变量 AGGD_FLOW_HOST（如 0.0.0.0）和 AGGD_FLOW_PORT
+指定监听地址和端口，生成流向图时输出其他电脑可访问的地址。
+"""
+import os
+import socket
+import threading
+import webbrowser
+from datetime import datetime
+from typing import Union
+
+import dash
+from dash import html, dcc, dash_table, Patch
+import dash_cytoscape as cyto
+from dash.dependencies import Input, Output, State
+from werkzeug.serving import make_server
+
+try:
+    from waitress import create_server
+    HAS_WAITRESS = True
+except ImportError:
+    HAS_WAITRESS = False
+
+from .money_flow_analytics import SIZE_METRICS
+from .money_flow_export import DEFAULT_SNAPSHOT_STYLE, snapshot_data, snapshot_html
+from .money_flow_graph import (
+    GRAPH_STORE, VIEW_EDGE_LIMIT, FlowGraph, edge_detail_records, flow_stylesheet
+)
+from .money_flow_layout import BROWSER_LAYOUT_LIMIT, LAYOUT_NAMES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8050
+# 指定监听地址、端口的环境变量
+HOST_ENV = 'AGGD_FLOW_HOST'
+PORT_ENV = 'AGGD_FLOW_PORT'
+# 监听全部网卡的地址
+WILDCARD_HOSTS = ('0.0.0.0', '::', '')
+# 端口被占用时最多向后尝试的端口数
+PORT_ATTEMPTS = 20
+# 处理请求的线程数（waitress）
+SERVER_THREADS = 8
+GRAPH_PATH = '/graph/'
+
+EDGE_STYLES = ['bezier', 'straight', 'taxi', 'unbundled-bezier', 'haystack']
+DEFAULT_STYLE = {'edge_style': EDGE_STYLES[0], **DEFAULT_SNAPSHOT_STYLE}
+
+
+def graph_url_path(graph_id: str) -> str:
+    return f"{GRAPH_PATH}{graph_id}"
+
+
+def view_note(graph: FlowGraph, n_visible: int) -> str:
+    if n_visible >= graph.n_nodes:
+        return f"共 {graph.n_nodes} 个节点、{graph.n_edges} 条链路"
+    return (f"共 {graph.n_nodes} 个节点、{graph.n_edges} 条链路，当前显示 {n_visible} 个节点，"
+            f"点击节点展开其相邻节点")
+
+
+def with_analytics(graph: FlowGraph, elements: list, analytics: dict) -> list:
+    """按页面选择的节点分析设置节点大小、颜色（未选择时原样返回）"""
+    if not analytics or not (analytics.get('size') or analytics.get('color')):
+        return elements
+    return graph.analytics().decorate(elements, analytics.get('size'), analytics.get('color'))
+
+
+def style_sheet(style: dict) -> list:
+    return flow_stylesheet(
+        style['edge_style'], style['edge_width'], style['edge_color'],
+        style['font_color'], style['node_color'], style['font_size']
+    )
+
+
+def color_picker(label: str, picker_id: str, preview_id: str, color: str, margin_right: str = '20px'):
+    return html.Div([
+        html.Label(label, style={'marginRight': '5px'}),
+        dcc.Input(
+            id=picker_id,
+            type='text',
+            value=color,
+            style={'width': '80px', 'marginRight': '10px'}
+        ),
+        html.Div(id=preview_id, style=color_preview_style(color))
+    ], style={'display': 'inline-block', 'verticalAlign': 'middle', 'marginRight': margin_right})
+
+
+def color_preview_style(color: str) -> dict:
+    return {'background': color, 'width': '30px', 'height': '20px', 'display': 'inline-block',
+            'border': '1px solid #000', 'verticalAlign': 'middle'}
+
+
+def index_page():
+    """首页：列出服务中保存的流向图"""
+    links = []
+    for graph_id in reversed(GRAPH_STORE.graph_ids()):
+        graph = GRAPH_STORE.get(graph_id)
+        if graph is not None:
+            links.append(html.Li(dcc.Link(
+                f"{graph.title}（{graph.n_nodes} 个节点、{graph.n_edges} 条链路）", href=graph_url_path(graph_id)
+            )))
+    if not links:
+        return html.Div("暂无流向图，请在程序中生成流向图")
+    return html.Div([html.H3("资金流向图"), html.Ul(links)])
+
+
+def graph_page(graph_id: str):
+    """一张流向图的页面，图编号保存在 graph-id-store 中，所有回调据此取图"""
+    graph = GRAPH_STORE.get(graph_id)
+    if graph is None:
+        return html.Div(["图已失效，请在程序中重新生成流向图。", dcc.Link("查看其他流向图", href='/')])
+
+    initial_nodes, initial_edges = graph.initial_view()
+    style = DEFAULT_STYLE
+    return html.Div([
+        html.Div([
+            html.Button("一键重新分布", id="btn-layout", n_clicks=0, style={"marginRight": "10px"}),
+            html.Button("切换链路样式", id="btn-style", n_clicks=0, style={"marginRight": "10px"}),
+            html.Button("字体放大", id="btn-font-up", n_clicks=0, style={"marginRight": "10px"}),
+            html.Button("字体缩小", id="btn-font-down", n_clicks=0, style={"marginRight": "10px"}),
+            dcc.Clipboard(
+                id="cytoscape-copy",
+                title="复制图表信息",
+                style={
+                    "display": "inline-block",
+                    "fontSize": 20,
+                    "verticalAlign": "top",
+                    "cursor": "pointer",
+                    "marginRight": "10px"
+                }
+            ),
+            html.Button("线条加粗", id="btn-line-thicker", n_clicks=0, style={"marginRight": "10px"}),
+            html.Button("线条变细", id="btn-line-thinner", n_clicks=0, style={"marginRight": "10px"}),
+            html.Button("导出快照", id="btn-export", n_clicks=0, style={"marginRight": "10px"}),
+            dcc.Download(id="snapshot-download"),
+        ], style={"marginBottom": "10px", "display": "flex", "flexWrap": "wrap", "alignItems": "center"}),
+
+        html.Div([
+            dcc.Input(
+                id='component-limit-input',
+                type='number',
+                min=1,
+                placeholder='限定链路数量（按长度）',
+                style={'width': '180px', 'marginRight': '10px'}
+            ),
+            html.Button('运行', id='run-filter-btn', n_clicks=0, style={'marginRight': '10px'}),
+            html.Button('重置', id='reset-btn', n_clicks=0, style={'marginRight': '10px'}),
+            dcc.Input(
+                id='component-node-input',
+                type='text',
+                placeholder='节点名称',
+                style={'width': '180px', 'marginRight': '10px'}
+            ),
+            html.Button('显示所在链路', id='show-component-btn', n_clicks=0),
+            html.Span(view_note(graph, len(initial_nodes)), id='view-note', style={'marginLeft': '10px'})
+        ], style={'marginBottom': '10px'}),
+
+        # 资金追踪：从一个节点出发多跳展开
+        html.Div([
+            dcc.Input(
+                id='trace-node-input',
+                type='text',
+                placeholder='追踪起点节点',
+                style={'width': '180px', 'marginRight': '10px'}
+            ),
+            dcc.RadioItems(
+                id='trace-direction',
+                options=[{'label': '追踪去向', 'value': 'forward'},
+                         {'label': '追溯来源', 'value': 'backward'}],
+                value='forward',
+                inline=True,
+                style={'marginRight': '10px'}
+            ),
+            html.Label("跳数: ", style={'marginRight': '5px'}),
+            dcc.Input(
+                id='trace-hops-input',
+                type='number',
+                min=1,
+                max=20,
+                value=3,
+                style={'width': '60px', 'marginRight': '10px'}
+            ),
+            dcc.Checklist(
+                id='trace-options',
+                options=[{'label': '按时间顺序', 'value': 'time'},
+                         {'label': '金额守恒', 'value': 'amount'}],
+                value=[],
+                inline=True,
+                style={'marginRight': '10px'}
+            ),
+            dcc.Input(
+                id='trace-min-amount-input',
+                type='number',
+                min=0,
+                placeholder='最小追踪金额',
+                style={'width': '120px', 'marginRight': '10px'}
+            ),
+            html.Button('资金追踪', id='trace-btn', n_clicks=0)
+        ], style={'marginBottom': '10px', 'display': 'flex', 'flexWrap': 'wrap', 'alignItems': 'center'}),
+
+        # 节点分析：节点大小按中心性等指标，颜色按社区
+        html.Div([
+            html.Label("节点大小: ", style={'marginRight': '5px'}),
+            dcc.Dropdown(
+                id='analytics-size',
+                options=[{'label': label, 'value': key} for key, label in SIZE_METRICS.items()],
+                placeholder='不区分',
+                style={'width': '160px', 'marginRight': '10px'}
+            ),
+            html.Label("节点颜色: ", style={'marginRight': '5px'}),
+            dcc.Dropdown(
+                id='analytics-color',
+                options=[{'label': '按社区', 'value': 'community'}],
+                placeholder='不区分',
+                style={'width': '160px', 'marginRight': '10px'}
+            ),
+            html.Span(id='analytics-note')
+        ], style={'marginBottom': '10px', 'display': 'flex', 'flexWrap': 'wrap', 'alignItems': 'center'}),
+
+        dcc.Store(id='graph-id-store', data=graph_id),
+        dcc.Store(id='layout-name-store', data=LAYOUT_NAMES[0]),
+        dcc.Store(id='visible-nodes-store', data=initial_nodes.tolist()),
+        dcc.Store(id='style-store', data=style),
+        dcc.Store(id='analytics-store', data={}),
+
+        html.Div([
+            color_picker("线条颜色: ", 'edge-color-picker', 'edge-color-preview', style['edge_color']),
+            color_picker("字体颜色: ", 'font-color-picker', 'font-color-preview', style['font_color']),
+            color_picker("节点颜色: ", 'node-color-picker', 'node-color-preview', style['node_color'], '0'),
+        ], style={"marginBottom": "10px"}),
+
+        cyto.Cytoscape(
+            id='cytoscape',
+            elements=graph.elements(initial_nodes, initial_edges),
+            # 节点较多时布局在服务端计算（按图和布局缓存），浏览器只按坐标绘制
+            layout=graph.cytoscape_layout(LAYOUT_NAMES[0], initial_nodes),
+            style={'width': '100%', 'height': '600px'},
+            stylesheet=style_sheet(style)
+        ),
+
+        # 点击链路后显示其流水明细（合并链路模式下按需从服务端取出）
+        html.Div([
+            html.Div(id='edge-detail-title', style={'fontWeight': 'bold', 'margin': '10px 0'}),
+            dash_table.DataTable(
+                id='edge-detail-table',
+                page_size=20,
+                style_table={'overflowX': 'auto'},
+                style_cell={'textAlign': 'left', 'fontSize': '12px'}
+            )
+        ]),
+
+        # 按所选指标排列的枢纽账户
+        html.Div([
+            html.Div(id='ranking-title', style={'fontWeight': 'bold', 'margin': '10px 0'}),
+            dash_table.DataTable(
+                id='ranking-table',
+                page_size=20,
+                style_table={'overflowX': 'auto'},
+                style_cell={'textAlign': 'left', 'fontSize': '12px'}
+            )
+        ])
+    ])
+
+
+def filter_components(trigger_id, n_value, node_value, graph_id, layout_name, analytics=None):
+    """按连通分量筛选或重置：返回 (元素, 显示的节点, 布局, 布局名称, 说明)"""
+    no_change = (dash.no_update,) * 4
+    graph = GRAPH_STORE.get(graph_id)
+    if graph is None:
+        return no_change + ("图已失效，请重新生成流向图",)
+
+    if trigger_id == 'reset-btn':
+        nodes, edges = graph.initial_view()
+    # 连通分量在生成图时已建立索引，这里只取切片
+    elif trigger_id == 'run-filter-btn' and n_value:
+        nodes, edges = graph.components.top(n_value)
+    elif trigger_id == 'show-component-btn' and node_value:
+        node = graph.node_index.get(str(node_value).strip())
+        if node is None:
+            return no_change + (f"找不到节点：{node_value}",)
+        nodes, edges = graph.components.of_node(node)
+    else:
+        return no_change + (dash.no_update,)
+    return (with_analytics(graph, graph.elements(nodes, edges), analytics), nodes.tolist(),
+            graph.cytoscape_layout(layout_name, nodes), layout_name, view_note(graph, len(nodes)))
+
+
+def expand_node(node_data, graph_id, visible, layout_name, analytics=None):
+    """点击节点：只把新增的相邻节点和链路追加到图中，返回 (元素补丁, 显示的节点补丁, 布局, 说明)"""
+    no_change = (dash.no_update,) * 4
+    graph = GRAPH_STORE.get(graph_id)
+    if graph is None or not node_data or node_data['id'] not in graph.node_index:
+        return no_change
+    new_nodes, new_elements = graph.expand(graph.node_index[node_data['id']], visible)
+    if not new_elements:
+        return no_change
+    n_visible = len(visible) + len(new_nodes)
+    layout = dash.no_update
+    # 服务端布局（preset）下新增节点直接带上坐标
+    if n_visible > BROWSER_LAYOUT_LIMIT:
+        new_elements = graph.positioned(layout_name, new_elements)
+        # 本次展开使节点数超过浏览器布局上限时，整个视图改用服务端布局，已显示的节点也按同一布局重新定位
+        if len(visible) <= BROWSER_LAYOUT_LIMIT:
+            layout = graph.cytoscape_layout(layout_name, list(visible) + new_nodes.tolist())
+    new_elements = with_analytics(graph, new_elements, analytics)
+    elements_patch = Patch()
+    elements_patch.extend(new_elements)
+    visible_patch = Patch()
+    visible_patch.extend(new_nodes.tolist())
+    return elements_patch, visible_patch, layout, view_note(graph, n_visible)
+
+
+def trace_from(node_value, direction, hops, options, min_amount, graph_id, layout_name, analytics=None):
+    """从指定节点多跳追踪资金去向或来源，结果替换当前显示的图"""
+    no_change = (dash.no_update,) * 4
+    graph = GRAPH_STORE.get(graph_id)
+    if graph is None:
+        return no_change + ("图已失效，请重新生成流向图",)
+    node = graph.node_index.get(str(node_value or '').strip())
+    if node is None:
+        return no_change + (f"找不到节点：{node_value}",)
+    options = options or []
+    try:
+        tracer = graph.tracer()
+        result = tracer.trace(
+            node, direction, int(hops or 1),
+            time_respecting='time' in options,
+            conserve_amount='amount' in options,
+            min_amount=float(min_amount or 0),
+            max_edges=VIEW_EDGE_LIMIT
+        )
+    except ValueError as e:
+        return no_change + (str(e),)
+    note = (f"{'追踪去向' if direction == 'forward' else '追溯来源'} {int(hops or 1)} 跳："
+            f"{len(result.nodes)} 个节点、{len(result.edges)} 条链路")
+    if result.truncated:
+        note += f"（链路较多，只显示{'追踪金额' if 'amount' in options else '权重'}最大的部分）"
+    return (with_analytics(graph, tracer.trace_elements(result), analytics), result.nodes.tolist(),
+            graph.cytoscape_layout(layout_name, result.nodes), layout_name, note)
+
+
+def apply_analytics(size_metric, color_by, graph_id, visible):
+    """选择节点分析指标：重绘当前显示的节点及其之间的链路，并列出按指标排名的枢纽账户"""
+    graph = GRAPH_STORE.get(graph_id)
+    if graph is None:
+        return dash.no_update, dash.no_update, "图已失效，请重新生成流向图", dash.no_update, dash.no_update, dash.no_update
+    analytics = {'size': size_metric, 'color': color_by}
+    elements = graph.elements_for(visible)
+    note = ''
+    title, records = '', []
+    if size_metric or color_by:
+        elements = with_analytics(graph, elements, analytics)
+    if color_by == 'community':
+        community_sizes = graph.analytics().community_sizes()
+        note = f"共 {len(community_sizes)} 个社区，最大的社区 {community_sizes[0] if len(community_sizes) else 0} 个节点"
+    if size_metric:
+        title = f"按{SIZE_METRICS[size_metric]}排名的账户"
+        records = graph.analytics().ranking(size_metric)
+    columns = [{'name': col, 'id': col} for col in (records[0] if records else [])]
+    return elements, analytics, note, title, records, columns
+
+
+def update_style_values(style: dict, trigger_id: str, edge_color, font_color, node_color) -> Union[dict, None]:
+    """按触发的按钮或颜色输入返回新的样式，无变化时返回 None"""
+    style = dict(style or DEFAULT_STYLE)
+    if trigger_id == 'btn-style':
+        style['edge_style'] = EDGE_STYLES[(EDGE_STYLES.index(style['edge_style']) + 1) % len(EDGE_STYLES)]
+    elif trigger_id == 'btn-font-up':
+        style['font_size'] = min(style['font_size'] + 2, 40)
+    elif trigger_id == 'btn-font-down':
+        style['font_size'] = max(style['font_size'] - 2, 8)
+    elif trigger_id == 'btn-line-thicker':
+        style['edge_width'] = min(style['edge_width'] + 1, 10)
+    elif trigger_id == 'btn-line-thinner':
+        style['edge_width'] = max(style['edge_width'] - 1, 1)
+    elif trigger_id == 'edge-color-picker':
+        style['edge_color'] = edge_color
+    elif trigger_id == 'font-color-picker':
+        style['font_color'] = font_color
+    elif trigger_id == 'node-color-picker':
+        style['node_color'] = node_color
+    else:
+        return None
+    return style
+
+
+def create_app() -> dash.Dash:
+    """创建共用的 Dash 应用：按地址显示首页或某张图，回调对所有图通用"""
+    app = dash.Dash(__name__, title='资金流向图', suppress_callback_exceptions=True)
+    app.layout = html.Div([
+        dcc.Location(id='url'),
+        html.Div(id='page')
+    ])
+
+    @app.callback(
+        Output('page', 'children'),
+        Input('url', 'pathname')
+    )
+    def render_page(pathname):
+        if pathname and pathname.startswith(GRAPH_PATH):
+            return graph_page(pathname[len(GRAPH_PATH):].strip('/'))
+        return index_page()
+
+    @app.callback(
+        Output('cytoscape', 'layout'),
+        Output('layout-name-store', 'data'),
+        Input('btn-layout', 'n_clicks'),
+        State('layout-name-store', 'data'),
+        State('graph-id-store', 'data'),
+        State('visible-nodes-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_layout(n_clicks, layout_name, graph_id, visible):
+        graph = GRAPH_STORE.get(graph_id)
+        layout_name = LAYOUT_NAMES[(LAYOUT_NAMES.index(layout_name) + 1) % len(LAYOUT_NAMES)]
+        if graph is None:
+            return {'name': layout_name}, layout_name
+        return graph.cytoscape_layout(layout_name, visible), layout_name
+
+    @app.callback(
+        Output('cytoscape', 'stylesheet'),
+        Output('style-store', 'data'),
+        Input('btn-style', 'n_clicks'),
+        Input('btn-font-up', 'n_clicks'),
+        Input('btn-font-down', 'n_clicks'),
+        Input('btn-line-thicker', 'n_clicks'),
+        Input('btn-line-thinner', 'n_clicks'),
+        Input('edge-color-picker', 'value'),
+        Input('font-color-picker', 'value'),
+        Input('node-color-picker', 'value'),
+        State('style-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_style(n_style, n_up, n_down, n_thicker, n_thinner,
+                     edge_color_value, font_color_value, node_color_value, style):
+        ctx = dash.callback_context
+        if not ctx.triggered:
+            return dash.no_update, dash.no_update
+        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        style = update_style_values(style, trigger_id, edge_color_value, font_color_value, node_color_value)
+        if style is None:
+            return dash.no_update, dash.no_update
+        return style_sheet(style), style
+
+    @app.callback(
+        Output('cytoscape', 'elements'),
+        Output('visible-nodes-store', 'data'),
+        Output('cytoscape', 'layout', allow_duplicate=True),
+        Output('layout-name-store', 'data', allow_duplicate=True),
+        Output('view-note', 'children'),
+        Input('run-filter-btn', 'n_clicks'),
+        Input('reset-btn', 'n_clicks'),
+        Input('show-component-btn', 'n_clicks'),
+        State('component-limit-input', 'value'),
+        State('component-node-input', 'value'),
+        State('graph-id-store', 'data'),
+        State('layout-name-store', 'data'),
+        State('analytics-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_filter(run_clicks, reset_clicks, component_clicks, n_value, node_value, graph_id, layout_name,
+                      analytics):
+        ctx = dash.callback_context
+        if not ctx.triggered:
+            return (dash.no_update,) * 5
+        trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+        return filter_components(trigger_id, n_value, node_value, graph_id, layout_name, analytics)
+
+    @app.callback(
+        Output('cytoscape', 'elements', allow_duplicate=True),
+        Output('visible-nodes-store', 'data', allow_duplicate=True),
+        Output('cytoscape', 'layout', allow_duplicate=True),
+        Output('view-note', 'children', allow_duplicate=True),
+        Input('cytoscape', 'tapNodeData'),
+        State('graph-id-store', 'data'),
+        State('visible-nodes-store', 'data'),
+        State('layout-name-store', 'data'),
+        State('analytics-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_expand(node_data, graph_id, visible, layout_name, analytics):
+        return expand_node(node_data, graph_id, visible, layout_name, analytics)
+
+    @app.callback(
+        Output('cytoscape', 'elements', allow_duplicate=True),
+        Output('visible-nodes-store', 'data', allow_duplicate=True),
+        Output('cytoscape', 'layout', allow_duplicate=True),
+        Output('layout-name-store', 'data', allow_duplicate=True),
+        Output('view-note', 'children', allow_duplicate=True),
+        Input('trace-btn', 'n_clicks'),
+        State('trace-node-input', 'value'),
+        State('trace-direction', 'value'),
+        State('trace-hops-input', 'value'),
+        State('trace-options', 'value'),
+        State('trace-min-amount-input', 'value'),
+        State('graph-id-store', 'data'),
+        State('layout-name-store', 'data'),
+        State('analytics-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_trace(n_clicks, node_value, direction, hops, options, min_amount, graph_id, layout_name, analytics):
+        return trace_from(node_value, direction, hops, options, min_amount, graph_id, layout_name, analytics)
+
+    @app.callback(
+        Output('cytoscape', 'elements', allow_duplicate=True),
+        Output('analytics-store', 'data'),
+        Output('analytics-note', 'children'),
+        Output('ranking-title', 'children'),
+        Output('ranking-table', 'data'),
+        Output('ranking-table', 'columns'),
+        Input('analytics-size', 'value'),
+        Input('analytics-color', 'value'),
+        State('graph-id-store', 'data'),
+        State('visible-nodes-store', 'data'),
+        prevent_initial_call=True
+    )
+    def update_analytics(size_metric, color_by, graph_id, visible):
+        return apply_analytics(size_metric, color_by, graph_id, visible)
+
+    @app.callback(
+        Output('snapshot-download', 'data'),
+        Input('btn-export', 'n_clicks'),
+        State('graph-id-store', 'data'),
+        State('visible-nodes-store', 'data'),
+        State('layout-name-store', 'data'),
+        State('style-store', 'data'),
+        prevent_initial_call=True
+    )
+    def export_view(n_clicks, graph_id, visible, layout_name, style):
+        """当前显示的节点及其之间的链路连同样式、坐标导出为独立的 HTML 文件"""
+        graph = GRAPH_STORE.get(graph_id)
+        if graph is None or not visible:
+            return dash.no_update
+        style = {key: (style or DEFAULT_STYLE)[key] for key in DEFAULT_SNAPSHOT_STYLE}
+        content = snapshot_html(snapshot_data(graph, visible, layout_name, style, graph.title))
+        filename = f"资金流向图_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
+        return dcc.send_string(content, filename)
+
+    @app.callback(
+        Output('edge-detail-title', 'children'),
+        Output('edge-detail-table', 'data'),
+        Output('edge-detail-table', 'columns'),
+        Input('cytoscape', 'tapEdgeData'),
+        State('graph-id-store', 'data'),
+        prevent_initial_call=True
+    )
+    def show_edge_detail(edge_data, graph_id):
+        graph = GRAPH_STORE.get(graph_id)
+        if graph is None:
+            return "图已失效，请重新生成流向图", [], []
+        title, records, columns = edge_detail_records(graph.edge_details, edge_data)
+        return title, records, [{'name': col, 'id': col} for col in columns]
+
+    for picker_id, preview_id in [('edge-color-picker', 'edge-color-preview'),
+                                  ('font-color-picker', 'font-color-preview'),
+                                  ('node-color-picker', 'node-color-preview')]:
+        app.callback(
+            Output(preview_id, 'style'),
+            Input(picker_id, 'value')
+        )(color_preview_style)
+
+    return app
+
+
+class FlowServer:
+    """在后台线程中运行的共用 Web 服务"""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, threads: int = SERVER_THREADS):
+        self.app = create_app()
+        self.host = host
+        self._server = None
+        # 端口被占用时依次尝试后续端口
+        error = None
+        for candidate in range(port, port + PORT_ATTEMPTS):
+            try:
+                if HAS_WAITRESS:
+                    self._server = create_server(self.app.server, host=host, port=candidate, threads=threads)
+                else:
+                    self._server = make_server(host, candidate, self.app.server, threaded=True)
+                self.port = candidate
+                break
+            except OSError as e:
+                error = e
+        if self._server is None:
+            raise OSError(f"端口 {port}~{port + PORT_ATTEMPTS - 1} 均不可用：{error}")
+        self._thread = None
+
+    def start(self):
+        target = self._server.run if HAS_WAITRESS else self._server.serve_forever
+        self._thread = threading.Thread(target=target, daemon=True, name='money-flow-server')
+        self._thread.start()
+
+    def shutdown(self):
+        if HAS_WAITRESS:
+            self._server.close()
+        else:
+            self._server.shutdown()
+
+    def url_for(self, graph_id: str = None) -> str:
+        host = lan_address() if self.host in WILDCARD_HOSTS else self.host
+        if ':' in host:
+            host = f"[{host}]"
+        base = f"http://{host}:{self.port}"
+        return base + graph_url_path(graph_id) if graph_id else base + '/'
+
+
+def lan_address() -> str:
+    """本机在局域网中的地址（监听全部网卡时用于生成其他电脑可访问的地址），取不到时为本机回环地址"""
+    try:
+        # UDP 的 connect 只选择出口网卡，不发送数据
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(('10.255.255.255', 1))
+            return sock.getsockname()[0]
+    except OSError:
+        try:
+            return socket.gethostbyname(socket.gethostname())
+        except OSError:
+            return DEFAULT_HOST
+
+
+def server_address() -> tuple:
+    """监听地址和端口：环境变量 AGGD_FLOW_HOST、AGGD_FLOW_PORT，未设置时只监听本机"""
+    host = os.environ.get(HOST_ENV, '').strip() or DEFAULT_HOST
+    port = os.environ.get(PORT_ENV, '').strip()
+    try:
+        port = int(port) if port else DEFAULT_PORT
+    except ValueError:
+        raise ValueError(f"{PORT_ENV} 应为端口号：{port}")
+    return host, port
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def get_flow_server() -> FlowServer:
+    """共用的 Web 服务，第一次调用时启动"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            host, port = server_address()
+            _server = FlowServer(host, port)
+            _server.start()
+        return _server
+
+
+def open_graph(graph: FlowGraph) -> str:
+    """把流向图注册到共用服务并在浏览器中打开，返回其地址（同时输出，便于发给其他人查看）"""
+    graph_id = GRAPH_STORE.register(graph)
+    url = get_flow_server().url_for(graph_id)
+    print(f"资金流向图：{url}")
+    webbrowser.open(url)
+    return url
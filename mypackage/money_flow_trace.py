@@ -0,0 +1,262 @@
+"""资金追踪：从一个账户出发沿流向（或逆流向）逐跳展开
+
+在流向图的有向邻接（CSR）上按整列运算，每一跳只处理当前前沿节点的出边（入边）：
+    - 多跳展开：k 跳以内可达的节点和经过的链路
+    - 时间顺序：每一跳的交易不早于上一跳到达该账户的时间（需要合并链路模式并选择时间字段）
+    - 金额守恒：流出某账户的追踪金额不超过流入的追踪金额，按各出边金额比例分配，
+      低于下限的分支不再展开（需要选择金额字段）
+"""
+import numpy as np
+from .money_flow_layout import _gather
+
+# 追踪结果最多包含的链路数，超出时停止展开
+MAX_TRACE_EDGES = 20000
+TRACE_DIRECTIONS = ['forward', 'backward']
+# 时间以秒为单位，相对最早交易时间存放，与边编号拼成一个 int64 键
+_TIME_BITS = 32
+
+
+def _csr(keys: np.ndarray, n: int):
+    """按节点编号排序的边编号及各节点的起止位置"""
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=offsets[1:])
+    return order, offsets
+
+
+class TraceResult:
+    """追踪结果：nodes/edges 为节点、链路编号；hops 为各节点的跳数，
+    arrival 为按时间顺序追踪时到达（逆向为离开）各节点的时间，flow 为各链路的追踪金额"""
+
+    def __init__(self, start, direction, nodes, edges, hops, arrival=None, flow=None, truncated=False):
+        self.start = start
+        self.direction = direction
+        self.nodes = nodes
+        self.edges = edges
+        self.hops = hops
+        self.arrival = arrival
+        self.flow = flow
+        self.truncated = truncated
+
+
+class FlowTracer:
+    """流向图的追踪索引，每张图建立一次
+
+    出边、入边各一份 CSR；有逐笔时间时，各边的交易按（边编号, 时间）排好并记录金额前缀和，
+    “某条边在时间 t 之后的第一笔交易”和“t 之后的金额合计”都是一次二分查找。
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        n_nodes, n_edges = graph.n_nodes, graph.n_edges
+        self.out_edges, self.out_offsets = _csr(graph.source, n_nodes)
+        self.in_edges, self.in_offsets = _csr(graph.target, n_nodes)
+
+        amounts = np.array([e['data'].get('amount', np.nan) for e in graph.edge_elements], dtype=np.float64)
+        self.edge_amount = np.nan_to_num(amounts) if n_edges and not np.isnan(amounts).all() else None
+
+        self.has_times = False
+        details = graph.edge_details
+        if details is not None and details.time_column:
+            self._index_transactions(details)
+
+    @property
+    def has_amounts(self) -> bool:
+        return self.edge_amount is not None
+
+    def _index_transactions(self, details):
+        """按（边编号, 时间）排序逐笔交易，记录各边在排序数组中的起止位置和金额前缀和"""
+        graph = self.graph
+        n_edges = len(details)
+        row_edge = np.repeat(np.arange(n_edges), np.diff(details.offsets))
+        rows = details.order
+        times = details.df[details.time_column].to_numpy()[rows]
+        valid = ~np.isnat(times)
+        rows, row_edge, times = rows[valid], row_edge[valid], times[valid]
+        if not len(rows):
+            return
+        seconds = times.astype('datetime64[s]').astype(np.int64)
+        self.time_origin = int(seconds.min())
+        relative = seconds - self.time_origin
+        # FlowGraph 的边顺序与明细索引的边编号对应
+        edge_of = np.array([e['data']['edge'] for e in graph.edge_elements], dtype=np.int64)
+        graph_edge = np.empty(n_edges, dtype=np.int64)
+        graph_edge[edge_of] = np.arange(len(edge_of))
+        keys = (graph_edge[row_edge] << _TIME_BITS) | relative
+        order = np.argsort(keys, kind='stable')
+        self.tx_keys = keys[order]
+        row_amounts = details.amounts[rows][order] if details.amounts is not None else np.ones(len(rows))
+        self.tx_cumsum = np.r_[0.0, np.cumsum(np.nan_to_num(row_amounts))]
+        edges = np.arange(graph.n_edges, dtype=np.int64)
+        self.tx_start = np.searchsorted(self.tx_keys, edges << _TIME_BITS)
+        self.tx_end = np.searchsorted(self.tx_keys, (edges + 1) << _TIME_BITS)
+        self.has_times = True
+
+    def to_relative(self, timestamp) -> int:
+        return int(np.datetime64(timestamp, 's').astype(np.int64)) - self.time_origin
+
+    def from_relative(self, seconds: np.ndarray) -> np.ndarray:
+        return (seconds + self.time_origin).astype('datetime64[s]')
+
+    def _after(self, edges, bound):
+        """各边不早于 bound 的第一笔交易时间及其后（含）的金额合计；没有时时间为 -1"""
+        idx = np.searchsorted(self.tx_keys, (edges << _TIME_BITS) | np.maximum(bound, 0))
+        found = idx < self.tx_end[edges]
+        first = np.where(found, self.tx_keys[np.minimum(idx, len(self.tx_keys) - 1)] & ((1 << _TIME_BITS) - 1), -1)
+        amount = self.tx_cumsum[self.tx_end[edges]] - self.tx_cumsum[idx]
+        return first, amount
+
+    def _before(self, edges, bound):
+        """各边不晚于 bound 的最后一笔交易时间及其前（含）的金额合计；没有时时间为 -1"""
+        idx = np.searchsorted(self.tx_keys, (edges << _TIME_BITS) | bound, side='right') - 1
+        found = idx >= self.tx_start[edges]
+        last = np.where(found, self.tx_keys[np.maximum(idx, 0)] & ((1 << _TIME_BITS) - 1), -1)
+        amount = np.where(found, self.tx_cumsum[idx + 1] - self.tx_cumsum[self.tx_start[edges]], 0.0)
+        return last, amount
+
+    def trace(self, start: int, direction: str = 'forward', hops: int = 3, time_respecting: bool = False,
+              conserve_amount: bool = False, start_amount: float = None, min_amount: float = 0.0,
+              start_time=None, max_edges: int = MAX_TRACE_EDGES) -> TraceResult:
+        """从节点 start 出发追踪 hops 跳
+
+        Args:
+            direction: forward 沿资金流向（出边），backward 逆流向追溯来源（入边）
+            time_respecting: 每一跳的交易不早于（逆向为不晚于）上一跳的时间
+            conserve_amount: 按金额守恒分配追踪金额，需要金额字段
+            start_amount: 起点的追踪金额，默认为起点全部流出（逆向为流入）金额
+            min_amount: 追踪金额低于该值的链路不再展开
+            start_time: 按时间顺序追踪时第一跳交易的起始时间（逆向为截止时间），默认不限
+        """
+        if direction not in TRACE_DIRECTIONS:
+            raise ValueError(f"未知的追踪方向：{direction}")
+        if time_respecting and not self.has_times:
+            raise ValueError("按时间顺序追踪需要合并链路模式并选择时间字段")
+        if conserve_amount and not self.has_amounts:
+            raise ValueError("金额守恒追踪需要选择金额字段")
+
+        graph = self.graph
+        forward = direction == 'forward'
+        offsets, incident = (self.out_offsets, self.out_edges) if forward else (self.in_offsets, self.in_edges)
+        far_end = graph.target if forward else graph.source
+        n_nodes = graph.n_nodes
+
+        hop = np.full(n_nodes, -1, dtype=np.int64)
+        hop[start] = 0
+        used = np.zeros(graph.n_edges, dtype=bool)
+        # 时间顺序：正向记录最早到达时间，逆向记录最晚离开时间（相对秒数）
+        arrival = None
+        if time_respecting:
+            arrival = np.full(n_nodes, np.iinfo(np.int64).max if forward else -1, dtype=np.int64)
+            arrival[start] = 0 if forward else (1 << _TIME_BITS) - 1
+            if start_time is not None:
+                arrival[start] = min(max(self.to_relative(start_time), 0), (1 << _TIME_BITS) - 1)
+        flow = inflow = None
+        if conserve_amount:
+            flow = np.zeros(graph.n_edges)
+            inflow = np.zeros(n_nodes)
+            first_edges = incident[offsets[start]:offsets[start + 1]]
+            inflow[start] = start_amount if start_amount is not None else self.edge_amount[first_edges].sum()
+
+        frontier = np.array([start], dtype=np.int64)
+        truncated = False
+        for step in range(1, int(hops) + 1):
+            if not len(frontier):
+                break
+            starts = offsets[frontier]
+            counts = offsets[frontier + 1] - starts
+            edges = incident[_gather(starts, counts)]
+            owner = np.repeat(frontier, counts)
+            ends = far_end[edges]
+            keep = np.ones(len(edges), dtype=bool)
+
+            if time_respecting:
+                if forward:
+                    when, available = self._after(edges, arrival[owner])
+                else:
+                    when, available = self._before(edges, arrival[owner])
+                keep &= when >= 0
+            else:
+                available = self.edge_amount[edges] if conserve_amount else None
+
+            sent = None
+            if conserve_amount:
+                # 按各边可追踪金额的比例分配本轮新流入的金额，单边累计不超过其金额
+                available = np.maximum(np.where(keep, available, 0.0) - flow[edges], 0.0)
+                total = np.bincount(owner, weights=available, minlength=n_nodes)[owner]
+                share = np.divide(available, total, out=np.zeros_like(available), where=total > 0)
+                sent = np.minimum(available, inflow[owner] * share)
+                keep &= (sent > 0) & (sent >= min_amount)
+                inflow[frontier] = 0.0
+
+            selected = np.flatnonzero(keep)
+            room = max_edges - int(used.sum())
+            if len(selected) > room:
+                # 超出上限时保留追踪金额（或边权重）最大的链路
+                score = sent[selected] if conserve_amount else graph.edge_weight[edges[selected]]
+                selected = selected[np.argsort(-score, kind='stable')[:max(room, 0)]]
+                truncated = True
+            edges, ends = edges[selected], ends[selected]
+            used[edges] = True
+
+            updated = np.zeros(n_nodes, dtype=bool)
+            new = hop[ends] < 0
+            hop[ends[new]] = step
+            updated[ends[new]] = True
+            if time_respecting:
+                when = when[selected]
+                if forward:
+                    better = np.full(n_nodes, np.iinfo(np.int64).max, dtype=np.int64)
+                    np.minimum.at(better, ends, when)
+                    improved = better < arrival
+                else:
+                    better = np.full(n_nodes, -1, dtype=np.int64)
+                    np.maximum.at(better, ends, when)
+                    improved = better > arrival
+                arrival[improved] = better[improved]
+                updated |= improved
+            if conserve_amount:
+                sent = sent[selected]
+                flow[edges] += sent
+                np.add.at(inflow, ends, sent)
+                updated |= inflow > 0
+            frontier = np.flatnonzero(updated)
+            if truncated:
+                break
+
+        nodes = np.flatnonzero(hop >= 0)
+        edges = np.flatnonzero(used)
+        return TraceResult(
+            start, direction, nodes, edges, hop,
+            arrival=arrival, flow=flow, truncated=truncated
+        )
+
+    def trace_elements(self, result: TraceResult) -> list:
+        """追踪结果的 Cytoscape 元素：节点 data 中加入跳数（及到达时间），链路加入追踪金额"""
+        graph = self.graph
+        elements = []
+        arrival_text = None
+        if result.arrival is not None:
+            limit = np.iinfo(np.int64).max
+            reached = (result.arrival[result.nodes] >= 0) & (result.arrival[result.nodes] < limit)
+            arrival_text = np.where(
+                reached,
+                np.datetime_as_string(self.from_relative(np.where(reached, result.arrival[result.nodes], 0))),
+                ''
+            )
+        for i, node in enumerate(result.nodes.tolist()):
+            data = dict(graph.node_elements[node]['data'])
+            data['hop'] = int(result.hops[node])
+            label = data.get('label', data['id'])
+            if node == result.start:
+                data['trace_start'] = 1
+            elif arrival_text is not None and arrival_text[i]:
+                label = f"{label}\n{'到达' if result.direction == 'forward' else '离开'} {arrival_text[i].replace('T', ' ')}"
+            data['label'] = label
+            elements.append({'data': data})
+        for edge in result.edges.tolist():
+            data = dict(graph.edge_elements[edge]['data'])
+            if result.flow is not None:
+                data['flow'] = round(float(result.flow[edge]), 2)
+                data['label'] = f"追踪 {data['flow']:,.2f} / {data['label']}"
+            elements.append({'data': data})
+        return elements
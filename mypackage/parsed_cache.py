@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from typing import Dict
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  Feather 读写依赖 pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# 默认缓存目录及容量上限（超出后按最近使用时间淘汰）
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.aggd_workflow', 'parsed_cache')
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+
+# 缓存格式版本，解析逻辑变化时递增使旧缓存失效
+CACHE_VERSION = 2
+
+# 多个进程共用缓存目录时，写索引前等待锁文件的时间；超过 LOCK_STALE_SECONDS 的锁文件视为异常退出遗留
+LOCK_TIMEOUT = 10
+LOCK_STALE_SECONDS = 60
+
+
+class ParsedFileCache:
+    """已解析数据文件的列式缓存（Feather 格式）
+
+    缓存键由文件内容哈希和字段映射共同决定，文件内容不变时不论路径如何都能命中；
+    文件哈希按（路径, 大小, 修改时间）记录，文件未改动时无需重新计算。
+    缓存总大小超过 max_bytes 时按最近使用时间（LRU）淘汰。
+
+    多个进程（如按文件夹分别运行的命令行）可以共用缓存目录：索引在锁文件保护下先与磁盘上的索引合并
+    再整体替换，只写入本进程的改动；命中缓存时只在内存中记录使用时间，由 flush() 一次写入。
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.lock_path = self.index_path + '.lock'
+        self.index = self._load_index()
+        # 尚未写入索引的改动
+        self._changed_files = {}  # 文件路径 -> 哈希记录
+        self._added = {}  # 新写入的缓存条目
+        self._touched = {}  # 命中的缓存条目 -> 最近使用时间
+        self._removed = set()  # 损坏而丢弃的缓存条目
+
+    @staticmethod
+    def available() -> bool:
+        """是否安装了 pyarrow（未安装时缓存不可用）"""
+        return HAS_PYARROW
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == CACHE_VERSION:
+                return index
+        except (OSError, ValueError):
+            pass
+        return {'version': CACHE_VERSION, 'files': {}, 'entries': {}}
+
+    @contextmanager
+    def _index_lock(self):
+        """锁文件（O_EXCL 创建）保护索引的读取-合并-替换；等待超时后不加锁继续"""
+        deadline = time.time() + LOCK_TIMEOUT
+        fd = None
+        while fd is None:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > LOCK_STALE_SECONDS:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.time() > deadline:
+                    break
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)
+                try:
+                    os.remove(self.lock_path)
+                except OSError:
+                    pass
+
+    def _merge_index(self):
+        """把本进程的改动合并到磁盘上的最新索引（其他进程可能已写入新的条目）"""
+        index = self._load_index()
+        index['files'].update(self._changed_files)
+        entries = index['entries']
+        entries.update(self._added)
+        for key, last_used in self._touched.items():
+            # 已被其他进程淘汰的条目不再恢复
+            if key in entries:
+                entries[key]['last_used'] = max(entries[key]['last_used'], last_used)
+        for key in self._removed:
+            entries.pop(key, None)
+        self.index = index
+
+    def _write_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='index.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._changed_files.clear()
+        self._added.clear()
+        self._touched.clear()
+        self._removed.clear()
+
+    def _save_index(self):
+        with self._index_lock():
+            self._merge_index()
+            self.evict()
+            self._write_index()
+
+    def flush(self):
+        """写入尚未保存的改动（命中缓存的使用时间、新计算的文件哈希）"""
+        if self._changed_files or self._added or self._touched or self._removed:
+            self._save_index()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    def file_digest(self, file_path: str) -> str:
+        """文件内容哈希；大小和修改时间未变化时直接复用上次的结果"""
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        record = self.index['files'].get(file_path)
+        if record and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+            return record['digest']
+
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        self.index['files'][file_path] = self._changed_files[file_path] = {
+            'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest
+        }
+        return digest
+
+    def make_key(self, file_path: str, rename_dict: Dict[str, str]) -> str:
+        """缓存键：文件内容哈希 + 字段映射 + 缓存版本"""
+        mapping = json.dumps(sorted(rename_dict.items()), ensure_ascii=False)
+        raw = f"{CACHE_VERSION}|{self.file_digest(file_path)}|{mapping}"
+        return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, file_path: str, rename_dict: Dict[str, str]):
+        """读取缓存，未命中返回 None；使用时间只记录在内存中，由 flush() 写入索引"""
+        if not HAS_PYARROW:
+            return None
+        try:
+            key = self.make_key(file_path, rename_dict)
+        except OSError:
+            return None
+        entry = self.index['entries'].get(key)
+        if entry is None:
+            return None
+        try:
+            df = pd.read_feather(self._entry_path(key))
+        except Exception:
+            # 缓存文件损坏或被删除，丢弃该条目
+            self.index['entries'].pop(key, None)
+            self._touched.pop(key, None)
+            self._removed.add(key)
+            return None
+        entry['last_used'] = self._touched[key] = time.time()
+        return df
+
+    def put(self, file_path: str, rename_dict: Dict[str, str], df: pd.DataFrame) -> bool:
+        """写入缓存，无法以 Feather 保存（如列名非文本、同列混合类型）时返回 False"""
+        if not HAS_PYARROW or not all(isinstance(col, str) for col in df.columns):
+            return False
+        try:
+            key = self.make_key(file_path, rename_dict)
+        except OSError:
+            return False
+        entry_path = self._entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f'{key}.', suffix='.tmp')
+        os.close(fd)
+        try:
+            df.reset_index(drop=True).to_feather(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+        self.index['entries'][key] = self._added[key] = {
+            'size': os.path.getsize(entry_path),
+            'last_used': time.time(),
+        }
+        self._removed.discard(key)
+        self._save_index()
+        return True
+
+    def total_size(self) -> int:
+        return sum(entry['size'] for entry in self.index['entries'].values())
+
+    def evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.index['entries'].items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(key))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self.index['entries'][key]
+
+    def clear(self):
+        """清空全部缓存（包括其他进程写入的条目）"""
+        with self._index_lock():
+            keys = set(self.index['entries']) | set(self._load_index()['entries'])
+            for key in keys:
+                try:
+                    os.remove(self._entry_path(key))
+                except OSError:
+                    pass
+            self.index = {'version': CACHE_VERSION, 'files': {}, 'entries': {}}
+            self._write_index()
@@ -0,0 +1,259 @@
+import os
+from typing import Callable, Dict, List
+import numpy as np
+import pandas as pd
+
+try:
+    import xlsxwriter
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
+
+try:
+    import pyarrow  # noqa: F401  Parquet 读写依赖 pyarrow
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+# Excel 单个工作表最多 1,048,576 行（含表头）
+EXCEL_MAX_ROWS = 1_048_576
+# Excel 单元格最多 32,767 个字符，超出部分会被截断
+EXCEL_MAX_CELL_CHARS = 32_767
+# 每次转换为 Python 值后写出的行数，内存占用只取决于块大小
+WRITE_BLOCK_ROWS = 50_000
+DATETIME_FORMAT = 'yyyy-mm-dd hh:mm:ss'
+
+
+def _sheet_name(index: int) -> str:
+    return f"Sheet{index + 1}"
+
+
+def _is_number_column(series: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _column_cells(series: pd.Series) -> list:
+    """把一列转换为逐行写入用的 Python 值，缺失值（及 inf）为 None"""
+    if _is_number_column(series):
+        numbers = series.to_numpy(dtype='float64', na_value=np.nan)
+        values = numbers.astype(object)
+        values[~np.isfinite(numbers)] = None
+        return values.tolist()
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = np.asarray(series.dt.to_pydatetime(), dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+    return [None if pd.isna(value) else value for value in values]
+
+
+def _overlong_cells(series: pd.Series) -> int:
+    """文本列中超过 Excel 单元格字符上限的单元格数"""
+    if _is_number_column(series) or pd.api.types.is_datetime64_any_dtype(series):
+        return 0
+    lengths = series.map(lambda value: len(value) if isinstance(value, str) else 0) \
+        if pd.api.types.is_object_dtype(series) else series.str.len()
+    return int((lengths > EXCEL_MAX_CELL_CHARS).sum())
+
+
+def write_excel(df: pd.DataFrame, output_file: str, max_rows: int = EXCEL_MAX_ROWS,
+                on_warning: Callable = None):
+    """写入 xlsx，超过单表行数上限时自动拆分为 Sheet1、Sheet2……
+
+    安装了 xlsxwriter 时使用其 constant_memory 模式逐行写出，每次只把 WRITE_BLOCK_ROWS 行转换为 Python 值，
+    内存占用与行数无关，速度也远快于 pandas 默认的 openpyxl 引擎；未安装时退回 openpyxl。
+    文本超过 Excel 单元格字符上限（如很长的关联交易详情）时会被截断，通过 on_warning 提示改用 CSV/Parquet。
+    """
+    rows_per_sheet = max_rows - 1  # 每个工作表第一行为表头
+    n_sheets = max(1, -(-len(df) // rows_per_sheet))
+
+    overlong = {}
+    for col in df.columns:
+        count = _overlong_cells(df[col])
+        if count:
+            overlong[str(col)] = count
+    if overlong and on_warning:
+        detail = '、'.join(f"{col} {count} 个" for col, count in overlong.items())
+        on_warning(
+            f"以下单元格超过 Excel 单元格 {EXCEL_MAX_CELL_CHARS} 个字符的上限，保存为 xlsx 时会被截断：{detail}。"
+            f"需要完整内容请使用 CSV 或 Parquet 格式"
+        )
+
+    if not HAS_XLSXWRITER:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+            for sheet in range(n_sheets):
+                part = df.iloc[sheet * rows_per_sheet:(sheet + 1) * rows_per_sheet]
+                part.to_excel(writer, sheet_name=_sheet_name(sheet), index=False)
+        return
+
+    workbook = xlsxwriter.Workbook(output_file, {
+        'constant_memory': True,
+        # 账号、备注等文本原样写入，不转换为数字、公式或超链接
+        'strings_to_numbers': False,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    try:
+        header_format = workbook.add_format({'bold': True})
+        datetime_format = workbook.add_format({'num_format': DATETIME_FORMAT})
+
+        # 按列类型选定写入方法，避免对每个单元格做类型判断
+        writers = []
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                writers.append(('datetime', datetime_format))
+            elif _is_number_column(df[col]):
+                writers.append(('number', None))
+            else:
+                writers.append(('other', None))
+
+        for sheet in range(n_sheets):
+            worksheet = workbook.add_worksheet(_sheet_name(sheet))
+            for col_idx, col in enumerate(df.columns):
+                worksheet.write_string(0, col_idx, str(col), header_format)
+
+            sheet_start = sheet * rows_per_sheet
+            sheet_stop = min(sheet_start + rows_per_sheet, len(df))
+            for start in range(sheet_start, sheet_stop, WRITE_BLOCK_ROWS):
+                block = df.iloc[start:min(start + WRITE_BLOCK_ROWS, sheet_stop)]
+                columns = [_column_cells(block[col]) for col in block.columns]
+                for offset in range(len(block)):
+                    excel_row = start - sheet_start + offset + 1
+                    for col_idx, (kind, cell_format) in enumerate(writers):
+                        value = columns[col_idx][offset]
+                        if value is None:
+                            continue
+                        if kind == 'number':
+                            worksheet.write_number(excel_row, col_idx, value)
+                        elif kind == 'datetime':
+                            worksheet.write_datetime(excel_row, col_idx, value, cell_format)
+                        elif isinstance(value, str):
+                            worksheet.write_string(excel_row, col_idx, value)
+                        else:
+                            worksheet.write(excel_row, col_idx, value)
+    finally:
+        workbook.close()
+
+
+def write_csv(df: pd.DataFrame, output_file: str):
+    """写入 CSV（带 BOM 的 UTF-8，Excel 可直接打开）"""
+    df.to_csv(output_file, index=False, encoding='utf-8-sig')
+
+
+def write_parquet(df: pd.DataFrame, output_file: str):
+    """写入 Parquet（需要 pyarrow）"""
+    df.to_parquet(output_file, index=False)
+
+
+class ParquetChunkWriter:
+    """逐块追加写入同一个 Parquet 文件（需要 pyarrow）
+
+    以第一块的列类型为准，之后每块都按该类型转换，各块的列需一致。
+    用于流式处理时边处理边写出交易明细，内存占用只取决于块大小。
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.schema = None
+        self.rows = 0
+        self._writer = None
+
+    def write(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self._writer is None:
+            self.schema = table.schema
+            self._writer = pq.ParquetWriter(self.output_file, self.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self, empty: pd.DataFrame = None):
+        """结束写入；没有写入任何数据时按 empty 的列写出空表"""
+        if self._writer is None:
+            if empty is not None:
+                write_parquet(empty, self.output_file)
+            return
+        self._writer.close()
+        self._writer = None
+
+
+def filter_parquet_rows(path: str, column: str, values) -> int:
+    """只保留 column 取值在 values 中的行，按行组逐块读写后替换原文件，返回保留的行数（需要 pyarrow）"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    source = pq.ParquetFile(path)
+    value_set = pa.array(np.asarray(values))
+    tmp_file = path + '.tmp'
+    rows = 0
+    try:
+        with source, pq.ParquetWriter(tmp_file, source.schema_arrow) as writer:
+            for batch in source.iter_batches():
+                batch = batch.filter(pc.is_in(batch.column(column), value_set=value_set))
+                writer.write_batch(batch)
+                rows += batch.num_rows
+        os.replace(tmp_file, path)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return rows
+
+
+# 输出格式名称 -> (扩展名, 写入函数, 是否可用)
+OUTPUT_FORMATS: Dict[str, tuple] = {
+    'Excel (.xlsx)': ('.xlsx', write_excel, True),
+    'CSV (.csv)': ('.csv', write_csv, True),
+    'Parquet (.parquet)': ('.parquet', write_parquet, HAS_PYARROW),
+}
+DEFAULT_OUTPUT_FORMAT = 'Excel (.xlsx)'
+
+
+def available_formats() -> List[str]:
+    """当前环境可用的输出格式名称"""
+    return [name for name, (_, _, available) in OUTPUT_FORMATS.items() if available]
+
+
+def format_extension(format_name: str) -> str:
+    return OUTPUT_FORMATS[format_name][0]
+
+
+def get_writer(format_name: str) -> Callable[[pd.DataFrame, str], None]:
+    extension, writer, available = OUTPUT_FORMATS[format_name]
+    if not available:
+        raise ValueError(f"输出格式 {format_name} 不可用，请先安装所需依赖")
+    return writer
+
+
+def format_for_extension(extension: str) -> str:
+    """按扩展名（如 .csv）查找输出格式名称，无法识别时返回默认格式"""
+    extension = extension.lower()
+    if not extension.startswith('.'):
+        extension = '.' + extension
+    return next(
+        (name for name, (ext, _, _) in OUTPUT_FORMATS.items() if ext == extension),
+        DEFAULT_OUTPUT_FORMAT
+    )
+
+
+def write_result(df: pd.DataFrame, output_file: str, format_name: str = None, on_warning: Callable = None):
+    """按指定格式（默认按扩展名判断）写出结果表，先写临时文件再替换，避免留下半个文件
+
+    on_warning 接收写出时的提示（如 Excel 单元格超长被截断）。
+    """
+    if format_name is None:
+        format_name = format_for_extension(os.path.splitext(output_file)[1])
+    writer = get_writer(format_name)
+
+    root, extension = os.path.splitext(output_file)
+    tmp_file = f"{root}.tmp{extension}"
+    try:
+        if writer is write_excel:
+            writer(df, tmp_file, on_warning=on_warning)
+        else:
+            writer(df, tmp_file)
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime
 import threading
 import re
+from .header_probe import probe_columns, column_by_text
 
 class TableSplitter(tk.Toplevel):
     def __init__(self, master):
@@ -124,13 +125,9 @@ class TableSplitter(tk.Toplevel):
             self.load_columns(files[0])
             
     def load_columns(self, file_path):
-        """读取文件列名"""
+        """读取文件列名（只读取表头）"""
         try:
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
-            else:
-                df = pd.read_excel(file_path)
-            self.available_columns = df.columns.tolist()
+            self.available_columns = probe_columns(file_path)
             self.update_split_options()
         except Exception as e:
             messagebox.showerror("错误", f"读取文件失败：{str(e)}")
@@ -223,7 +220,7 @@ class TableSplitter(tk.Toplevel):
                         output_name = f"{os.path.splitext(os.path.basename(file_path))[0]}-part{i}"
                     else:
                         # 按字段拆分时使用字段值
-                        column = self.split_column.get()
+                        column = column_by_text(chunk.columns, self.split_column.get())
                         key_value = chunk[column].iloc[0]  # 获取该分组的关键字值
                         clean_key = self.clean_filename(key_value)  # 清理关键字中的非法字符
                         output_name = f"{os.path.splitext(os.path.basename(file_path))[0]}-{clean_key}"
@@ -249,7 +246,7 @@ class TableSplitter(tk.Toplevel):
         
     def split_by_column(self, df):
         """按字段拆分"""
-        column = self.split_column.get()
+        column = column_by_text(df.columns, self.split_column.get())
         return [group for _, group in df.groupby(column)]
         
     def save_chunk(self, df, output_dir, name):